@@ -5,9 +5,10 @@ from fastapi import Header, HTTPException
 # In a real PAM, this would verify JWTs or check against an Identity Provider (IdP)
 # For this lab, we use a simple header-based mock authentication.
 
-def get_current_user(x_user: Optional[str] = Header(None)) -> str:
+async def get_current_user(x_user: Optional[str] = Header(None)) -> str:
     """
-    Mock authentication dependency.
+    Mock authentication dependency (async, so it runs on the event loop
+    rather than taking a threadpool slot per request).
     In production, replace this with OAuth2/OIDC token validation.
     """
     if not x_user:
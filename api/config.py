@@ -1,3 +1,5 @@
+from typing import Any, Dict, Optional
+
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -6,8 +8,114 @@ class Settings(BaseSettings):
     pam_master_key: str = Field(..., description="Master key for vault encryption")
     db_path: str = Field("pam_vault.db", description="Path to the SQLite vault database")
     audit_log_file: str = Field("audit.log", description="Path to the audit log file")
+    audit_async: bool = Field(True, description="Write audit events from a background group-commit thread")
+    audit_queue_size: int = Field(10000, description="Pending audit writes before callers block")
+    audit_batch_size: int = Field(500, description="Maximum audit events per group-commit write")
+    audit_fsync_policy: str = Field("interval", description="When to fsync the audit log: batch, interval or never")
+    audit_fsync_interval_ms: int = Field(1000, description="Maximum time between fsyncs for the interval policy")
+    audit_console: bool = Field(False, description="Echo audit events to the console")
+    audit_index_path: Optional[str] = Field(
+        None, description="SQLite index for audit queries (default: <audit_log_file>.idx); empty string disables it"
+    )
+    audit_segment_max_bytes: Optional[int] = Field(
+        64 * 1024 * 1024, description="Seal the active audit file into a segment at this size"
+    )
+    audit_segment_max_age_seconds: Optional[float] = Field(
+        None, description="Seal the active audit file into a segment at this age"
+    )
+    audit_compression: str = Field("gzip", description="Codec for sealed audit segments: gzip, bz2, lzma or none")
+    audit_retention_days: Optional[float] = Field(None, description="Remove audit segments older than this")
+    audit_retention_action: str = Field("delete", description="Retention action for old segments: delete or archive")
+    audit_archive_dir: Optional[str] = Field(None, description="Archive directory (default: <log dir>/archive)")
     policy_file: str = Field("policies.yaml", description="Path to the policy definition file")
-    
+    policy_reload_interval_seconds: float = Field(5, description="Seconds between policy file checks (0 disables)")
+    vault_envelope_encryption: bool = Field(
+        True, description="Encrypt new secrets with per-secret data keys wrapped by a key-encryption key"
+    )
+
+    # SQLite connection pool
+    db_pool_size: int = Field(8, description="Maximum number of pooled SQLite connections")
+    db_busy_timeout_ms: int = Field(5000, description="How long a connection waits on a locked database")
+    db_synchronous: str = Field("NORMAL", description="SQLite synchronous pragma (OFF, NORMAL, FULL, EXTRA)")
+    db_cache_size_kb: int = Field(8192, description="Per-connection SQLite page cache size in KiB")
+    db_statement_cache_size: int = Field(128, description="Prepared statements cached per connection")
+
+    # Hot-path caches (0 disables)
+    metadata_cache_size: int = Field(10000, description="Secrets whose metadata is cached for access checks")
+    metadata_cache_ttl_seconds: float = Field(30, description="How long cached metadata may lag other workers' writes")
+    policy_decision_cache_size: int = Field(50000, description="Cached (user, role) access decisions")
+    plaintext_cache_size: int = Field(0, description="Decrypted credentials kept in memory (opt-in; 0 disables)")
+    plaintext_cache_ttl_seconds: float = Field(60, description="Plaintext cache TTL; never exceeds the lease")
+
+    # Async endpoint executors
+    crypto_executor: str = Field("thread", description="Where async endpoints run crypto: thread or process")
+    crypto_workers: Optional[int] = Field(None, description="Crypto workers (default: the executor default)")
+    db_workers: Optional[int] = Field(None, description="Threads for blocking database calls (default: db_pool_size)")
+
+    # Metrics
+    metrics_enabled: bool = Field(True, description="Record request and stage latencies and serve them at /metrics")
+
+    # Tracing (opt-in)
+    trace_sample_rate: float = Field(0, description="Fraction of requests traced (0 disables tracing)")
+    trace_file: str = Field("traces.jsonl", description="File traced requests are appended to")
+    trace_format: str = Field("json", description="Trace file format: json (one trace per line) or chrome")
+    trace_profile_slowest: int = Field(0, description="Keep stack-sampled profiles of this many slowest traces")
+    trace_profile_interval_ms: float = Field(5, description="Stack sampling interval for profiled traces")
+
+    # Bulk import
+    bulk_max_items: int = Field(5000, description="Maximum number of secrets accepted per batch request")
+    bulk_chunk_size: int = Field(500, description="Secrets written per database transaction during bulk import")
+    bulk_workers: int = Field(4, description="Threads used to encrypt secrets during bulk import")
+
+    # Batch rotation
+    rotation_max_concurrency: int = Field(16, description="Default worker count for batch rotation")
+    rotation_type_limits: Dict[str, int] = Field(
+        default_factory=dict, description='Per-type concurrency caps, e.g. {"windows": 4, "linux": 32}'
+    )
+    rotation_write_batch_size: int = Field(100, description="Rotated secrets persisted per vault transaction")
+
+    # Retries and per-host circuit breakers for target password changes
+    rotation_attempts: int = Field(3, description="Target password change attempts per rotation")
+    rotation_attempt_timeout_seconds: Optional[float] = Field(30, description="Time limit for each attempt")
+    rotation_backoff_seconds: float = Field(0.5, description="Backoff cap before the first retry; doubles per retry")
+    rotation_backoff_max_seconds: float = Field(10, description="Upper bound on the backoff between attempts")
+    rotation_breaker_failures: int = Field(5, description="Consecutive timeouts/connection errors that open a host")
+    rotation_breaker_reset_seconds: float = Field(60, description="How long an open host is skipped before a trial")
+    rotation_retry_delay_seconds: float = Field(300, description="Delay cap before a failed rotation is retried")
+    rotation_retry_max_delay_seconds: float = Field(3600, description="Upper bound on the deferred retry delay")
+    rotation_retry_max_deferrals: int = Field(5, description="Deferred retries before a failed rotation is dropped")
+    rotation_deferred_retries: Optional[bool] = Field(
+        None,
+        description="Defer failed rotations for a scheduler to retry (default: rotation_scheduler_enabled; "
+                    "enable on API workers when a standalone scheduler drains the queue)"
+    )
+
+    # Simulated target systems
+    target_profiles: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict,
+        description='Simulator behaviour per type, e.g. {"linux": {"latency_ms": 50, "distribution": "lognormal", '
+                    '"failure_rate": 0.01, "host_capacity": 1}}'
+    )
+    target_service_url: Optional[str] = Field(None, description="Rotate against a rotation.target_service instead")
+    target_timeout_seconds: float = Field(10, description="HTTP timeout for target service calls")
+
+    # Policy-driven rotation scheduler (enable in exactly one process per vault)
+    rotation_scheduler_enabled: bool = Field(False, description="Run the rotation scheduler inside the API")
+    rotation_scheduler_batch_size: int = Field(50, description="Due secrets handed to the rotator per batch")
+    rotation_scheduler_jitter_seconds: float = Field(300, description="Maximum per-secret offset added to due times")
+    rotation_scheduler_retry_seconds: float = Field(
+        600, description="Delay before retrying a rotation whose deferred retries ran out"
+    )
+    rotation_scheduler_rescan_seconds: float = Field(900, description="Interval between schedule rebuilds")
+
+    # Access request storage
+    workflow_backend: str = Field("sqlite", description="Where access requests live: sqlite (shared) or memory")
+    workflow_db_path: Optional[str] = Field(None, description="SQLite file for access requests (default: db_path)")
+    workflow_pending_ttl_minutes: float = Field(1440, description="Unapproved requests expire after this long")
+    workflow_reaper_enabled: bool = Field(True, description="Expire lapsed requests and leases in the background")
+    workflow_reaper_interval_seconds: float = Field(60, description="Maximum time between reaper passes")
+    workflow_expired_retention_hours: float = Field(24, description="Keep expired requests this long before purging")
+
     # Auth settings (for future expansion)
     secret_key: str = Field("unsafe-secret-key-change-me", description="Secret key for JWT signing")
     algorithm: str = "HS256"
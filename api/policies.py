@@ -1,8 +1,25 @@
+import fnmatch
+import itertools
+import logging
 import os
+import re
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Tuple
 
 import yaml
 
+from telemetry.tracing import traced
+from vault.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Role assumed for secrets whose metadata does not name one.
+DEFAULT_ROLE = "linux-admin"
+
 DEFAULT_POLICIES = """
+# Optional named user groups, referenced from allowed_users as "@name".
+groups: {}
+
 policies:
   - role: linux-admin
     approval_required: true
@@ -23,32 +40,241 @@ policies:
     allowed_users: ["*"]
 """
 
+GLOB_CHARS = set("*?[")
+
+# libyaml's loader when PyYAML was built with it; large policy files parse several times faster.
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_generations = itertools.count(1)
+
+
+class PolicyError(ValueError):
+    """Raised when a policy file is malformed."""
+
+
+def _is_glob(value: str) -> bool:
+    return any(ch in GLOB_CHARS for ch in value)
+
+
+def _glob_regex(patterns: List[str]) -> Optional[Pattern[str]]:
+    """Combine glob patterns into one regex so a lookup is a single match."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+
+class CompiledPolicy:
+    """One role's policy with its allowed users resolved into set and glob lookups."""
+
+    def __init__(self, raw: Dict[str, Any], users: FrozenSet[str], user_patterns: List[str]):
+        self.raw = raw
+        self.role: str = raw['role']
+        self.users = users
+        self.allow_all = "*" in user_patterns
+        self.user_regex = None if self.allow_all else _glob_regex(user_patterns)
+        self.decision = {
+            "allowed": True,
+            "approval_required": bool(raw.get('approval_required', False)),
+            "ttl_minutes": raw.get('ttl_minutes', 15)
+        }
+
+    def allows(self, user: str) -> bool:
+        if self.allow_all or user in self.users:
+            return True
+        return bool(self.user_regex and self.user_regex.match(user))
+
+
+class CompiledPolicies:
+    """An immutable, validated policy set; swapped in whole on reload."""
+
+    def __init__(self, exact: Dict[str, CompiledPolicy], patterns: List[Tuple[Pattern[str], CompiledPolicy]]):
+        # Distinguishes decision cache entries made against different policy sets.
+        self.generation = next(_generations)
+        self.exact = exact
+        # Glob roles, checked in file order when no exact role matches.
+        self.patterns = patterns
+
+    def resolve(self, role: str) -> Optional[CompiledPolicy]:
+        policy = self.exact.get(role)
+        if policy is not None:
+            return policy
+        for regex, candidate in self.patterns:
+            if regex.match(role):
+                return candidate
+        return None
+
+    @property
+    def raw(self) -> Dict[str, Dict[str, Any]]:
+        compiled = [*self.exact.values(), *(policy for _, policy in self.patterns)]
+        return {policy.role: policy.raw for policy in compiled}
+
+
+def compile_policies(data: Any) -> CompiledPolicies:
+    """Validate parsed policy YAML and compile it. Raises PolicyError."""
+    if not isinstance(data, dict):
+        raise PolicyError("policy file must be a mapping with a 'policies' list")
+
+    groups = data.get('groups') or {}
+    if not isinstance(groups, dict):
+        raise PolicyError("'groups' must map group names to lists of users")
+    for name, members in groups.items():
+        if not isinstance(members, list) or not all(isinstance(m, str) for m in members):
+            raise PolicyError(f"group '{name}' must be a list of user names")
+
+    policies = data.get('policies')
+    if not isinstance(policies, list):
+        raise PolicyError("'policies' must be a list")
+
+    exact: Dict[str, CompiledPolicy] = {}
+    patterns: List[Tuple[Pattern[str], CompiledPolicy]] = []
+    seen = set()
+    for index, raw in enumerate(policies):
+        if not isinstance(raw, dict) or not isinstance(raw.get('role'), str) or not raw['role']:
+            raise PolicyError(f"policy #{index + 1} needs a 'role' name")
+        role = raw['role']
+        if role in seen:
+            raise PolicyError(f"role '{role}' is defined more than once")
+        seen.add(role)
+
+        ttl = raw.get('ttl_minutes', 15)
+        if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl <= 0:
+            raise PolicyError(f"role '{role}': ttl_minutes must be a positive number")
+        hours = raw.get('rotation_hours')
+        if hours is not None and (not isinstance(hours, (int, float)) or isinstance(hours, bool) or hours < 0):
+            raise PolicyError(f"role '{role}': rotation_hours must be a non-negative number")
+
+        allowed = raw.get('allowed_users', [])
+        if not isinstance(allowed, list) or not all(isinstance(u, str) for u in allowed):
+            raise PolicyError(f"role '{role}': allowed_users must be a list of strings")
+        expanded: List[str] = []
+        for entry in allowed:
+            if entry.startswith("@"):
+                if entry[1:] not in groups:
+                    raise PolicyError(f"role '{role}': unknown group '{entry[1:]}'")
+                expanded.extend(groups[entry[1:]])
+            else:
+                expanded.append(entry)
+        users = frozenset(entry for entry in expanded if not _is_glob(entry))
+        user_patterns = [entry for entry in expanded if _is_glob(entry)]
+
+        policy = CompiledPolicy(raw, users, user_patterns)
+        if _is_glob(role):
+            patterns.append((re.compile(fnmatch.translate(role)), policy))
+        else:
+            exact[role] = policy
+    return CompiledPolicies(exact, patterns)
+
+
 class PolicyEngine:
-    def __init__(self, policy_file="policies.yaml"):
+    def __init__(self, policy_file="policies.yaml", reload_interval: float = 0, decision_cache_size: int = 0):
+        """Role-based access policies compiled from a YAML file.
+
+        With ``reload_interval`` > 0, watch_start() polls the file's mtime and
+        size and swaps in the recompiled policy set when it changes. A file that
+        fails validation is logged and ignored; the previous policies stay live.
+
+        ``decision_cache_size`` > 0 caches check_access results per (user, role)
+        until the policy set is reloaded.
+        """
         self.policy_file = policy_file
-        self.policies = self._load_policies()
+        self.reload_interval = reload_interval
+        self.decision_cache = TTLCache(max_size=decision_cache_size)
+        self._stamp: Optional[Tuple[float, int]] = None
+        self._compiled = self._load_policies()
+
+        self._stopping = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
 
-    def _load_policies(self):
+    def _file_stamp(self) -> Optional[Tuple[float, int]]:
+        try:
+            st = os.stat(self.policy_file)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime, st.st_size
+
+    def _load_policies(self) -> CompiledPolicies:
         if not os.path.exists(self.policy_file):
             with open(self.policy_file, "w") as f:
                 f.write(DEFAULT_POLICIES)
-        
+
+        stamp = self._file_stamp()
         with open(self.policy_file, "r") as f:
-            data = yaml.safe_load(f)
-            return {p['role']: p for p in data.get('policies', [])}
+            try:
+                data = yaml.load(f, Loader=YAML_LOADER)
+            except yaml.YAMLError as e:
+                raise PolicyError(f"invalid YAML: {e}") from e
+        compiled = compile_policies(data)
+        self._stamp = stamp
+        return compiled
+
+    @property
+    def policies(self) -> Dict[str, Dict[str, Any]]:
+        """The raw policy entries by role."""
+        return self._compiled.raw
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile the policy file if it changed. Returns True if new policies were swapped in."""
+        stamp = self._file_stamp()
+        if stamp is None:
+            return False  # mid-replace or removed; don't recreate the defaults over live policies
+        if not force and stamp == self._stamp:
+            return False
+        try:
+            compiled = self._load_policies()
+        except (OSError, PolicyError) as e:
+            # Remember the bad version so it isn't re-parsed on every poll.
+            self._stamp = self._file_stamp()
+            logger.error(f"❌ Rejected policy file {self.policy_file}: {e}; keeping previous policies.")
+            return False
+        # A single reference swap: in-flight checks finish against the set they started with.
+        self._compiled = compiled
+        self.decision_cache.clear()
+        logger.info(f"📜 Reloaded policies from {self.policy_file}.")
+        return True
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(self.reload_interval):
+            self.reload()
+
+    def watch_start(self) -> None:
+        if self.reload_interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stopping.clear()
+        self._watcher = threading.Thread(target=self._watch, name="policy-watcher", daemon=True)
+        self._watcher.start()
 
+    def watch_stop(self) -> None:
+        self._stopping.set()
+        if self._watcher:
+            self._watcher.join()
+            self._watcher = None
+
+    def rotation_hours(self, role: str) -> Optional[float]:
+        """Return the rotation interval for a role, or None if it is never rotated automatically."""
+        policy = self._compiled.resolve(role)
+        if not policy or not policy.raw.get('rotation_hours'):
+            return None
+        return float(policy.raw['rotation_hours'])
+
+    @traced()
     def check_access(self, user: str, role: str) -> dict:
         """Check if a user can access a role and return policy details."""
-        policy = self.policies.get(role)
+        compiled = self._compiled
+        # Keyed by generation, so a check racing a reload can't cache a decision from the old set.
+        key = (compiled.generation, user, role)
+        decision = self.decision_cache.get(key)
+        if decision is None:
+            decision = self._decide(compiled, user, role)
+            self.decision_cache.put(key, decision)
+        return dict(decision)
+
+    @staticmethod
+    def _decide(compiled: CompiledPolicies, user: str, role: str) -> dict:
+        policy = compiled.resolve(role)
         if not policy:
             return {"allowed": False, "reason": "Role not defined"}
 
-        allowed_users = policy.get('allowed_users', [])
-        if "*" not in allowed_users and user not in allowed_users:
+        if not policy.allows(user):
             return {"allowed": False, "reason": "User not authorized for this role"}
 
-        return {
-            "allowed": True,
-            "approval_required": policy.get('approval_required', False),
-            "ttl_minutes": policy.get('ttl_minutes', 15)
-        }
+        return policy.decision
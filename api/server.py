@@ -1,28 +1,182 @@
-from typing import List, Optional
+import json
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 
 from api.auth import get_current_user
 from api.config import settings
-from api.policies import PolicyEngine
+from api.policies import DEFAULT_ROLE, PolicyEngine
 from audit.audit_log import AuditLogger
+from rotation.resilience import Backoff, HostBreakers, RetryPolicy, RetryQueue
 from rotation.rotator import Rotator
+from rotation.scheduler import RotationScheduler
+from rotation.simulators import build_simulators
+from telemetry.metrics import REGISTRY
+from telemetry.middleware import MetricsMiddleware, TracingMiddleware
+from telemetry.tracing import Tracer
+from vault.async_vault import AsyncVault
+from vault.cache import PlaintextCache, TTLCache
+from vault.pool import ConnectionPool
 from vault.vault_engine import VaultEngine
 from workflow.access_requests import AccessWorkflow
+from workflow.reaper import LeaseReaper
+from workflow.stores import InMemoryRequestStore, RequestStore, SQLiteRequestStore
+
+# Initialize components
+vault = VaultEngine(
+    settings.pam_master_key,
+    db_path=settings.db_path,
+    envelope_encryption=settings.vault_envelope_encryption,
+    pool=ConnectionPool(
+        settings.db_path,
+        size=settings.db_pool_size,
+        busy_timeout_ms=settings.db_busy_timeout_ms,
+        synchronous=settings.db_synchronous,
+        cache_size_kb=settings.db_cache_size_kb,
+        statement_cache_size=settings.db_statement_cache_size
+    ),
+    metadata_cache=TTLCache(max_size=settings.metadata_cache_size, ttl_seconds=settings.metadata_cache_ttl_seconds),
+    plaintext_cache=PlaintextCache(
+        max_size=settings.plaintext_cache_size, ttl_seconds=settings.plaintext_cache_ttl_seconds
+    ) if settings.plaintext_cache_size else None
+)
+auditor = AuditLogger(
+    log_file=settings.audit_log_file,
+    async_mode=settings.audit_async,
+    queue_size=settings.audit_queue_size,
+    batch_size=settings.audit_batch_size,
+    fsync_policy=settings.audit_fsync_policy,
+    fsync_interval_ms=settings.audit_fsync_interval_ms,
+    console=settings.audit_console,
+    index_path=(
+        f"{settings.audit_log_file}.idx" if settings.audit_index_path is None else settings.audit_index_path
+    ) or None,
+    segment_max_bytes=settings.audit_segment_max_bytes,
+    segment_max_age_seconds=settings.audit_segment_max_age_seconds,
+    compression=settings.audit_compression,
+    retention_days=settings.audit_retention_days,
+    retention_action=settings.audit_retention_action,
+    archive_dir=settings.audit_archive_dir
+)
+# Async endpoints reach the vault (and other SQLite stores) through these executors.
+async_vault = AsyncVault(
+    vault,
+    crypto_executor=settings.crypto_executor,
+    crypto_workers=settings.crypto_workers,
+    db_workers=settings.db_workers or settings.db_pool_size
+)
+# Deferred retries live in the vault's database, so any process's scheduler can drain them.
+retry_queue = RetryQueue(
+    settings.db_path,
+    pool=vault.pool,
+    backoff=Backoff(settings.rotation_retry_delay_seconds, settings.rotation_retry_max_delay_seconds),
+    max_deferrals=settings.rotation_retry_max_deferrals
+)
+deferred_retries = (
+    settings.rotation_deferred_retries if settings.rotation_deferred_retries is not None
+    else settings.rotation_scheduler_enabled
+)
+rotator = Rotator(
+    vault,
+    auditor,
+    type_limits=settings.rotation_type_limits,
+    write_batch_size=settings.rotation_write_batch_size,
+    simulators=build_simulators(
+        settings.target_profiles, settings.target_service_url, timeout_seconds=settings.target_timeout_seconds
+    ),
+    retry_policy=RetryPolicy(
+        attempts=settings.rotation_attempts,
+        attempt_timeout=settings.rotation_attempt_timeout_seconds,
+        backoff=Backoff(settings.rotation_backoff_seconds, settings.rotation_backoff_max_seconds)
+    ),
+    breakers=HostBreakers(settings.rotation_breaker_failures, settings.rotation_breaker_reset_seconds),
+    retry_queue=retry_queue if deferred_retries else None
+)
+policy_engine = PolicyEngine(
+    policy_file=settings.policy_file,
+    reload_interval=settings.policy_reload_interval_seconds,
+    decision_cache_size=settings.policy_decision_cache_size
+)
+request_store: RequestStore
+if settings.workflow_backend == "memory":
+    request_store = InMemoryRequestStore()
+elif settings.workflow_backend == "sqlite":
+    # Shares the vault's pool unless requests live in a separate file.
+    request_store = SQLiteRequestStore(
+        settings.workflow_db_path or settings.db_path,
+        pool=None if settings.workflow_db_path else vault.pool
+    )
+else:
+    raise ValueError("workflow_backend must be 'sqlite' or 'memory'")
+workflow = AccessWorkflow(request_store, pending_ttl_minutes=settings.workflow_pending_ttl_minutes)
+reaper = LeaseReaper(
+    workflow,
+    auditor,
+    interval_seconds=settings.workflow_reaper_interval_seconds,
+    retention_seconds=settings.workflow_expired_retention_hours * 3600
+)
+tracer = Tracer(
+    sample_rate=settings.trace_sample_rate,
+    output_file=settings.trace_file,
+    fmt=settings.trace_format,
+    profile_slowest=settings.trace_profile_slowest,
+    profile_interval_ms=settings.trace_profile_interval_ms
+)
+scheduler = RotationScheduler(
+    vault,
+    rotator,
+    policy_engine,
+    batch_size=settings.rotation_scheduler_batch_size,
+    max_concurrency=settings.rotation_max_concurrency,
+    jitter_seconds=settings.rotation_scheduler_jitter_seconds,
+    retry_seconds=settings.rotation_scheduler_retry_seconds,
+    rescan_seconds=settings.rotation_scheduler_rescan_seconds
+)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if settings.rotation_scheduler_enabled:
+        scheduler.start()
+    if settings.workflow_reaper_enabled:
+        reaper.start()
+    policy_engine.watch_start()
+    yield
+    policy_engine.watch_stop()
+    reaper.stop()
+    scheduler.stop()
+    auditor.close()
+    async_vault.close()
+    tracer.close()
+    request_store.close()
 
 app = FastAPI(
     title="PAM Automation Lab",
     description="A lightweight Privileged Access Management system.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Initialize components
-vault = VaultEngine(settings.pam_master_key, db_path=settings.db_path)
-auditor = AuditLogger(log_file=settings.audit_log_file)
-rotator = Rotator(vault, auditor)
-policy_engine = PolicyEngine(policy_file=settings.policy_file)
-workflow = AccessWorkflow()
+REGISTRY.enabled = settings.metrics_enabled
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+    # Read at scrape time, so they cost nothing between scrapes.
+    REGISTRY.gauge(
+        "pam_pending_requests", "Access requests awaiting approval", lambda: workflow.count_live("PENDING")
+    )
+    REGISTRY.gauge(
+        "pam_active_leases", "Approved access requests still within their TTL", lambda: workflow.count_live("APPROVED")
+    )
+    REGISTRY.gauge(
+        "pam_secrets_rotation_overdue", "Secrets past their role's rotation interval", scheduler.overdue_count
+    )
+if tracer.enabled:
+    # Added last, so it runs outermost and traces cover the metrics middleware too.
+    app.add_middleware(TracingMiddleware, tracer=tracer)
 
 # --- Models ---
 class SecretCreate(BaseModel):
@@ -32,11 +186,17 @@ class SecretCreate(BaseModel):
     value: str
     metadata: Optional[dict] = {}
 
+class SecretBatchCreate(BaseModel):
+    # Items are validated one by one so a malformed entry fails alone, not the whole batch.
+    secrets: List[Dict[str, Any]]
+
 class SecretResponse(BaseModel):
     id: str
     name: str
     type: str
     last_rotated: str
+    role: Optional[str] = None
+    host: Optional[str] = None
 
 class AccessRequest(BaseModel):
     user: str
@@ -48,6 +208,11 @@ class ApprovalRequest(BaseModel):
     request_id: str
     decision: str  # APPROVED / DENIED
 
+class RotationBatchRequest(BaseModel):
+    secret_ids: List[str] = []
+    all: bool = False
+    max_concurrency: Optional[int] = None
+
 class CredentialResponse(BaseModel):
     secret: str
     expires_at: str
@@ -55,30 +220,108 @@ class CredentialResponse(BaseModel):
 # --- Endpoints ---
 
 @app.post("/secrets", status_code=201)
-def create_secret(secret: SecretCreate, user: str = Depends(get_current_user)):
+async def create_secret(secret: SecretCreate, user: str = Depends(get_current_user)):
     """Create a new secret in the vault."""
     try:
-        vault.store_secret(secret.id, secret.name, secret.type, secret.value, secret.metadata)
+        await async_vault.store_secret(secret.id, secret.name, secret.type, secret.value, secret.metadata)
         auditor.log_event("CREATE_SECRET", user, secret.id)
         return {"status": "created", "id": secret.id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) from e
 
+@app.post("/secrets:batch")
+def create_secrets_batch(batch: SecretBatchCreate, user: str = Depends(get_current_user)):
+    """Create many secrets in one request; failures are reported per item."""
+    if len(batch.secrets) > settings.bulk_max_items:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.bulk_max_items} secrets")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(batch.secrets)
+    valid: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for i, item in enumerate(batch.secrets):
+        try:
+            valid.append(SecretCreate.model_validate(item).model_dump())
+            positions.append(i)
+        except ValidationError as e:
+            results[i] = {"id": item.get("id"), "status": "error", "error": str(e)}
+
+    stored = vault.store_secrets_bulk(valid, chunk_size=settings.bulk_chunk_size, max_workers=settings.bulk_workers)
+    for i, result in zip(positions, stored):
+        results[i] = result
+
+    created = [r["id"] for r in results if r and r["status"] == "created"]
+    failed = len(results) - len(created)
+    auditor.log_event("CREATE_SECRETS_BATCH", user, details={"created": created, "failed": failed}, success=not failed)
+    return {"created": len(created), "failed": failed, "results": results}
+
 @app.get("/secrets", response_model=List[SecretResponse])
-def list_secrets(user: str = Depends(get_current_user)):
-    """List all secrets (metadata only)."""
+async def list_secrets(
+    response: Response,
+    after: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    secret_type: Optional[str] = Query(None, alias="type"),
+    role: Optional[str] = None,
+    host: Optional[str] = None,
+    rotated_after: Optional[datetime] = None,
+    rotated_before: Optional[datetime] = None,
+    user: str = Depends(get_current_user)
+):
+    """List secrets (metadata only), one page at a time in id order.
+
+    When more secrets match, the X-Next-Cursor response header holds the
+    value to pass as ``after`` for the next page.
+    """
     auditor.log_event("LIST_SECRETS", user)
-    return vault.list_secrets()
+    page = await async_vault.run_db(
+        vault.list_secrets,
+        after=after,
+        limit=limit + 1,
+        secret_type=secret_type,
+        role=role,
+        host=host,
+        rotated_after=rotated_after.isoformat() if rotated_after else None,
+        rotated_before=rotated_before.isoformat() if rotated_before else None
+    )
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = page[-1]["id"]
+    return page
+
+EXPORT_CHUNK_LINES = 500
+
+
+def _ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Encode records as NDJSON, yielding a chunk every EXPORT_CHUNK_LINES records."""
+    lines: List[str] = []
+    for record in records:
+        lines.append(json.dumps(record))
+        if len(lines) >= EXPORT_CHUNK_LINES:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines.clear()
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+@app.get("/secrets/export")
+def export_secrets(
+    secret_type: Optional[str] = Query(None, alias="type"),
+    role: Optional[str] = None,
+    host: Optional[str] = None,
+    user: str = Depends(get_current_user)
+):
+    """Stream metadata for every matching secret as NDJSON, in constant memory."""
+    auditor.log_event("EXPORT_SECRETS", user, details={"type": secret_type, "role": role, "host": host})
+    records = vault.iter_secrets(secret_type=secret_type, role=role, host=host)
+    return StreamingResponse(_ndjson(records), media_type="application/x-ndjson")
 
 @app.post("/request")
-def request_access(req: AccessRequest):
+async def request_access(req: AccessRequest):
     """Request access to a privileged secret."""
     # Check policy
-    meta = vault.get_metadata(req.secret_id)
+    meta = await async_vault.get_metadata(req.secret_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Secret not found")
     
-    role = meta['metadata'].get('role', 'linux-admin')
+    role = meta['metadata'].get('role', DEFAULT_ROLE)
     
     policy = policy_engine.check_access(req.user, role)
     if not policy['allowed']:
@@ -86,35 +329,39 @@ def request_access(req: AccessRequest):
         raise HTTPException(status_code=403, detail=policy.get('reason', 'Access denied'))
 
     if policy['approval_required']:
-        req_id = workflow.create_request(req.user, req.secret_id, req.reason)
+        req_id = await async_vault.run_db(workflow.create_request, req.user, req.secret_id, req.reason)
         auditor.log_event("REQUEST_CREATED", req.user, req.secret_id, {"req_id": req_id})
         return {"status": "pending_approval", "request_id": req_id, "message": "Admin approval required"}
     else:
         # Auto-approve
-        req_id = workflow.create_request(req.user, req.secret_id, req.reason)
-        workflow.approve_request(req_id, "SYSTEM", policy['ttl_minutes'])
+        req_id = await async_vault.run_db(workflow.create_request, req.user, req.secret_id, req.reason)
+        await async_vault.run_db(workflow.approve_request, req_id, "SYSTEM", policy['ttl_minutes'])
         auditor.log_event("AUTO_APPROVED", req.user, req.secret_id)
         return {"status": "approved", "request_id": req_id, "ttl_minutes": policy['ttl_minutes']}
 
 @app.post("/approve")
-def approve_request(approval: ApprovalRequest, user: str = Depends(get_current_user)):
+async def approve_request(approval: ApprovalRequest, user: str = Depends(get_current_user)):
     """Approve a pending access request (Admin only)."""
     # In a real system, we would check if 'user' has admin privileges here.
     auditor.log_event("APPROVE_ATTEMPT", user, details={"req_id": approval.request_id})
     
-    req = workflow.get_request(approval.request_id)
+    req = await async_vault.run_db(workflow.get_request, approval.request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
 
     if approval.decision == "APPROVED":
-        meta = vault.get_metadata(req['secret_id'])
+        meta = await async_vault.get_metadata(req['secret_id'])
         if not meta:
              raise HTTPException(status_code=404, detail="Secret associated with request not found")
              
-        role = meta['metadata'].get('role', 'linux-admin')
+        role = meta['metadata'].get('role', DEFAULT_ROLE)
         policy = policy_engine.check_access(req['user'], role)
         
-        workflow.approve_request(approval.request_id, approval.admin_user, policy.get('ttl_minutes', 15))
+        approved = await async_vault.run_db(
+            workflow.approve_request, approval.request_id, approval.admin_user, policy.get('ttl_minutes', 15)
+        )
+        if not approved or approved['status'] != 'APPROVED':
+            raise HTTPException(status_code=409, detail="Request has expired")
         auditor.log_event("REQUEST_APPROVED", approval.admin_user, req['secret_id'], {"req_id": approval.request_id})
         return {"status": "approved"}
     else:
@@ -122,19 +369,19 @@ def approve_request(approval: ApprovalRequest, user: str = Depends(get_current_u
         return {"status": "denied"}
 
 @app.get("/credential/{request_id}", response_model=CredentialResponse)
-def get_credential(request_id: str, user: str = Depends(get_current_user)):
+async def get_credential(request_id: str, user: str = Depends(get_current_user)):
     """Retrieve a secret using a valid, approved request ID."""
-    if not workflow.is_access_valid(request_id, user):
+    if not await async_vault.run_db(workflow.is_access_valid, request_id, user):
         auditor.log_event(
             "RETRIEVAL_FAILED", user, details={"req_id": request_id, "reason": "invalid_or_expired"}, success=False
         )
         raise HTTPException(status_code=403, detail="Access invalid or expired")
 
-    req = workflow.get_request(request_id)
+    req = await async_vault.run_db(workflow.get_request, request_id)
     if not req:
          raise HTTPException(status_code=404, detail="Request not found")
 
-    secret_value = vault.get_secret(req['secret_id'])
+    secret_value = await async_vault.get_secret(req['secret_id'], cache_seconds=req['expires_at_ts'] - time.time())
     if not secret_value:
         raise HTTPException(status_code=404, detail="Secret data not found")
     
@@ -150,8 +397,127 @@ def rotate_secret(secret_id: str, user: str = Depends(get_current_user)):
     else:
         raise HTTPException(status_code=500, detail="Rotation failed")
 
+@app.get("/rotation/breakers")
+def rotation_breakers(_user: str = Depends(get_current_user)):
+    """Per-host circuit breaker counts, plus every host that is open or half-open."""
+    return rotator.breakers.snapshot()
+
+@app.get("/rotation/retries")
+def rotation_retries(_user: str = Depends(get_current_user)):
+    """Attempt, retry and short-circuit counts, and the deferred retry queue (soonest first)."""
+    return rotator.retry_stats()
+
+ROTATE_ALL_PAGE_SIZE = 1000
+
+
+def _secret_id_pages(page_size: int) -> Iterator[List[str]]:
+    """Every secret id in id order, a keyset-paged list_secrets query per page."""
+    page: List[str] = []
+    for secret in vault.iter_secrets(batch_size=page_size):
+        page.append(secret["id"])
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+@app.post("/rotate:batch")
+def rotate_secrets_batch(batch: RotationBatchRequest, user: str = Depends(get_current_user)):
+    """Rotate many secrets (or the whole vault, ROTATE_ALL_PAGE_SIZE ids at a time) concurrently."""
+    pages = _secret_id_pages(ROTATE_ALL_PAGE_SIZE) if batch.all else iter([batch.secret_ids])
+    summary: Dict[str, Any] = {"rotated": [], "failed": [], "skipped": [], "total_seconds": 0.0}
+    for secret_ids in pages:
+        if not secret_ids:
+            continue
+        page_summary = rotator.rotate_many(
+            secret_ids,
+            max_concurrency=batch.max_concurrency or settings.rotation_max_concurrency,
+            triggered_by=user
+        )
+        for key in ("rotated", "failed", "skipped"):
+            summary[key].extend(page_summary[key])
+        summary["total_seconds"] = round(summary["total_seconds"] + page_summary["total_seconds"], 3)
+    summary["counts"] = {key: len(summary[key]) for key in ("rotated", "failed", "skipped")}
+    if not sum(summary["counts"].values()):
+        raise HTTPException(status_code=400, detail="No secrets selected for rotation")
+    return summary
+
 @app.get("/audit")
-def get_audit_logs(limit: int = 20, user: str = Depends(get_current_user)):
-    """Retrieve audit logs."""
+def get_audit_logs(
+    response: Response,
+    limit: int = 20,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    user_filter: Optional[str] = Query(None, alias="user"),
+    action: Optional[str] = None,
+    secret_id: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: str = Depends(get_current_user)
+):
+    """Retrieve audit logs, newest page first, optionally filtered.
+
+    Filters (user, action, secret_id, success, since, until) are answered from
+    the audit index. Pass the X-Audit-Before / X-Audit-After response headers
+    back as ``before`` / ``after`` to page through older or newer records.
+    """
     auditor.log_event("AUDIT_ACCESS", user)
-    return auditor.get_logs(limit)
+    if any(v is not None for v in (user_filter, action, secret_id, success, since, until)):
+        if auditor.index is None:
+            raise HTTPException(status_code=400, detail="Audit filters require the audit index")
+        if after is not None:
+            raise HTTPException(status_code=400, detail="Filtered queries page backward with 'before'")
+        page = auditor.query(
+            user=user_filter,
+            action=action,
+            secret_id=secret_id,
+            success=success,
+            since=since.isoformat() if since else None,
+            until=until.isoformat() if until else None,
+            before=before,
+            limit=limit
+        )
+    else:
+        page = auditor.get_logs_page(limit, before=before, after=after)
+
+    if page["before"] is not None:
+        response.headers["X-Audit-Before"] = str(page["before"])
+        response.headers["X-Audit-After"] = str(page["after"])
+    return page["events"]
+
+@app.get("/audit/export")
+def export_audit_logs(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    user: str = Depends(get_current_user)
+):
+    """Stream audit events oldest first as NDJSON, reading the log segment by segment."""
+    since_ts = since.isoformat() if since else None
+    until_ts = until.isoformat() if until else None
+    auditor.log_event("EXPORT_AUDIT", user, details={"since": since_ts, "until": until_ts})
+    auditor.flush()  # include everything logged before this request
+    events = auditor.iter_events(since=since_ts, until=until_ts)
+    return StreamingResponse(_ndjson(events), media_type="application/x-ndjson")
+
+@app.get("/cache/stats")
+def cache_stats(_user: str = Depends(get_current_user)):
+    """Hit/miss counters for the metadata, access decision and plaintext caches."""
+    return {
+        "metadata": vault.metadata_cache.stats() if vault.metadata_cache else None,
+        "decisions": policy_engine.decision_cache.stats(),
+        "plaintext": vault.plaintext_cache.stats() if vault.plaintext_cache else None
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Counters, latency histograms and gauges in the Prometheus text format (unauthenticated, like a scrape target)."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/traces/slowest")
+def slowest_traces(_user: str = Depends(get_current_user)):
+    """Profiled traces of the slowest sampled requests (needs TRACE_PROFILE_SLOWEST), slowest first."""
+    return tracer.slowest()
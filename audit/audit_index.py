@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from .segments import SegmentedLog
+
+INDEX_BATCH_SIZE = 1000
+
+
+class AuditIndex:
+    """SQLite sidecar index over the JSON-lines audit log.
+
+    Each record is indexed by its byte offset in the log together with the
+    fields compliance queries filter on, so a query reads only the matching
+    records from the log. The index remembers how far into the log it has
+    read (as a global offset across segments) and catch_up() indexes just the
+    records appended since.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS events (
+                offset INTEGER PRIMARY KEY,
+                ts TEXT,
+                action TEXT,
+                user TEXT,
+                secret_id TEXT,
+                success INTEGER
+            );
+            -- Single-column indexes keep entries in offset (rowid) order per key,
+            -- so "newest N for this user" is a backward index range scan.
+            CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+            CREATE INDEX IF NOT EXISTS idx_events_user ON events (user);
+            CREATE INDEX IF NOT EXISTS idx_events_action ON events (action);
+            CREATE INDEX IF NOT EXISTS idx_events_secret ON events (secret_id);
+            CREATE TABLE IF NOT EXISTS index_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                indexed_upto INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO index_state (id, indexed_upto) VALUES (1, 0);
+        ''')
+        self._conn.commit()
+
+    def indexed_upto(self) -> int:
+        return self._conn.execute('SELECT indexed_upto FROM index_state WHERE id = 1').fetchone()[0]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM events')
+            self._conn.execute('UPDATE index_state SET indexed_upto = 0 WHERE id = 1')
+            self._conn.commit()
+
+    def catch_up(self, log: SegmentedLog) -> int:
+        """Index records appended to the log since the last call. Returns how many were added."""
+        with self._lock:
+            start = self.indexed_upto()
+            if start > log.end_offset():
+                # The log was truncated or replaced underneath us: start over.
+                self._conn.execute('DELETE FROM events')
+                start = 0
+            start = max(start, log.start_offset())
+
+            added = 0
+            rows: List[tuple] = []
+            position = start
+            for offset, line in log.iter_from(start):
+                position = offset + len(line) + 1
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                rows.append((
+                    offset, event.get("timestamp"), event.get("action"), event.get("user"),
+                    event.get("secret_id"), 1 if event.get("success") else 0
+                ))
+                if len(rows) >= INDEX_BATCH_SIZE:
+                    added += self._insert(rows, position)
+            added += self._insert(rows, position)
+            return added
+
+    def prune(self, start_offset: int) -> None:
+        """Drop entries for records before ``start_offset`` (removed by retention)."""
+        with self._lock:
+            self._conn.execute('DELETE FROM events WHERE offset < ?', (start_offset,))
+            self._conn.commit()
+
+    def _insert(self, rows: List[tuple], position: int) -> int:
+        count = len(rows)
+        self._conn.executemany('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self._conn.execute('UPDATE index_state SET indexed_upto = ? WHERE id = 1', (position,))
+        self._conn.commit()
+        rows.clear()
+        return count
+
+    def query(
+        self,
+        user: Optional[str] = None,
+        action: Optional[str] = None,
+        secret_id: Optional[str] = None,
+        success: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        before: Optional[int] = None,
+        limit: int = 50
+    ) -> List[int]:
+        """Return offsets of the newest ``limit`` matching records, oldest first.
+
+        ``since``/``until`` are ISO-8601 timestamps (inclusive / exclusive);
+        ``before`` is an offset cursor from a previous page.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        filters: Dict[str, Any] = {"user": user, "action": action, "secret_id": secret_id}
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(1 if success else 0)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if before is not None:
+            clauses.append("offset < ?")
+            params.append(before)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT offset FROM events {where} ORDER BY offset DESC LIMIT ?', (*params, limit)
+            ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,31 +1,276 @@
+import atexit
 import json
 import logging
 import os
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from telemetry.metrics import stage
+from telemetry.tracing import traced
+
+from .audit_index import AuditIndex
+from .segments import SegmentedLog
+
+FSYNC_POLICIES = ("batch", "interval", "never")
+
+_audit_write_stage = stage("audit_write")
 
 
 class AuditLogger:
-    def __init__(self, log_file: str = "audit.log"):
+    def __init__(
+        self,
+        log_file: str = "audit.log",
+        async_mode: bool = False,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        fsync_policy: str = "never",
+        fsync_interval_ms: int = 1000,
+        console: bool = False,
+        index_path: Optional[str] = None,
+        segment_max_bytes: Optional[int] = None,
+        segment_max_age_seconds: Optional[float] = None,
+        compression: str = "gzip",
+        retention_days: Optional[float] = None,
+        retention_action: str = "delete",
+        archive_dir: Optional[str] = None,
+        maintenance_interval: float = 60
+    ):
+        """Append-only JSON-lines audit log.
+
+        In async mode events are queued (blocking callers when ``queue_size``
+        batches are pending) and a writer thread drains up to ``batch_size`` of
+        them per write. ``fsync_policy`` is "batch" (fsync after every write),
+        "interval" (at most every ``fsync_interval_ms``) or "never" (leave it to
+        the OS). Pending events are always flushed by close(), which also runs
+        at interpreter exit.
+
+        With ``index_path`` set, an AuditIndex sidecar at that path backs query().
+
+        The active file is sealed into a numbered segment once it reaches
+        ``segment_max_bytes`` or ``segment_max_age_seconds``. A maintenance thread
+        compresses sealed segments with ``compression`` and, with
+        ``retention_days`` set, deletes or archives (``retention_action``) old
+        ones, so neither step blocks writers.
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {', '.join(FSYNC_POLICIES)}")
+
         self.log_file = log_file
+        self.async_mode = async_mode
+        self.batch_size = batch_size
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.console = console
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age_seconds = segment_max_age_seconds
+        self.retention_days = retention_days
+        self.retention_action = retention_action
+        self.archive_dir = archive_dir
+        self.segments = SegmentedLog(log_file, compression=compression)
         self.logger = logging.getLogger("pam_audit")
         self.logger.setLevel(logging.INFO)
-        
-        # Prevent adding multiple handlers if instantiated multiple times
-        if not self.logger.handlers:
-            # File Handler
-            fh = logging.FileHandler(self.log_file)
-            fh.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(message)s') # We log raw JSON
-            fh.setFormatter(formatter)
-            self.logger.addHandler(fh)
-            
-            # Console Handler (for demo visibility)
+
+        # Console Handler (for demo visibility); added once per process
+        if console and not self.logger.handlers:
             ch = logging.StreamHandler()
             ch.setLevel(logging.INFO)
-            ch.setFormatter(formatter)
+            ch.setFormatter(logging.Formatter('%(message)s')) # We log raw JSON
             self.logger.addHandler(ch)
 
+        # Held open for the logger's lifetime; closed by close().
+        self._file: BinaryIO = open(self.log_file, "ab")  # noqa: SIM115
+        self._write_lock = threading.Lock()
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+        self._closed = False
+
+        self.index = AuditIndex(index_path) if index_path else None
+
+        self._queue: "queue.Queue[Optional[List[str]]]" = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        if async_mode:
+            self._writer = threading.Thread(target=self._drain, name="audit-writer", daemon=True)
+            self._writer.start()
+
+        self._maintenance_interval = maintenance_interval
+        self._maintenance_wakeup = threading.Event()
+        self._maintenance_lock = threading.Lock()
+        self._maintainer: Optional[threading.Thread] = None
+        if segment_max_bytes or segment_max_age_seconds or retention_days:
+            self._maintainer = threading.Thread(target=self._maintain, name="audit-maintenance", daemon=True)
+            self._maintainer.start()
+        atexit.register(self.close)
+
+    def _write_lines(self, lines: List[str]) -> None:
+        """Append lines with a single write, then fsync according to the policy."""
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+        with _audit_write_stage.time(), self._write_lock:
+            with self.segments.appending(self._file) as self._file:
+                self._file.write(data)
+                self._file.flush()
+                self._dirty = True
+                if self.fsync_policy == "batch" or (
+                    self.fsync_policy == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval
+                ):
+                    self._fsync()
+                size = self._file.tell()
+            if self._rollover_due(size, self.segments.active_since):
+                self._rollover()
+        if self.console:
+            for line in lines:
+                self.logger.info(line)
+
+    def _rollover_due(self, size: int, active_since: float) -> bool:
+        if self.segment_max_bytes and size >= self.segment_max_bytes:
+            return True
+        return bool(self.segment_max_age_seconds and time.time() - active_since >= self.segment_max_age_seconds)
+
+    def _rollover(self, force: bool = False) -> None:
+        """Seal the active file if it is (still) due. Caller holds the write lock.
+
+        The check is repeated under the segment lock, because another process
+        sharing the log may have rolled it over already; our handle then moves
+        to the new active file on the next append.
+        """
+        if self._dirty:
+            self._fsync()
+        sealed = self.segments.seal_active(should_seal=None if force else self._rollover_due)
+        if sealed is not None:
+            self._file.close()
+            self._file = open(self.log_file, "ab")  # noqa: SIM115
+            self._maintenance_wakeup.set()
+
+    def rollover(self) -> None:
+        """Seal the active file now, regardless of size and age."""
+        self.flush()
+        with self._write_lock:
+            self._rollover(force=True)
+
+    def run_maintenance(self) -> None:
+        """Compress sealed segments and apply the retention policy (skipped while another process does it)."""
+        with self._maintenance_lock, self.segments.maintaining() as ours:
+            if not ours:
+                return
+            self.segments.compress_pending()
+            if self.retention_days:
+                start = self.segments.apply_retention(self.retention_days, self.retention_action, self.archive_dir)
+                if self.index is not None:
+                    self.index.prune(start)
+
+    def _maintain(self) -> None:
+        while not self._closed:
+            self._maintenance_wakeup.wait(self._maintenance_interval)
+            self._maintenance_wakeup.clear()
+            try:
+                if self.segment_max_age_seconds:
+                    with self._write_lock:
+                        self._rollover()
+                self.run_maintenance()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Audit maintenance failed: {e}")
+
+    def _fsync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._dirty = False
+
+    def _drain(self) -> None:
+        """Writer thread: group-commit queued events until the stop sentinel arrives."""
+        timeout = self.fsync_interval if self.fsync_policy == "interval" else None
+        while True:
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                # Idle: make sure the last writes reach disk within the interval.
+                with self._write_lock:
+                    if self._dirty:
+                        self._fsync()
+                continue
+
+            batch: List[str] = []
+            taken = 1
+            stop = item is None
+            if item is not None:
+                batch.extend(item)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stop = True
+                else:
+                    batch.extend(item)
+
+            try:
+                if batch:
+                    self._write_lines(batch)
+                    if self.index is not None:
+                        self.index.catch_up(self.segments)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Audit write failed: {e}")
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _submit(self, lines: List[str]) -> None:
+        if self._writer is not None and not self._closed:
+            self._queue.put(lines)  # blocks while the queue is full (backpressure)
+        else:
+            self._write_lines(lines)
+
+    def flush(self) -> None:
+        """Block until every queued event has been written."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+        with self._write_lock:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Flush pending events, fsync and close the log file."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+        if self._maintainer is not None:
+            self._maintenance_wakeup.set()
+            self._maintainer.join()
+        with self._write_lock:
+            self._file.flush()
+            if self._dirty and self.fsync_policy != "never":
+                self._fsync()
+            self._file.close()
+        self.segments.close()
+        if self.index is not None:
+            self.index.close()
+        atexit.unregister(self.close)
+
+    @staticmethod
+    def _build_event(
+        action: str,
+        user: str,
+        secret_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        success: bool = True
+    ) -> Dict[str, Any]:
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "action": action,
+            "user": user,
+            "secret_id": secret_id,
+            "success": success,
+            "details": details or {}
+        }
+
+    @traced()
     def log_event(
         self, 
         action: str, 
@@ -35,33 +280,115 @@ class AuditLogger:
         success: bool = True
     ) -> None:
         """Log a PAM event."""
-        event = {
-            "timestamp": datetime.now().isoformat(),
-            "action": action,
-            "user": user,
-            "secret_id": secret_id,
-            "success": success,
-            "details": details or {}
-        }
+        event = self._build_event(action, user, secret_id, details, success)
         
         # Log structured JSON
-        self.logger.info(json.dumps(event))
+        self._submit([json.dumps(event)])
 
-    def get_logs(self, limit: int = 50) -> List[Dict[str, Any]]:
-        """Retrieve last N logs."""
-        if not os.path.exists(self.log_file):
-            return []
-            
-        logs = []
+    @traced()
+    def log_events(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Log several PAM events with a single write.
+
+        Each item takes the keyword arguments of log_event().
+        """
+        lines = [json.dumps(self._build_event(**event)) for event in events]
+        if lines:
+            self._submit(lines)
+
+    @traced()
+    def get_logs_page(
+        self,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Retrieve a page of logs in chronological order with byte-offset cursors.
+
+        Without cursors this is the newest ``limit`` records. ``before`` returns
+        the records preceding that offset and ``after`` the records following
+        it. The returned ``before``/``after`` cursors are the offsets of the
+        first and last record on the page (None when the page is empty), so
+        clients can keep walking in either direction in constant memory.
+        """
+        page: List[Tuple[int, Dict[str, Any]]] = []
+        if limit > 0:
+            if after is not None:
+                lines = self.segments.iter_from(after)
+                next(lines, None)  # the record at the cursor itself was already seen
+            else:
+                # Skipped (malformed) lines count towards the read budget, keeping reads bounded.
+                lines = self.segments.read_backward(before, limit * 2)
+            for offset, line in lines:
+                try:
+                    page.append((offset, json.loads(line)))
+                except json.JSONDecodeError:
+                    continue
+                if len(page) >= limit:
+                    break
+            if after is None:
+                page.reverse()
+
+        return {
+            "events": [event for _, event in page],
+            "before": page[0][0] if page else None,
+            "after": page[-1][0] if page else None
+        }
+
+    def get_logs(
+        self,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve last N logs (or the page around a cursor, see get_logs_page)."""
         try:
-            with open(self.log_file, 'r') as f:
-                for line in f:
-                    try:
-                        log_entry = json.loads(line.strip())
-                        logs.append(log_entry)
-                    except json.JSONDecodeError:
-                        continue
-        except Exception:
+            return self.get_logs_page(limit, before=before, after=after)["events"]
+        except OSError:
             return []
-            
-        return logs[-limit:]
+
+    def _read_at(self, offsets: List[int]) -> List[Dict[str, Any]]:
+        """Read the records starting at the given byte offsets."""
+        return [json.loads(line) for _, line in self.segments.read_at(offsets)]
+
+    def iter_events(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream every event oldest first, skipping sealed segments outside [since, until)."""
+        for _, line in self.segments.iter_records(since=since, until=until):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            timestamp = event.get("timestamp") or ""
+            if (since and timestamp < since) or (until and timestamp >= until):
+                continue
+            yield event
+
+    @traced()
+    def query(
+        self,
+        user: Optional[str] = None,
+        action: Optional[str] = None,
+        secret_id: Optional[str] = None,
+        success: Optional[bool] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        before: Optional[int] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """Find matching records through the index; returns a page like get_logs_page().
+
+        Only records appended since the last query are parsed to bring the
+        index up to date; the rest of the log is never scanned.
+        """
+        if self.index is None:
+            raise RuntimeError("Audit index is not enabled for this logger")
+
+        self.index.catch_up(self.segments)
+        offsets = self.index.query(
+            user=user, action=action, secret_id=secret_id, success=success,
+            since=since, until=until, before=before, limit=limit
+        )
+        return {
+            "events": self._read_at(offsets),
+            "before": offsets[0] if offsets else None,
+            "after": offsets[-1] if offsets else None
+        }
@@ -0,0 +1,440 @@
+import bz2
+import fcntl
+import gzip
+import json
+import lzma
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from typing import IO, Any, BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+READ_BLOCK_SIZE = 64 * 1024
+
+# codec name -> (file suffix, opener)
+CODECS: Dict[str, Tuple[str, Callable[..., Any]]] = {
+    "gzip": (".gz", gzip.open),
+    "bz2": (".bz2", bz2.open),
+    "lzma": (".xz", lzma.open),
+    "none": ("", open),
+}
+
+
+def read_lines_backward(f: IO[bytes], end: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield (offset, line) for complete lines starting before ``end``, newest first.
+
+    Reads fixed-size blocks from ``end`` towards the start of the file, so the
+    cost depends on how far back the caller reads, not on the size of the file.
+    """
+    pos = end
+    buffer = b""
+    while pos > 0:
+        size = min(READ_BLOCK_SIZE, pos)
+        pos -= size
+        f.seek(pos)
+        buffer = f.read(size) + buffer
+        parts = buffer.split(b"\n")
+        # parts[0] may be the tail of a line that starts in an earlier block.
+        offset = pos + len(buffer)
+        for part in reversed(parts[1:]):
+            offset -= len(part) + 1
+            if part:
+                yield offset + 1, part
+        buffer = parts[0]
+    if buffer:
+        yield 0, buffer
+
+
+def read_lines_forward(f: IO[bytes], start: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield (offset, line) for complete lines starting at ``start``, oldest first."""
+    f.seek(start)
+    offset = start
+    for line in f:
+        if not line.endswith(b"\n"):
+            return  # EOF, or a record still being written
+        yield offset, line[:-1]
+        offset += len(line)
+
+
+class SegmentedLog:
+    """The audit log as a chain of sealed segments plus the active file.
+
+    Sealed segments are renamed out of the way, then compressed in the
+    background and described in a JSON manifest (offset range, time range,
+    record count). Every record keeps a global byte offset -- its position as if
+    all segments were still one file -- so cursors and index entries remain
+    valid across rollovers.
+
+    Several processes may write, roll over and maintain the same log. An flock
+    on ``<log>.lock`` coordinates them: writers hold it shared while appending
+    (see appending()), and sealing and manifest updates hold it exclusively
+    after re-reading the manifest from disk. Readers take it shared just long
+    enough to open the active file together with the matching manifest.
+    Compression and retention run in one process at a time, under
+    ``<log>.maintenance.lock``.
+    """
+
+    def __init__(self, log_file: str, compression: str = "gzip"):
+        if compression not in CODECS:
+            raise ValueError(f"compression must be one of {', '.join(CODECS)}")
+        self.log_file = log_file
+        self.directory = os.path.dirname(os.path.abspath(log_file))
+        self.manifest_path = f"{log_file}.manifest.json"
+        self.lock_path = f"{log_file}.lock"
+        self.compression = compression
+        self._lock = threading.RLock()
+        # One descriptor for the writer's shared lock (serialized by the writer) and one for
+        # everything taken under self._lock; flock conflicts between descriptors, not threads.
+        self._append_lock_file = open(self.lock_path, "a")  # noqa: SIM115
+        self._lock_file = open(self.lock_path, "a")  # noqa: SIM115
+        self._manifest_stamp: Optional[Tuple[int, int]] = None
+        self.manifest = self._load_manifest()
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        self._manifest_stamp = self._stamp()
+        if self._manifest_stamp is not None:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {"version": 1, "next_seq": 1, "base_offset": 0, "active_since": time.time(), "segments": []}
+
+    def _refresh(self) -> None:
+        """Reload the manifest if another process replaced it. Caller holds self._lock."""
+        if self._stamp() != self._manifest_stamp:
+            self.manifest = self._load_manifest()
+
+    def _save_manifest(self) -> None:
+        tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+        self._manifest_stamp = self._stamp()
+
+    @contextmanager
+    def _flocked(self, mode: int) -> Iterator[None]:
+        """Hold self._lock plus the inter-process lock (LOCK_SH or LOCK_EX), with the manifest up to date."""
+        with self._lock:
+            fcntl.flock(self._lock_file, mode)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def appending(self, handle: BinaryIO) -> Iterator[BinaryIO]:
+        """Hold the shared lock for one append and yield the handle to write to.
+
+        If another process sealed the file ``handle`` points at, it is closed
+        and the new active file is opened instead, so no record is written into
+        a sealed segment. Calls must be serialized by the caller.
+        """
+        fcntl.flock(self._append_lock_file, fcntl.LOCK_SH)
+        try:
+            if not self._is_active(handle):
+                handle.close()
+                handle = open(self.log_file, "ab")  # noqa: SIM115 (owned by the caller)
+            yield handle
+        finally:
+            fcntl.flock(self._append_lock_file, fcntl.LOCK_UN)
+
+    def _is_active(self, handle: BinaryIO) -> bool:
+        try:
+            return os.stat(self.log_file).st_ino == os.fstat(handle.fileno()).st_ino
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def _path(self, segment: Dict[str, Any]) -> str:
+        return os.path.join(self.directory, segment["file"])
+
+    def _open(self, segment: Dict[str, Any]) -> IO[bytes]:
+        opener = CODECS[segment["compression"] or "none"][1]
+        return opener(self._path(segment), "rb")
+
+    def _snapshot(self) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            self._refresh()
+            return [dict(s) for s in self.manifest["segments"]], self.manifest["base_offset"]
+
+    @property
+    def active_since(self) -> float:
+        return self.manifest.get("active_since", time.time())
+
+    def start_offset(self) -> int:
+        segments, base = self._snapshot()
+        return segments[0]["start_offset"] if segments else base
+
+    def end_offset(self) -> int:
+        with self._flocked(fcntl.LOCK_SH):
+            size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+            return self.manifest["base_offset"] + size
+
+    def segments(self) -> List[Dict[str, Any]]:
+        return self._snapshot()[0]
+
+    def close(self) -> None:
+        self._append_lock_file.close()
+        self._lock_file.close()
+
+    # --- Writer side ---
+
+    def seal_active(self, should_seal: Optional[Callable[[int, float], bool]] = None) -> Optional[Dict[str, Any]]:
+        """Rename the active file to the next numbered segment.
+
+        Runs under the exclusive lock, so no process is mid-append. The
+        caller's handle should be flushed; writers reopen on their next append
+        (see appending()). ``should_seal(size, active_since)`` is checked
+        against the fresh manifest, so a rollover another process already did
+        isn't repeated. Returns the new segment entry, or None if nothing was
+        sealed (including when the active file is empty).
+        """
+        with self._flocked(fcntl.LOCK_EX):
+            size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+            if size == 0 or (should_seal is not None and not should_seal(size, self.active_since)):
+                return None
+
+            seq = self.manifest["next_seq"]
+            segment = {
+                "seq": seq,
+                "file": f"{os.path.basename(self.log_file)}.{seq:06d}",
+                "start_offset": self.manifest["base_offset"],
+                "size": size,
+                "compression": None,
+                "records": None,
+                "first_ts": None,
+                "last_ts": None,
+                "sealed_at": datetime.now().isoformat()
+            }
+            os.replace(self.log_file, self._path(segment))
+            self.manifest["segments"].append(segment)
+            self.manifest["next_seq"] = seq + 1
+            self.manifest["base_offset"] += size
+            self.manifest["active_since"] = time.time()
+            self._save_manifest()
+            return segment
+
+    @contextmanager
+    def maintaining(self) -> Iterator[bool]:
+        """Yield True if this process got the maintenance lock, False if another process holds it."""
+        with open(f"{self.log_file}.maintenance.lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def compress_pending(self) -> int:
+        """Compress sealed segments and record their time range and record count.
+
+        Streams each segment once; safe to run concurrently with writers and
+        readers. Call it inside maintaining() when several processes share the
+        log. Returns the number of segments processed.
+        """
+        processed = 0
+        for segment in self.segments():
+            if segment["compression"] is not None:
+                continue
+            suffix, opener = CODECS[self.compression]
+            source = self._path(segment)
+            compressing = self.compression != "none"
+            target = f"{source}{suffix}" if compressing else source
+            records = 0
+            first_line: Optional[bytes] = None
+            last_line: Optional[bytes] = None
+            with open(source, "rb") as src:
+                dst = opener(f"{target}.tmp", "wb") if compressing else None
+                try:
+                    for line in src:
+                        records += 1
+                        first_line = first_line or line
+                        last_line = line
+                        if dst is not None:
+                            dst.write(line)
+                finally:
+                    if dst is not None:
+                        dst.close()
+            if compressing:
+                os.replace(f"{target}.tmp", target)
+
+            with self._flocked(fcntl.LOCK_EX):
+                for entry in self.manifest["segments"]:
+                    if entry["seq"] == segment["seq"]:
+                        entry.update(
+                            file=os.path.basename(target),
+                            compression=self.compression,
+                            records=records,
+                            first_ts=self._timestamp(first_line),
+                            last_ts=self._timestamp(last_line)
+                        )
+                self._save_manifest()
+            if compressing:
+                os.remove(source)
+            processed += 1
+        return processed
+
+    @staticmethod
+    def _timestamp(line: Optional[bytes]) -> Optional[str]:
+        if not line:
+            return None
+        try:
+            return json.loads(line).get("timestamp")
+        except json.JSONDecodeError:
+            return None
+
+    def apply_retention(self, days: float, action: str = "delete", archive_dir: Optional[str] = None) -> int:
+        """Delete or archive compressed segments whose newest record is older than ``days``.
+
+        Call it inside maintaining() when several processes share the log.
+        Returns the global offset where the retained log now starts.
+        """
+        if action not in ("delete", "archive"):
+            raise ValueError("action must be 'delete' or 'archive'")
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        for segment in self.segments():
+            if segment["compression"] is None or not segment["last_ts"] or segment["last_ts"] >= cutoff:
+                break  # segments are in time order; keep this one and everything after it
+            with self._flocked(fcntl.LOCK_EX):
+                self.manifest["segments"] = [s for s in self.manifest["segments"] if s["seq"] != segment["seq"]]
+                self._save_manifest()
+            if action == "archive":
+                target_dir = archive_dir or os.path.join(self.directory, "archive")
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(self._path(segment), os.path.join(target_dir, segment["file"]))
+            else:
+                os.remove(self._path(segment))
+        return self.start_offset()
+
+    # --- Reader side ---
+
+    def _open_active(self) -> Tuple[Optional[BinaryIO], int, List[Dict[str, Any]]]:
+        """Open the active file with its base offset and the sealed segments before it.
+
+        Taken under the shared lock, so no rollover can happen in between and
+        the three always agree.
+        """
+        with self._flocked(fcntl.LOCK_SH):
+            segments = [dict(s) for s in self.manifest["segments"]]
+            base = self.manifest["base_offset"]
+            try:
+                return open(self.log_file, "rb"), base, segments  # noqa: SIM115 (closed by the caller)
+            except FileNotFoundError:
+                return None, base, segments
+
+    def iter_from(self, offset: int) -> Iterator[Tuple[int, bytes]]:
+        """Yield (global_offset, line) for every complete record at or after ``offset``."""
+        active, base, segments = self._open_active()
+        with ExitStack() as stack:
+            if active is not None:
+                stack.enter_context(active)
+            for segment in segments:
+                start = segment["start_offset"]
+                if start + segment["size"] <= offset:
+                    continue
+                with self._open(segment) as f:
+                    for local, line in read_lines_forward(f, max(0, offset - start)):
+                        yield start + local, line
+            if active is not None:
+                for local, line in read_lines_forward(active, max(0, offset - base)):
+                    yield base + local, line
+
+    def iter_records(self, since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Tuple[int, bytes]]:
+        """Stream records oldest first, skipping sealed segments outside [since, until)."""
+        active, base, segments = self._open_active()
+        with ExitStack() as stack:
+            if active is not None:
+                stack.enter_context(active)
+            for segment in segments:
+                if since and segment["last_ts"] and segment["last_ts"] < since:
+                    continue
+                if until and segment["first_ts"] and segment["first_ts"] >= until:
+                    return
+                with self._open(segment) as f:
+                    for local, line in read_lines_forward(f, 0):
+                        yield segment["start_offset"] + local, line
+            if active is not None:
+                for local, line in read_lines_forward(active, 0):
+                    yield base + local, line
+
+    def read_backward(self, end: Optional[int], limit: int) -> Iterator[Tuple[int, bytes]]:
+        """Yield up to ``limit`` records starting before global offset ``end``, newest first.
+
+        The active file and uncompressed segments are read backward block by
+        block; a compressed segment is streamed once, keeping only the last
+        ``limit`` records in memory.
+        """
+        remaining = limit
+        f, base, segments = self._open_active()
+        if f is not None:
+            with f:
+                size = f.seek(0, os.SEEK_END)
+                local_end = size if end is None else min(max(end - base, 0), size)
+                lines = read_lines_backward(f, local_end)
+                if local_end == size and size:
+                    f.seek(size - 1)
+                    if f.read(1) != b"\n":
+                        next(lines, None)  # a trailing record that is still being written
+                for local, line in lines:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                    yield base + local, line
+
+        for segment in reversed(segments):
+            start = segment["start_offset"]
+            if remaining <= 0:
+                return
+            if end is not None and start >= end:
+                continue
+            seg_end = segment["size"] if end is None else min(end - start, segment["size"])
+            with self._open(segment) as sf:
+                if segment["compression"] in (None, "none"):
+                    tail: Any = read_lines_backward(sf, seg_end)
+                else:
+                    window: Deque[Tuple[int, bytes]] = deque(maxlen=remaining)
+                    for local, line in read_lines_forward(sf, 0):
+                        if local >= seg_end:
+                            break
+                        window.append((local, line))
+                    tail = reversed(window)
+                for local, line in tail:
+                    if remaining <= 0:
+                        return
+                    remaining -= 1
+                    yield start + local, line
+
+    def read_at(self, offsets: List[int]) -> List[Tuple[int, bytes]]:
+        """Read the records starting at the given global offsets, in the order given."""
+        active_file, base, segments = self._open_active()
+        found: Dict[int, bytes] = {}
+        pending = sorted(set(offsets))
+
+        if active_file is not None:
+            with active_file:
+                for offset in pending:
+                    if offset >= base:
+                        active_file.seek(offset - base)
+                        found[offset] = active_file.readline().rstrip(b"\n")
+
+        for segment in segments:
+            start, stop = segment["start_offset"], segment["start_offset"] + segment["size"]
+            wanted = [o for o in pending if start <= o < stop]
+            if not wanted:
+                continue
+            with self._open(segment) as f:
+                for offset in wanted:  # ascending, so compressed streams only seek forward
+                    f.seek(offset - start)
+                    found[offset] = f.readline().rstrip(b"\n")
+        return [(o, found[o]) for o in offsets if o in found]
@@ -0,0 +1,49 @@
+"""Fixtures and reporting helpers shared by the benchmark scripts."""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, List, Sequence
+
+from vault.vault_engine import VaultEngine
+
+MASTER_KEY = "benchmark-master-key"
+UNITS = {"ms": (1e3, 3), "us": (1e6, 1)}  # unit -> (scale from seconds, decimals)
+
+
+@contextmanager
+def scratch_dir() -> Iterator[str]:
+    """A throwaway directory for a run's databases, logs and policy files."""
+    with tempfile.TemporaryDirectory(prefix="pam-bench-") as tmp:
+        yield tmp
+
+
+def open_vault(directory: str, name: str = "vault.db", **kwargs: Any) -> VaultEngine:
+    """A VaultEngine under MASTER_KEY on ``directory/name``."""
+    return VaultEngine(MASTER_KEY, db_path=os.path.join(directory, name), **kwargs)
+
+
+def time_each(fn: Callable[[Any], Any], items: Iterable[Any]) -> List[float]:
+    """Call ``fn`` on each item and return the seconds each call took."""
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(ordered: Sequence[float], p: float) -> float:
+    """The ``p`` quantile (0-1) of already sorted samples, by nearest rank."""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def latency_line(samples: List[float], unit: str = "ms", mean: bool = True) -> str:
+    """``mean=... p50=... p99=...`` for samples in seconds, printed in ``unit``."""
+    scale, decimals = UNITS[unit]
+    ordered = sorted(samples)
+    stats = [("p50", statistics.median(ordered)), ("p99", percentile(ordered, 0.99))]
+    if mean:
+        stats.insert(0, ("mean", statistics.mean(ordered)))
+    return "  ".join(f"{name}={value * scale:8.{decimals}f} {unit}" for name, value in stats)
@@ -0,0 +1,93 @@
+"""Concurrent secret retrievals through AsyncVault: thread vs process crypto executors.
+
+Runs ``--concurrency`` asyncio tasks that each fetch secrets in a loop, as the
+async /credential endpoint does, and reports throughput alongside the worst
+event loop stall seen by a heartbeat task. "inline" decrypts on the event loop
+and shows what blocking crypto does to every other request.
+
+Usage: python -m benchmarks.bench_concurrency [--secrets 50] [--requests 400] [--concurrency 32]
+           [--workers 1 2 4] [--legacy]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import List, Optional, Tuple
+
+from benchmarks._common import open_vault, scratch_dir
+from vault.async_vault import AsyncVault
+from vault.vault_engine import VaultEngine
+
+
+async def _heartbeat(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Return the longest time the loop took to resume a task scheduled every ``interval`` seconds."""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def _drive(
+    vault: VaultEngine, secret_ids: List[str], requests: int, concurrency: int, async_vault: Optional[AsyncVault]
+) -> Tuple[float, float]:
+    if async_vault is not None:
+        await asyncio.gather(*(async_vault.get_secret(secret_ids[0]) for _ in range(concurrency)))  # start workers
+    rng = random.Random(7)
+    queue = [rng.choice(secret_ids) for _ in range(requests)]
+    stop = asyncio.Event()
+    heartbeat = asyncio.create_task(_heartbeat(stop))
+
+    async def worker() -> None:
+        while queue:
+            secret_id = queue.pop()
+            if async_vault is None:
+                vault.get_secret(secret_id)
+                await asyncio.sleep(0)
+            else:
+                await async_vault.get_secret(secret_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return requests / elapsed, await heartbeat
+
+
+def _report(label: str, rate: float, stall: float) -> None:
+    print(f"{label:<12} {rate:>10,.0f} req/s   worst loop stall {stall * 1000:8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--secrets", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--legacy", action="store_true", help="store legacy PBKDF2 rows (CPU-bound decrypts)")
+    args = parser.parse_args()
+
+    with scratch_dir() as tmp:
+        vault = open_vault(tmp, envelope_encryption=not args.legacy)
+        secret_ids = [f"bench-{i}" for i in range(args.secrets)]
+        for secret_id in secret_ids:
+            vault.store_secret(secret_id, secret_id, "linux", "BenchmarkPass!" * 64)
+
+        kind = "legacy" if args.legacy else "envelope"
+        print(f"{kind} rows, {args.requests} requests, concurrency {args.concurrency}, {os.cpu_count()} CPUs")
+        _report("inline", *asyncio.run(_drive(vault, secret_ids, args.requests, args.concurrency, None)))
+        for executor in ("thread", "process"):
+            for workers in args.workers:
+                async_vault = AsyncVault(vault, crypto_executor=executor, crypto_workers=workers)
+                try:
+                    result = asyncio.run(_drive(vault, secret_ids, args.requests, args.concurrency, async_vault))
+                finally:
+                    async_vault.close()
+                _report(f"{executor} x{workers}", *result)
+        vault.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Per-retrieval latency of VaultEngine.get_secret: legacy PBKDF2 rows vs envelope rows.
+
+Usage: python -m benchmarks.bench_envelope [--secrets 20] [--rounds 5]
+"""
+import argparse
+from typing import List
+
+from benchmarks._common import latency_line, open_vault, scratch_dir, time_each
+from vault.vault_engine import VaultEngine
+
+
+def _time_retrievals(vault: VaultEngine, secret_ids: List[str], rounds: int) -> List[float]:
+    return time_each(vault.get_secret, secret_ids * rounds)
+
+
+def _report(label: str, samples: List[float]) -> None:
+    print(f"{label:<10} n={len(samples):<5} {latency_line(samples)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--secrets", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    with scratch_dir() as tmp:
+        secret_ids = [f"bench-{i}" for i in range(args.secrets)]
+
+        legacy = open_vault(tmp, "legacy.db", envelope_encryption=False)
+        envelope = open_vault(tmp, "envelope.db")
+        for secret_id in secret_ids:
+            legacy.store_secret(secret_id, secret_id, "linux", "BenchmarkPass!")
+            envelope.store_secret(secret_id, secret_id, "linux", "BenchmarkPass!")
+
+        _report("legacy", _time_retrievals(legacy, secret_ids, args.rounds))
+        _report("envelope", _time_retrievals(envelope, secret_ids, args.rounds))
+        legacy.close()
+        envelope.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Access decisions per second: compiled PolicyEngine vs the old per-call list scan.
+
+Usage: python -m benchmarks.bench_policy [--users 10000] [--roles 500] [--decisions 200000]
+"""
+import argparse
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import yaml
+
+from api.policies import PolicyEngine
+from benchmarks._common import scratch_dir
+
+
+def policy_data(users: List[str], roles: int, rng: random.Random) -> Dict[str, Any]:
+    groups = {f"team-{g}": rng.sample(users, 200) for g in range(50)}
+    policies = []
+    for r in range(roles):
+        allowed = rng.sample(users, 100) + [f"@team-{rng.randrange(50)}"]
+        if r % 10 == 0:
+            allowed.append(f"svc-{r}-*")
+        policies.append({"role": f"role-{r}", "approval_required": r % 2 == 0, "allowed_users": allowed})
+    policies.append({"role": "glob-*", "allowed_users": ["*"]})
+    return {"groups": groups, "policies": policies}
+
+
+def _list_scan(data: Dict[str, Any]) -> Callable[[str, str], bool]:
+    """The pre-compilation check: dict lookup by role, then a list membership scan."""
+    groups = data["groups"]
+    by_role = {}
+    for policy in data["policies"]:
+        allowed: List[str] = []
+        for entry in policy["allowed_users"]:
+            allowed.extend(groups[entry[1:]] if entry.startswith("@") else [entry])
+        by_role[policy["role"]] = allowed
+
+    def check(user: str, role: str) -> bool:
+        allowed = by_role.get(role)
+        return allowed is not None and ("*" in allowed or user in allowed)
+    return check
+
+
+def _rate(check: Callable[[str, str], Any], pairs: List[Tuple[str, str]]) -> float:
+    start = time.perf_counter()
+    for user, role in pairs:
+        check(user, role)
+    return len(pairs) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--roles", type=int, default=500)
+    parser.add_argument("--decisions", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    users = [f"user-{i}" for i in range(args.users)]
+    data = policy_data(users, args.roles, rng)
+    pairs = [(rng.choice(users), f"role-{rng.randrange(args.roles)}") for _ in range(args.decisions)]
+
+    with scratch_dir() as tmp:
+        path = os.path.join(tmp, "policies.yaml")
+        with open(path, "w") as f:
+            yaml.safe_dump(data, f)
+        start = time.perf_counter()
+        engine = PolicyEngine(path)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{args.users} users, {args.roles} roles, {args.decisions} decisions (compile {compile_ms:.0f} ms)")
+    print(f"{'list scan':<10} {_rate(_list_scan(data), pairs):>12,.0f} decisions/s")
+    print(f"{'compiled':<10} {_rate(engine.check_access, pairs):>12,.0f} decisions/s")
+
+
+if __name__ == "__main__":
+    main()
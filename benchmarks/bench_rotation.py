@@ -0,0 +1,172 @@
+"""Rotation throughput against thousands of simulated target hosts.
+
+Stores ``--hosts`` linux secrets, one per host, and rotates them all with
+Rotator.rotate_many in each of these modes:
+
+  local  in-process simulators; each change holds a rotator thread while it sleeps
+  http   a TargetService on a local port, reached over keep-alive HTTP
+  async  the async simulator variant driven from one event loop (no vault or
+         rotator), showing what the simulated fleet itself can absorb
+
+Every target draws its latency, failures and timeouts from the same profile.
+Rotator runs retry failed changes (``--attempts``, ``--attempt-timeout``);
+afterwards a sample of hosts is checked to confirm the vault holds the
+password the target accepted.
+
+Usage: python -m benchmarks.bench_rotation [--hosts 10000] [--concurrency 64] [--latency-ms 20]
+           [--distribution lognormal] [--failure-rate 0.01] [--timeout-rate 0.001] [--modes local http async]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+from audit.audit_log import AuditLogger
+from benchmarks._common import latency_line, open_vault, scratch_dir
+from rotation.resilience import Backoff, RetryPolicy
+from rotation.rotator import Rotator
+from rotation.simulators import LATENCY_DISTRIBUTIONS, HttpTargetSimulator, LinuxSimulator, SimulatorProfile
+from rotation.target_service import TargetService
+from vault.vault_engine import VaultEngine
+
+USERNAME = "root"
+
+
+def _host(i: int) -> str:
+    return f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+
+
+def _report(label: str, count: int, elapsed: float, failed: int, timings: List[float]) -> None:
+    line = f"{label:<6} {count / elapsed:>9,.0f} rotations/s  {failed:>5} failed  {elapsed:7.2f}s"
+    if timings:
+        line += f"  per change {latency_line(timings, mean=False)}"
+    print(line)
+
+
+def _rotate(
+    vault: VaultEngine, auditor: AuditLogger, simulator: Any, ids: List[str], args: argparse.Namespace
+) -> Tuple[Dict[str, Any], float]:
+    retry_policy = RetryPolicy(
+        attempts=args.attempts, attempt_timeout=args.attempt_timeout, backoff=Backoff(0.05, 1.0)
+    )
+    rotator = Rotator(
+        vault, auditor, simulators={"linux": simulator}, write_batch_size=500, retry_policy=retry_policy
+    )
+    start = time.perf_counter()
+    summary = rotator.rotate_many(ids, max_concurrency=args.concurrency, triggered_by="benchmark")
+    elapsed = time.perf_counter() - start
+    summary["retries"] = rotator.stats["retries"]
+    return summary, elapsed
+
+
+def _check(
+    vault: VaultEngine, summary: Dict[str, Any], host_of: Dict[str, str], password_of: Any, sample: int = 100
+) -> str:
+    rotated = [r["id"] for r in summary["rotated"]]
+    checked = random.Random(1).sample(rotated, min(sample, len(rotated)))
+    mismatched = sum(
+        vault.get_secret(secret_id) != password_of(host_of[secret_id])
+        for secret_id in checked
+    )
+    return f"{len(checked) - mismatched}/{len(checked)} sampled hosts match the vault"
+
+
+async def _drive_async(simulator: LinuxSimulator, hosts: List[str], concurrency: int) -> Dict[str, Any]:
+    limit = asyncio.Semaphore(concurrency)
+    timings: List[float] = []
+    failed = 0
+
+    async def change(host: str) -> None:
+        nonlocal failed
+        async with limit:
+            start = time.perf_counter()
+            try:
+                if not await simulator.change_password_async(host, USERNAME, "AsyncPass!1"):
+                    failed += 1
+                    return
+            except TimeoutError:
+                failed += 1
+                return
+            timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(change(host) for host in hosts))
+    return {"elapsed": time.perf_counter() - start, "failed": failed, "timings": timings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=64, help="rotator threads")
+    parser.add_argument("--async-concurrency", type=int, default=2000, help="in-flight changes in async mode")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--timeout-rate", type=float, default=0.001)
+    parser.add_argument("--timeout-seconds", type=float, default=1.0)
+    parser.add_argument("--attempts", type=int, default=3, help="target change attempts per rotation")
+    parser.add_argument("--attempt-timeout", type=float, help="time limit per attempt (default: none)")
+    parser.add_argument("--modes", nargs="+", choices=("local", "http", "async"), default=["local", "http", "async"])
+    args = parser.parse_args()
+
+    logging.getLogger("rotation").setLevel(logging.ERROR)
+    profile = {
+        "latency_ms": args.latency_ms, "distribution": args.distribution, "failure_rate": args.failure_rate,
+        "timeout_rate": args.timeout_rate, "timeout_seconds": args.timeout_seconds, "host_capacity": 1, "seed": 7
+    }
+    hosts = [_host(i) for i in range(args.hosts)]
+    print(
+        f"{args.hosts:,} hosts, {args.distribution} latency {args.latency_ms:g} ms, {args.failure_rate:.1%} failures, "
+        f"{args.timeout_rate:.1%} timeouts ({args.timeout_seconds:g}s)"
+    )
+
+    with scratch_dir() as tmp:
+        vault = open_vault(tmp)
+        vault.store_secrets_bulk(
+            {"id": f"host-{i:05d}", "name": host, "type": "linux", "value": "Initial!1",
+             "metadata": {"host": host, "username": USERNAME}}
+            for i, host in enumerate(hosts)
+        )
+        host_of = {f"host-{i:05d}": host for i, host in enumerate(hosts)}
+        ids = list(host_of)
+        auditor = AuditLogger(log_file=os.path.join(tmp, "audit.log"), async_mode=True)
+
+        if "local" in args.modes:
+            simulator = LinuxSimulator(SimulatorProfile(**profile))
+            summary, elapsed = _rotate(vault, auditor, simulator, ids, args)
+            _report("local", args.hosts, elapsed, len(summary["failed"]), [r["seconds"] for r in summary["rotated"]])
+            print(f"       {summary['retries']} retries")
+            print(f"       {_check(vault, summary, host_of, lambda host: simulator.passwords.get((host, USERNAME)))}")
+
+        if "http" in args.modes:
+            service = TargetService(profile=SimulatorProfile(**profile)).start()
+            try:
+                client = HttpTargetSimulator(service.url, "linux", timeout_seconds=args.timeout_seconds * 2)
+                summary, elapsed = _rotate(vault, auditor, client, ids, args)
+                _report("http", args.hosts, elapsed, len(summary["failed"]), [r["seconds"] for r in summary["rotated"]])
+
+                def served(host: str) -> Any:
+                    response = requests.get(client._url(host, USERNAME), timeout=5)
+                    return response.json().get("password")
+                print(f"       {summary['retries']} retries")
+                print(f"       {_check(vault, summary, host_of, served)}")
+                print(f"       target service: {service.simulator.snapshot()}")
+            finally:
+                service.stop()
+
+        if "async" in args.modes:
+            simulator = LinuxSimulator(SimulatorProfile(**profile))
+            result = asyncio.run(_drive_async(simulator, hosts, args.async_concurrency))
+            _report("async", args.hosts, result["elapsed"], result["failed"], result["timings"])
+
+        auditor.close()
+        vault.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""On-disk size and read latency: base64 text columns vs secret blobs.
+
+Builds one vault per storage format with ``--secrets`` rows (values are drawn
+from a pool of ``--distinct`` encryptions, so building a 1M-row vault is
+dominated by SQLite, not crypto), then times random get_secret calls and the
+fetch-and-decode step alone.
+
+Usage: python -m benchmarks.bench_storage [--secrets 1000000] [--reads 20000]
+"""
+import argparse
+import os
+import random
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from benchmarks._common import MASTER_KEY, latency_line, scratch_dir, time_each
+from vault.crypto import CryptoEngine
+from vault.vault_engine import INSERT_SECRET_SQL, VaultEngine
+
+
+def _rows(vault: VaultEngine, count: int, pool: List[Dict[str, object]]) -> Iterator[Tuple[object, ...]]:
+    now = "2025-01-01T00:00:00"
+    metadata = '{"role": "linux-admin", "host": "10.0.0.1"}'
+    for i in range(count):
+        encrypted = vault._encrypted_to_row(pool[i % len(pool)])
+        yield (f"secret-{i:07d}", f"Secret {i}", "linux", *encrypted, metadata, "linux-admin", "10.0.0.1", now, now)
+
+
+def build_vault(
+    path: str, count: int, distinct: int, encrypt: Callable[[CryptoEngine, str], Dict[str, object]]
+) -> VaultEngine:
+    vault = VaultEngine(MASTER_KEY, db_path=path)
+    pool = [encrypt(vault.crypto, f"Password-{i:04d}!xyz") for i in range(distinct)]
+    rows = _rows(vault, count, pool)
+    with vault._get_conn() as conn:
+        while True:
+            chunk = [*islice(rows, 10000)]
+            if not chunk:
+                break
+            conn.executemany(INSERT_SECRET_SQL, chunk)
+            conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return vault
+
+
+def _size(vault: VaultEngine) -> Tuple[int, float]:
+    """Return the database size and the mean stored bytes of the encrypted columns per row."""
+    with vault._get_conn() as conn:
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        size = pages * conn.execute("PRAGMA page_size").fetchone()[0]
+        payload = conn.execute(
+            "SELECT avg(coalesce(length(secret_blob), 0) + coalesce(length(ciphertext), 0) + coalesce(length(iv), 0)"
+            " + coalesce(length(salt), 0) + coalesce(length(tag), 0) + coalesce(length(wrapped_key), 0)) FROM secrets"
+        ).fetchone()[0]
+    return size, payload
+
+
+def _report(label: str, samples: List[float]) -> str:
+    return f"{label} {latency_line(samples, unit='us')}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--secrets", type=int, default=1_000_000)
+    parser.add_argument("--distinct", type=int, default=1000, help="distinct encrypted values to cycle through")
+    parser.add_argument("--reads", type=int, default=20000)
+    args = parser.parse_args()
+
+    formats = {
+        "base64": lambda crypto, value: crypto.encrypt(value),
+        "blob": lambda crypto, value: crypto.encrypt_blob(value),
+    }
+    rng = random.Random(42)
+    ids = [f"secret-{rng.randrange(args.secrets):07d}" for _ in range(args.reads)]
+
+    with scratch_dir() as tmp:
+        print(f"{args.secrets:,} secrets, {args.reads:,} random reads")
+        for label, encrypt in formats.items():
+            start = time.perf_counter()
+            vault = build_vault(os.path.join(tmp, f"{label}.db"), args.secrets, args.distinct, encrypt)
+            build_seconds = time.perf_counter() - start
+            size, payload = _size(vault)
+
+            def fetch_and_decode(secret_id: str, vault: VaultEngine = vault) -> object:
+                encrypted = vault._read_encrypted(secret_id)
+                return CryptoEngine._parts(encrypted) if encrypted else None
+
+            print(
+                f"{label:<7} {size / 1e6:9.1f} MB  {size / args.secrets:6.1f} B/secret  "
+                f"{payload:6.1f} B encrypted value  (built in {build_seconds:.1f}s)"
+            )
+            print(f"        {_report('fetch+decode', time_each(fetch_and_decode, ids))}")
+            print(f"        {_report('get_secret  ', time_each(vault.get_secret, ids))}")
+            vault.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""End-to-end load test of the JIT access flow against a running API.
+
+Starts uvicorn on a free local port with a throwaway vault, request store,
+audit log and policy file (or targets ``--url``), seeds ``--secrets`` secrets,
+then runs one stage per ``--concurrency`` level. In each stage that many
+virtual users work through a fixed, seeded sequence of scenarios:
+
+  jit         POST /request -> POST /approve -> GET /credential
+  auto        POST /request (auto-approved role) -> GET /credential
+  credential  GET /credential again on a lease obtained earlier
+  rotate      POST /rotate/{id}
+  audit       GET /audit
+
+Per stage it reports throughput and p50/p95/p99 latency per endpoint, and
+marks the saturation point: the last concurrency level whose throughput was
+still more than ``--knee`` above the previous one. Results are written as JSON
+(with the git commit) and can be compared against an earlier run with
+``--baseline``. The load generator shares the machine with the server, so
+compare runs made on the same host.
+
+Usage: python -m benchmarks.loadtest [--concurrency 10,50,100,200,500] [--scenarios 2000]
+           [--mix jit=5,auto=2,credential=3,rotate=0.1,audit=1] [--seed 1] [--workers 1]
+           [--output load.json] [--baseline earlier.json] [--url http://host:port]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from benchmarks._common import MASTER_KEY, percentile, scratch_dir
+
+LOAD_POLICIES = """
+policies:
+  - role: load-approval
+    approval_required: true
+    ttl_minutes: 60
+    allowed_users: ["*"]
+  - role: load-auto
+    approval_required: false
+    ttl_minutes: 60
+    allowed_users: ["*"]
+"""
+DEFAULT_MIX = "jit=5,auto=2,credential=3,rotate=0.1,audit=1"
+SCENARIOS = ("jit", "auto", "credential", "rotate", "audit")
+ADMIN = {"X-User": "load-admin"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def local_server(workers: int) -> Iterator[str]:
+    """Run the API in a uvicorn subprocess on throwaway files; yields its base URL."""
+    with scratch_dir() as tmp:
+        policy_file = os.path.join(tmp, "policies.yaml")
+        with open(policy_file, "w") as f:
+            f.write(LOAD_POLICIES)
+        env = {
+            **os.environ,
+            "PAM_MASTER_KEY": MASTER_KEY,
+            "DB_PATH": os.path.join(tmp, "vault.db"),
+            "AUDIT_LOG_FILE": os.path.join(tmp, "audit.log"),
+            "POLICY_FILE": policy_file,
+            "ROTATION_SCHEDULER_ENABLED": "false",
+        }
+        port = _free_port()
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "api.server:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning", "--no-access-log"
+            ],
+            env=env
+        )
+        url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"API server exited with status {server.returncode}")
+                try:
+                    if httpx.get(f"{url}/openapi.json", timeout=1).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("API server did not start within 30s")
+                time.sleep(0.2)
+            yield url
+        finally:
+            server.terminate()
+            server.wait(10)
+
+
+def seed_secrets(url: str, count: int) -> List[Tuple[str, str]]:
+    """Create ``count`` secrets split between the two load roles. Returns (id, role) pairs."""
+    secrets = [
+        (f"load-{i:05d}", "load-approval" if i % 2 == 0 else "load-auto")
+        for i in range(count)
+    ]
+    for start in range(0, count, 500):
+        batch = [{
+            "id": secret_id, "name": secret_id, "type": "linux", "value": f"LoadPass-{secret_id}",
+            "metadata": {"role": role, "host": f"10.0.{i // 250}.{i % 250}"}
+        } for i, (secret_id, role) in enumerate(secrets[start:start + 500], start=start)]
+        r = httpx.post(f"{url}/secrets:batch", json={"secrets": batch}, headers=ADMIN, timeout=120)
+        r.raise_for_status()
+    return secrets
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario '{name}' (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Recorder:
+    """Latencies and error counts per endpoint for one stage."""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, path: str, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            r = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[endpoint].append(time.perf_counter() - start)
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - start)
+        if r.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return r.json()
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {endpoint: _percentiles(samples, self.errors[endpoint])
+                for endpoint, samples in sorted(self.latencies.items())}
+
+
+def _percentiles(samples: List[float], errors: int) -> Dict[str, Any]:
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return round(percentile(ordered, p) * 1000, 2)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "p50_ms": rank(0.50),
+        "p95_ms": rank(0.95),
+        "p99_ms": rank(0.99)
+    }
+
+
+class LoadRun:
+    def __init__(self, url: str, secrets: List[Tuple[str, str]], seed: int):
+        self.url = url
+        self.by_role: Dict[str, List[str]] = defaultdict(list)
+        for secret_id, role in secrets:
+            self.by_role[role].append(secret_id)
+        self.all_ids = [secret_id for secret_id, _ in secrets]
+        self.seed = seed
+        # Leases obtained so far, reused by the "credential" scenario.
+        self.leases: List[Tuple[str, str]] = []
+
+    async def _lease(
+        self, client: httpx.AsyncClient, rec: Recorder, rng: random.Random, user: str, role: str
+    ) -> Optional[str]:
+        body = {"user": user, "secret_id": rng.choice(self.by_role[role]), "reason": "load test"}
+        created = await rec.call(client, "POST /request", "POST", "/request", json=body)
+        if not created:
+            return None
+        req_id = created["request_id"]
+        if created["status"] == "pending_approval":
+            approval = {"admin_user": "load-admin", "request_id": req_id, "decision": "APPROVED"}
+            if not await rec.call(client, "POST /approve", "POST", "/approve", json=approval, headers=ADMIN):
+                return None
+        return req_id
+
+    async def scenario(self, client: httpx.AsyncClient, rec: Recorder, rng: random.Random, name: str) -> None:
+        user = f"load-user-{rng.randrange(200)}"
+        if name == "credential" and self.leases:
+            user, req_id = rng.choice(self.leases)
+        elif name in ("jit", "auto", "credential"):
+            lease = await self._lease(client, rec, rng, user, "load-auto" if name == "auto" else "load-approval")
+            if lease is None:
+                return
+            req_id = lease
+            self.leases.append((user, req_id))
+        elif name == "rotate":
+            await rec.call(client, "POST /rotate", "POST", f"/rotate/{rng.choice(self.all_ids)}", headers=ADMIN)
+            return
+        else:
+            await rec.call(client, "GET /audit", "GET", "/audit", params={"limit": 50}, headers=ADMIN)
+            return
+        await rec.call(client, "GET /credential", "GET", f"/credential/{req_id}", headers={"X-User": user})
+
+    async def stage(self, concurrency: int, plan: List[str], stage_seed: int) -> Dict[str, Any]:
+        rec = Recorder()
+        queue = iter(plan)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.url, limits=limits, timeout=120) as client:
+            async def virtual_user(index: int) -> None:
+                rng = random.Random(stage_seed * 100_003 + index)
+                for name in queue:
+                    await self.scenario(client, rec, rng, name)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+            elapsed = time.perf_counter() - start
+
+        requests = sum(len(samples) for samples in rec.latencies.values())
+        return {
+            "concurrency": concurrency,
+            "scenarios": len(plan),
+            "requests": requests,
+            "errors": sum(rec.errors.values()),
+            "elapsed_seconds": round(elapsed, 3),
+            "requests_per_second": round(requests / elapsed, 1),
+            "scenarios_per_second": round(len(plan) / elapsed, 1),
+            "endpoints": rec.summary()
+        }
+
+
+def plan_stage(mix: Dict[str, float], scenarios: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    names = [*mix]
+    return rng.choices(names, weights=[mix[n] for n in names], k=scenarios)
+
+
+def find_saturation(stages: List[Dict[str, Any]], knee: float) -> Optional[int]:
+    """The last concurrency level that still raised throughput by more than ``knee``; None if never saturated."""
+    for previous, current in zip(stages, stages[1:]):
+        if current["requests_per_second"] < previous["requests_per_second"] * (1 + knee):
+            return previous["concurrency"]
+    return None
+
+
+def compare(stages: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print throughput and p99 changes per stage against a baseline run. Returns the regressions."""
+    earlier = {stage["concurrency"]: stage for stage in baseline["stages"]}
+    regressions = []
+    print(f"\n{'stage / endpoint':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+    for stage in stages:
+        before = earlier.get(stage["concurrency"])
+        if before is None:
+            continue
+        rows = [(f"c={stage['concurrency']} req/s", before["requests_per_second"], stage["requests_per_second"], -1)]
+        for endpoint, result in stage["endpoints"].items():
+            if endpoint in before["endpoints"]:
+                rows.append((f"  {endpoint} p99 ms", before["endpoints"][endpoint]["p99_ms"], result["p99_ms"], 1))
+        for label, old, new, worse in rows:
+            change = new / old - 1 if old else 0.0
+            flag = ""
+            if change * worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append(label.strip())
+            print(f"{label:<28} {old:>12,.1f} {new:>12,.1f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_stage(stage: Dict[str, Any]) -> None:
+    print(
+        f"\nconcurrency {stage['concurrency']}: {stage['requests_per_second']:,.0f} req/s, "
+        f"{stage['scenarios_per_second']:,.0f} scenarios/s, {stage['errors']} errors in {stage['elapsed_seconds']}s"
+    )
+    for endpoint, r in stage["endpoints"].items():
+        print(
+            f"  {endpoint:<16} n={r['count']:<6} p50={r['p50_ms']:>8.1f} ms  p95={r['p95_ms']:>8.1f} ms  "
+            f"p99={r['p99_ms']:>8.1f} ms  errors={r['errors']}"
+        )
+
+
+def run(args: argparse.Namespace, url: str) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    secrets = seed_secrets(url, args.secrets)
+    load = LoadRun(url, secrets, args.seed)
+
+    if args.warmup:
+        asyncio.run(load.stage(levels[0], plan_stage(mix, args.warmup, args.seed - 1), args.seed - 1))
+    stages = []
+    for number, concurrency in enumerate(levels):
+        stage_seed = args.seed * 1000 + number
+        stage = asyncio.run(load.stage(concurrency, plan_stage(mix, args.scenarios, stage_seed), stage_seed))
+        _print_stage(stage)
+        stages.append(stage)
+
+    saturation = find_saturation(stages, args.knee)
+    print(f"\nSaturation: {f'concurrency {saturation}' if saturation else 'not reached'}")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "url": args.url or "local",
+            "workers": args.workers,
+            "mix": mix,
+            "scenarios_per_stage": args.scenarios,
+            "secrets": args.secrets,
+            "seed": args.seed
+        },
+        "stages": stages,
+        "saturation_concurrency": saturation
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="10,50,100,200,500", help="comma-separated virtual user counts")
+    parser.add_argument("--scenarios", type=int, default=2000, help="scenarios per stage")
+    parser.add_argument("--warmup", type=int, default=200, help="unrecorded scenarios before the first stage")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. jit=5,audit=1")
+    parser.add_argument("--secrets", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the local server")
+    parser.add_argument("--url", help="target a running API (its policies must define the load-* roles)")
+    parser.add_argument("--knee", type=float, default=0.1, help="throughput gain below which load is saturated")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="change that counts as a regression")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        report = run(args, args.url.rstrip("/"))
+    else:
+        with local_server(args.workers) as url:
+            report = run(args, url)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["stages"], json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""Micro-benchmark suite for the crypto, vault, policy, workflow and audit hot paths.
+
+Each case is timed in ``--repeat`` samples of enough calls to last at least
+``--min-time`` seconds; the median per-call time is what gets compared. Results
+are written as JSON. With ``--baseline`` the run is compared against an earlier
+results file, and any case slower by more than ``--threshold`` is flagged as a
+regression (exit status 1).
+
+Usage: python -m benchmarks.suite [--quick] [--only PATTERN] [--output results.json]
+           [--baseline baseline.json] [--threshold 0.2] [--audit-log-mb 2048]
+"""
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import yaml
+
+from api.policies import PolicyEngine
+from audit.audit_log import AuditLogger
+from benchmarks._common import MASTER_KEY, scratch_dir
+from benchmarks.bench_policy import policy_data
+from benchmarks.bench_storage import build_vault
+from vault.crypto import CryptoEngine
+from workflow.access_requests import AccessWorkflow
+from workflow.stores import REQUEST_COLUMNS, InMemoryRequestStore, RequestStore, SQLiteRequestStore
+
+
+class Context:
+    """Sizes for this run, a scratch directory and cleanups for the cases' fixtures."""
+
+    def __init__(self, root: str, quick: bool, audit_log_mb: int):
+        self.root = root
+        self.quick = quick
+        self.audit_log_mb = audit_log_mb
+        self.cleanup = ExitStack()
+        self.rng = random.Random(42)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+
+Setup = Callable[[Context], Callable[[], Any]]
+CASES: List[Tuple[str, Setup]] = []
+
+
+def case(name: str) -> Callable[[Setup], Setup]:
+    """Register a benchmark. The setup function builds fixtures and returns the operation to time."""
+    def register(setup: Setup) -> Setup:
+        CASES.append((name, setup))
+        return setup
+    return register
+
+
+def vault_sizes(ctx: Context) -> Tuple[int, ...]:
+    return (1_000, 10_000) if ctx.quick else (1_000, 100_000)
+
+
+# --- crypto -----------------------------------------------------------------
+
+def _envelope_crypto() -> CryptoEngine:
+    crypto = CryptoEngine(MASTER_KEY)
+    crypto.load_kek(1, b"benchmark-salt-1")
+    return crypto
+
+
+@case("crypto.encrypt")
+def _crypto_encrypt(_ctx: Context) -> Callable[[], Any]:
+    crypto = _envelope_crypto()
+    return lambda: crypto.encrypt_blob("BenchmarkPass!")
+
+
+@case("crypto.decrypt")
+def _crypto_decrypt(_ctx: Context) -> Callable[[], Any]:
+    crypto = _envelope_crypto()
+    encrypted = crypto.encrypt_blob("BenchmarkPass!")
+    return lambda: crypto.decrypt(encrypted)
+
+
+@case("crypto.decrypt_legacy")
+def _crypto_decrypt_legacy(_ctx: Context) -> Callable[[], Any]:
+    crypto = CryptoEngine(MASTER_KEY)
+    encrypted = crypto.encrypt_blob("BenchmarkPass!")  # no KEK loaded: per-secret PBKDF2
+    return lambda: crypto.decrypt(encrypted)
+
+
+# --- vault ------------------------------------------------------------------
+
+def _vault_cases(index: int) -> None:
+    """Register VaultEngine cases against the ``index``-th vault size."""
+    def fixture(ctx: Context) -> Tuple[Any, List[str]]:
+        rows = vault_sizes(ctx)[index]
+        key = f"vault-{rows}"
+        if key not in _fixtures:
+            vault = build_vault(ctx.path(f"{key}.db"), rows, 1000, lambda crypto, value: crypto.encrypt_blob(value))
+            ctx.cleanup.callback(vault.close)
+            _fixtures[key] = (vault, [f"secret-{i:07d}" for i in range(rows)])
+        return _fixtures[key]
+
+    label = ("small", "large")[index]
+
+    @case(f"vault.get_secret[{label}]")
+    def _get_secret(ctx: Context) -> Callable[[], Any]:
+        vault, ids = fixture(ctx)
+        return lambda: vault.get_secret(ctx.rng.choice(ids))
+
+    @case(f"vault.get_metadata[{label}]")
+    def _get_metadata(ctx: Context) -> Callable[[], Any]:
+        vault, ids = fixture(ctx)
+        return lambda: vault.get_metadata(ctx.rng.choice(ids))
+
+    @case(f"vault.list_page[{label}]")
+    def _list_page(ctx: Context) -> Callable[[], Any]:
+        vault, ids = fixture(ctx)
+        return lambda: vault.list_secrets(after=ctx.rng.choice(ids), limit=100, role="linux-admin")
+
+    @case(f"vault.store_secret[{label}]")
+    def _store_secret(ctx: Context) -> Callable[[], Any]:
+        vault, _ = fixture(ctx)
+        counter = itertools.count()
+        return lambda: vault.store_secret(f"new-{next(counter):08d}", "New", "linux", "NewPass!", {"role": "db"})
+
+    @case(f"vault.update_secret_value[{label}]")
+    def _update(ctx: Context) -> Callable[[], Any]:
+        vault, ids = fixture(ctx)
+        return lambda: vault.update_secret_value(ctx.rng.choice(ids), "RotatedPass!")
+
+
+_fixtures: Dict[str, Any] = {}
+_vault_cases(0)
+_vault_cases(1)
+
+
+# --- policy -----------------------------------------------------------------
+
+def _policy_engine(ctx: Context, decision_cache_size: int, distinct_pairs: int) -> Tuple[PolicyEngine, Any]:
+    users = [f"user-{i}" for i in range(10_000)]
+    path = ctx.path("policies.yaml")
+    if not os.path.exists(path):
+        with open(path, "w") as f:
+            yaml.safe_dump(policy_data(users, 500, random.Random(42)), f)
+    engine = PolicyEngine(path, decision_cache_size=decision_cache_size)
+    pairs = [(ctx.rng.choice(users), f"role-{ctx.rng.randrange(500)}") for _ in range(distinct_pairs)]
+    return engine, itertools.cycle(pairs)
+
+
+@case("policy.check_access")
+def _check_access(ctx: Context) -> Callable[[], Any]:
+    engine, pairs = _policy_engine(ctx, 0, 100_000)
+    return lambda: engine.check_access(*next(pairs))
+
+
+@case("policy.check_access_cached")
+def _check_access_cached(ctx: Context) -> Callable[[], Any]:
+    engine, pairs = _policy_engine(ctx, 50_000, 10_000)  # a hot set that fits the cache
+    return lambda: engine.check_access(*next(pairs))
+
+
+# --- workflow ---------------------------------------------------------------
+
+def _workflow(ctx: Context, store: RequestStore) -> Tuple[AccessWorkflow, List[str]]:
+    """Fill ``store`` with approved requests spread over 1000 users."""
+    count = 20_000 if ctx.quick else 200_000
+    now = time.time()
+    stamp = datetime.fromtimestamp(now).isoformat()
+    requests: List[Dict[str, Any]] = [{
+        "id": f"req-{i:07d}", "user": f"user-{i % 1000}", "secret_id": f"secret-{i % 5000}", "reason": "bench",
+        "status": "APPROVED", "created_at": stamp, "approver": "admin", "approved_at": stamp,
+        "expires_at": stamp, "expires_at_ts": now + 3600
+    } for i in range(count)]
+    if isinstance(store, SQLiteRequestStore):
+        with store.pool.connection() as conn:
+            conn.executemany(
+                f'INSERT INTO access_requests ({", ".join(REQUEST_COLUMNS)}) '
+                f'VALUES ({", ".join("?" for _ in REQUEST_COLUMNS)})',
+                [tuple(req[column] for column in REQUEST_COLUMNS) for req in requests]
+            )
+            conn.commit()
+    else:
+        for req in requests:
+            store.add(req)
+    ctx.cleanup.callback(store.close)
+    return AccessWorkflow(store), [req["id"] for req in requests]
+
+
+def _workflow_cases(backend: str, make_store: Callable[[Context], RequestStore]) -> None:
+    @case(f"workflow.is_access_valid[{backend}]")
+    def _is_access_valid(ctx: Context) -> Callable[[], Any]:
+        workflow, ids = _workflow(ctx, make_store(ctx))
+
+        def op() -> bool:
+            req_id = ctx.rng.choice(ids)
+            return workflow.is_access_valid(req_id, f"user-{int(req_id[4:]) % 1000}")
+        return op
+
+    @case(f"workflow.list_requests[{backend}]")
+    def _list_requests(ctx: Context) -> Callable[[], Any]:
+        workflow, _ = _workflow(ctx, make_store(ctx))
+        return lambda: workflow.list_requests(user=f"user-{ctx.rng.randrange(1000)}", status="APPROVED")
+
+
+_workflow_cases("memory", lambda _ctx: InMemoryRequestStore())
+_workflow_cases("sqlite", lambda ctx: SQLiteRequestStore(ctx.path(f"requests-{time.monotonic_ns()}.db")))
+
+
+# --- audit ------------------------------------------------------------------
+
+@case("audit.log_event")
+def _log_event(ctx: Context) -> Callable[[], Any]:
+    auditor = AuditLogger(ctx.path("audit-sync.log"))
+    ctx.cleanup.callback(auditor.close)
+    return lambda: auditor.log_event("SECRET_RETRIEVED", "alice", "secret-1", {"req_id": "abc123"})
+
+
+@case("audit.log_event_async")
+def _log_event_async(ctx: Context) -> Callable[[], Any]:
+    auditor = AuditLogger(ctx.path("audit-async.log"), async_mode=True, fsync_policy="interval")
+    ctx.cleanup.callback(auditor.close)
+    return lambda: auditor.log_event("SECRET_RETRIEVED", "alice", "secret-1", {"req_id": "abc123"})
+
+
+def _large_audit_log(ctx: Context) -> Tuple[AuditLogger, int]:
+    """An audit log of ``audit_log_mb`` MB made of equal-length records. Returns it and its line length."""
+    if "audit-large" not in _fixtures:
+        template = (
+            '{{"timestamp": "2025-01-01T00:00:00.{i:06d}", "action": "SECRET_RETRIEVED", "user": "user-{u:04d}", '
+            '"secret_id": "secret-{i:06d}", "success": true, "details": {{"req_id": "r{i:06d}"}}}}\n'
+        )
+        block = "".join(template.format(i=i, u=i % 1000) for i in range(10_000)).encode()
+        line_length = len(block) // 10_000
+        path = ctx.path("audit-large.log")
+        with open(path, "wb") as f:
+            for _ in range(max(1, ctx.audit_log_mb * 1024 * 1024 // len(block))):
+                f.write(block)
+        auditor = AuditLogger(path)
+        ctx.cleanup.callback(auditor.close)
+        _fixtures["audit-large"] = (auditor, line_length)
+    return _fixtures["audit-large"]
+
+
+@case("audit.get_logs_tail")
+def _get_logs_tail(ctx: Context) -> Callable[[], Any]:
+    auditor, _ = _large_audit_log(ctx)
+    return lambda: auditor.get_logs(limit=50)
+
+
+@case("audit.get_logs_page")
+def _get_logs_page(ctx: Context) -> Callable[[], Any]:
+    auditor, line_length = _large_audit_log(ctx)
+    lines = os.path.getsize(auditor.log_file) // line_length
+    return lambda: auditor.get_logs_page(limit=50, before=ctx.rng.randrange(50, lines) * line_length)
+
+
+# --- runner -----------------------------------------------------------------
+
+def measure(op: Callable[[], Any], min_time: float, repeat: int) -> Dict[str, Any]:
+    """Time ``op`` in ``repeat`` samples of ``number`` calls, each sample lasting at least ``min_time``."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+    per_call = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        per_call.append((time.perf_counter() - start) / number)
+    median = statistics.median(per_call)
+    return {
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(per_call) * 1e6, 3) if len(per_call) > 1 else 0.0,
+        "ops_per_sec": round(1 / median, 1),
+        "number": number,
+        "repeat": repeat
+    }
+
+
+def run(ctx: Context, patterns: List[str], min_time: float, repeat: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, setup in CASES:
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        op = setup(ctx)
+        results[name] = measure(op, min_time, repeat)
+        r = results[name]
+        print(f"{name:<36} {r['median_us']:>12,.1f} us  {r['ops_per_sec']:>12,.0f} ops/s  (n={r['number']})")
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Print each case's change against the baseline. Returns the names of regressed cases."""
+    regressions = []
+    print(f"\n{'case':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<36} {'-':>12} {result['median_us']:>10,.1f}us {'new':>8}")
+            continue
+        before = baseline[name]["median_us"]
+        change = result["median_us"] / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  improved"
+        print(f"{name:<36} {before:>10,.1f}us {result['median_us']:>10,.1f}us {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="smaller fixtures and shorter samples")
+    parser.add_argument("--only", action="append", default=[], help="glob of case names to run (repeatable)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression")
+    parser.add_argument("--min-time", type=float, help="seconds per sample (default 0.2, or 0.05 with --quick)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--audit-log-mb", type=int, help="size of the audit log for get_logs (default 2048, or 64)")
+    parser.add_argument("--list", action="store_true", help="list case names and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(name for name, _ in CASES))
+        return 0
+
+    min_time = args.min_time or (0.05 if args.quick else 0.2)
+    audit_log_mb = args.audit_log_mb or (64 if args.quick else 2048)
+    with scratch_dir() as tmp:
+        ctx = Context(tmp, args.quick, audit_log_mb)
+        with ctx.cleanup:
+            results = run(ctx, args.only, min_time, args.repeat)
+        _fixtures.clear()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "vault_rows": [*vault_sizes(ctx)],
+            "audit_log_mb": audit_log_mb
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("quick") != args.quick:
+            print("\nWarning: the baseline was recorded with different fixture sizes (--quick)")
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,8 @@
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
 
 import requests
 import typer
@@ -46,26 +51,132 @@ def init() -> None:
         except requests.exceptions.RequestException as e:
             _handle_request_error(e)
 
+IMPORT_FIELDS = ("id", "name", "type", "value")
+
+def _read_csv(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield secrets from a CSV file. Columns other than id/name/type/value become metadata,
+    and a 'metadata' column holding a JSON object is merged in."""
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            metadata = json.loads(row.pop("metadata") or "{}") if "metadata" in row else {}
+            metadata.update({k: v for k, v in row.items() if k not in IMPORT_FIELDS and v})
+            item: Dict[str, Any] = {k: row.get(k) for k in IMPORT_FIELDS}
+            item["metadata"] = metadata
+            yield item
+
+def _read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield secrets from a JSON Lines file, one object per line."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+@app.command(name="import")
+def import_secrets(
+    path: Path,
+    fmt: str = typer.Option("auto", "--format", help="csv, jsonl or auto (by file extension)"),
+    batch_size: int = typer.Option(500, help="Secrets sent per /secrets:batch request"),
+) -> None:
+    """Bulk-import secrets from a CSV or JSONL file, streaming it in batches."""
+    if fmt == "auto":
+        fmt = "csv" if path.suffix.lower() == ".csv" else "jsonl"
+    if fmt not in ("csv", "jsonl"):
+        console.print(f"[red]Unsupported format: {fmt}[/red]")
+        raise typer.Exit(code=1)
+
+    rows = _read_csv(path) if fmt == "csv" else _read_jsonl(path)
+    created = failed = 0
+    try:
+        while True:
+            batch = [*islice(rows, batch_size)]
+            if not batch:
+                break
+            r = requests.post(f"{API_URL}/secrets:batch", json={"secrets": batch}, headers={"X-User": CURRENT_USER})
+            if r.status_code != 200:
+                console.print(f"[red]Batch rejected: {r.text}[/red]")
+                raise typer.Exit(code=1)
+
+            data = r.json()
+            created += data["created"]
+            failed += data["failed"]
+            for result in data["results"]:
+                if result["status"] != "created":
+                    console.print(f"[red]Failed to import {result.get('id')}: {result.get('error')}[/red]")
+    except requests.exceptions.RequestException as e:
+        _handle_request_error(e)
+    except (ValueError, csv.Error) as e:
+        console.print(f"[red]Could not parse {path}: {e}[/red]")
+        raise typer.Exit(code=1) from e
+
+    console.print(f"[green]Imported {created} secrets[/green] ({failed} failed)")
+
 @app.command()
-def list() -> None:
-    """List all secrets in the vault."""
+def export(
+    kind: str,
+    output: Path,
+    secret_type: Optional[str] = typer.Option(None, "--type", help="Secrets: only this type"),
+    role: Optional[str] = typer.Option(None, help="Secrets: only this role"),
+    host: Optional[str] = typer.Option(None, help="Secrets: only this host"),
+    since: Optional[str] = typer.Option(None, help="Audit: only events at or after this ISO timestamp"),
+    until: Optional[str] = typer.Option(None, help="Audit: only events before this ISO timestamp"),
+) -> None:
+    """Stream secret metadata (KIND=secrets) or audit events (KIND=audit) to an NDJSON file."""
+    if kind not in ("secrets", "audit"):
+        console.print(f"[red]Unknown export: {kind} (expected secrets or audit)[/red]")
+        raise typer.Exit(code=1)
+    filters = (
+        {"type": secret_type, "role": role, "host": host} if kind == "secrets" else {"since": since, "until": until}
+    )
+    params = {k: v for k, v in filters.items() if v is not None}
     try:
-        r = requests.get(f"{API_URL}/secrets", headers={"X-User": CURRENT_USER})
-        if r.status_code != 200:
-             console.print(f"[red]Error fetching secrets: {r.text}[/red]")
-             return
+        with requests.get(
+            f"{API_URL}/{kind}/export", params=params, headers={"X-User": CURRENT_USER}, stream=True
+        ) as r:
+            if r.status_code != 200:
+                console.print(f"[red]Export failed: {r.text}[/red]")
+                raise typer.Exit(code=1)
+            records = 0
+            with open(output, "wb") as f:
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    records += chunk.count(b"\n")
+    except requests.exceptions.RequestException as e:
+        _handle_request_error(e)
 
-        secrets = r.json()
-        
+    console.print(f"[green]Exported {records} {kind} records to {output}[/green]")
+
+@app.command()
+def list(
+    secret_type: Optional[str] = typer.Option(None, "--type", help="Only secrets of this type"),
+    role: Optional[str] = typer.Option(None, help="Only secrets for this role"),
+    host: Optional[str] = typer.Option(None, help="Only secrets on this host"),
+    page_size: int = typer.Option(100, help="Secrets fetched per request"),
+) -> None:
+    """List secrets in the vault, fetching them page by page."""
+    filters = {"type": secret_type, "role": role, "host": host}
+    params: Dict[str, Any] = {"limit": page_size, **{k: v for k, v in filters.items() if v is not None}}
+    try:
         table = Table(title="Vault Secrets")
         table.add_column("ID", style="cyan")
         table.add_column("Name", style="magenta")
         table.add_column("Type", style="green")
+        table.add_column("Role")
         table.add_column("Last Rotated")
 
-        for s in secrets:
-            table.add_row(s['id'], s['name'], s['type'], s['last_rotated'])
-        
+        while True:
+            r = requests.get(f"{API_URL}/secrets", params=params, headers={"X-User": CURRENT_USER})
+            if r.status_code != 200:
+                 console.print(f"[red]Error fetching secrets: {r.text}[/red]")
+                 return
+
+            for s in r.json():
+                table.add_row(s['id'], s['name'], s['type'], s.get('role') or '-', s['last_rotated'])
+
+            cursor = r.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            params["after"] = cursor
+
         console.print(table)
     except requests.exceptions.RequestException as e:
         _handle_request_error(e)
@@ -119,22 +230,61 @@ def get(request_id: str) -> None:
         _handle_request_error(e)
 
 @app.command()
-def rotate(secret_id: str) -> None:
-    """Manually trigger rotation for a secret."""
+def rotate(
+    secret_id: Optional[str] = typer.Argument(None),
+    all_secrets: bool = typer.Option(False, "--all", help="Rotate every secret in the vault"),
+    concurrency: Optional[int] = typer.Option(None, help="Parallel target changes for --all"),
+) -> None:
+    """Manually trigger rotation for a secret, or for the whole vault with --all."""
+    if not all_secrets and not secret_id:
+        console.print("[red]Specify a SECRET_ID or --all[/red]")
+        raise typer.Exit(code=1)
+
     try:
-        r = requests.post(f"{API_URL}/rotate/{secret_id}", headers={"X-User": CURRENT_USER})
-        if r.status_code == 200:
-            console.print(f"[green]Successfully rotated {secret_id}[/green]")
-        else:
+        if not all_secrets:
+            r = requests.post(f"{API_URL}/rotate/{secret_id}", headers={"X-User": CURRENT_USER})
+            if r.status_code == 200:
+                console.print(f"[green]Successfully rotated {secret_id}[/green]")
+            else:
+                console.print(f"[red]Rotation failed: {r.text}[/red]")
+            return
+
+        payload = {"all": True, "max_concurrency": concurrency}
+        r = requests.post(f"{API_URL}/rotate:batch", json=payload, headers={"X-User": CURRENT_USER})
+        if r.status_code != 200:
             console.print(f"[red]Rotation failed: {r.text}[/red]")
+            return
+
+        data = r.json()
+        counts = data["counts"]
+        console.print(
+            f"[green]Rotated {counts['rotated']}[/green], [red]failed {counts['failed']}[/red], "
+            f"skipped {counts['skipped']} in {data['total_seconds']}s"
+        )
+        for failure in data["failed"]:
+            console.print(f"[red]  {failure['id']}: {failure['error']}[/red]")
     except requests.exceptions.RequestException as e:
         _handle_request_error(e)
 
 @app.command()
-def audit() -> None:
-    """View audit logs."""
+def audit(
+    limit: int = typer.Option(20, help="Number of records to show"),
+    before: Optional[int] = typer.Option(None, help="Show records older than this cursor"),
+    user: Optional[str] = typer.Option(None, help="Only events by this user"),
+    action: Optional[str] = typer.Option(None, help="Only this action, e.g. SECRET_RETRIEVED"),
+    secret_id: Optional[str] = typer.Option(None, help="Only events for this secret"),
+    since: Optional[str] = typer.Option(None, help="Only events at or after this ISO timestamp"),
+    until: Optional[str] = typer.Option(None, help="Only events before this ISO timestamp"),
+    failed: bool = typer.Option(False, "--failed", help="Only unsuccessful events"),
+) -> None:
+    """View audit logs, optionally filtered."""
+    filters = {
+        "before": before, "user": user, "action": action, "secret_id": secret_id,
+        "since": since, "until": until, "success": False if failed else None,
+    }
+    params: Dict[str, Any] = {"limit": limit, **{k: v for k, v in filters.items() if v is not None}}
     try:
-        r = requests.get(f"{API_URL}/audit")
+        r = requests.get(f"{API_URL}/audit", params=params, headers={"X-User": CURRENT_USER})
         if r.status_code != 200:
              console.print(f"[red]Error fetching logs: {r.text}[/red]")
              return
@@ -157,8 +307,51 @@ def audit() -> None:
                 "Yes" if log['success'] else "No"
             )
         console.print(table)
+        if "X-Audit-Before" in r.headers:
+            console.print(f"[dim]Older records: add --before {r.headers['X-Audit-Before']}[/dim]")
     except requests.exceptions.RequestException as e:
         _handle_request_error(e)
 
+@app.command()
+def rekey(
+    db_path: str = typer.Option("pam_vault.db", envvar="DB_PATH", help="Vault database to re-key in place"),
+    old_key: str = typer.Option(..., envvar="PAM_MASTER_KEY", prompt="Current master key", hide_input=True),
+    new_key: str = typer.Option(
+        ..., envvar="PAM_NEW_MASTER_KEY", prompt="New master key", hide_input=True, confirmation_prompt=True
+    ),
+    chunk_size: int = typer.Option(500, help="Secrets re-encrypted and committed per chunk"),
+    workers: Optional[int] = typer.Option(None, help="Worker processes (default: one per CPU; 0 runs inline)"),
+) -> None:
+    """Move the vault to a new master key. Safe to interrupt: re-run it with the same keys to resume."""
+    from vault.vault_engine import VaultEngine
+
+    try:
+        vault = VaultEngine(old_key, db_path=db_path)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(code=1) from e
+
+    def report(stats: Dict[str, Any]) -> None:
+        eta = f"{stats['eta_seconds']:.0f}s" if stats["eta_seconds"] is not None else "-"
+        console.print(
+            f"[dim]{stats['rows_done']} done, {stats['rows_remaining']} left, "
+            f"{stats['rows_per_second']:.0f} rows/s, ETA {eta}[/dim]"
+        )
+
+    try:
+        result = vault.rekey(old_key, new_key, chunk_size=chunk_size, workers=workers, progress=report)
+    except ValueError as e:
+        console.print(f"[red]Rekey failed: {e}[/red]")
+        raise typer.Exit(code=1) from e
+    finally:
+        vault.close()
+
+    resumed = " (resumed)" if result["resumed"] else ""
+    console.print(
+        f"[green]Re-keyed {result['rows_done']} secrets to key version {result['key_version']}{resumed} "
+        f"in {result['elapsed_seconds']}s ({result['rows_per_second']:.0f} rows/s).[/green]"
+    )
+    console.print("[yellow]Restart every PAM process with the new PAM_MASTER_KEY.[/yellow]")
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,313 @@
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from vault.pool import ConnectionPool
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+class Backoff:
+    """Exponential backoff with full jitter.
+
+    The wait before retry ``n`` (counting from 0) is drawn uniformly from
+    [0, min(max_seconds, base_seconds * 2**n)], so callers that failed together
+    spread out instead of retrying in lockstep.
+    """
+
+    def __init__(self, base_seconds: float, max_seconds: float, seed: Optional[int] = None):
+        if base_seconds < 0 or max_seconds < base_seconds:
+            raise ValueError("Backoff needs 0 <= base_seconds <= max_seconds")
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self._rng = random.Random(seed)
+
+    def delay(self, retry: int) -> float:
+        return self._rng.uniform(0, min(self.max_seconds, self.base_seconds * 2 ** min(retry, 32)))
+
+
+class RetryPolicy:
+    """How many times one rotation tries the target, and how long each attempt may take.
+
+    ``attempt_timeout`` (None: no limit) is passed to the simulator, so a slow
+    or dead host costs at most ``attempts * attempt_timeout`` plus the backoff
+    waits between attempts.
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        attempt_timeout: Optional[float] = None,
+        backoff: Optional[Backoff] = None
+    ):
+        if attempts < 1:
+            raise ValueError("attempts must be at least 1")
+        self.attempts = attempts
+        self.attempt_timeout = attempt_timeout
+        self.backoff = backoff or Backoff(0.5, 10.0)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a host whose circuit breaker is open."""
+
+    def __init__(self, host: str, retry_at: float):
+        super().__init__(f"circuit open for {host} until {_iso(retry_at)}")
+        self.host = host
+        self.retry_at = retry_at
+
+
+class CircuitBreaker:
+    """Breaker state for one host.
+
+    "closed" lets every call through. ``failure_threshold`` consecutive
+    failures open it; while "open" calls are refused until ``reset_seconds``
+    have passed. Then it is "half_open": a single trial call goes through,
+    and its result closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+
+    @property
+    def retry_at(self) -> float:
+        return self.opened_at + self.reset_seconds
+
+    def allow(self, now: float) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now >= self.retry_at:
+            self.state = "half_open"
+            return True
+        return False  # open, or half-open with the trial call in flight
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = now
+
+
+class HostBreakers:
+    """Thread-safe circuit breakers keyed by target host.
+
+    Only hosts that have failed since their last success hold a breaker, so a
+    fleet of healthy hosts costs nothing. Failures are what the rotator counts
+    against a host: timeouts and connection errors.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 60.0):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.trips = 0
+
+    def allow(self, host: str) -> bool:
+        """Whether a call to ``host`` may go ahead (claims the trial call of a half-open breaker)."""
+        with self._lock:
+            breaker = self._breakers.get(host)
+            return breaker is None or breaker.allow(time.time())
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            return breaker.state if breaker else "closed"
+
+    def is_open(self, host: str) -> bool:
+        """Whether calls to ``host`` are currently refused (without claiming a half-open trial)."""
+        with self._lock:
+            breaker = self._breakers.get(host)
+            return breaker is not None and breaker.state == "open" and time.time() < breaker.retry_at
+
+    def retry_at(self, host: str) -> Optional[float]:
+        """When an open breaker will let a trial call through (None unless open)."""
+        with self._lock:
+            breaker = self._breakers.get(host)
+            return breaker.retry_at if breaker and breaker.state == "open" else None
+
+    def record_success(self, host: str) -> None:
+        with self._lock:
+            self._breakers.pop(host, None)
+
+    def record_failure(self, host: str) -> None:
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_seconds)
+            state = breaker.state
+            breaker.record_failure(time.time())
+            if breaker.state == "open" and state != "open":
+                self.trips += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counts per state plus every host that isn't closed."""
+        with self._lock:
+            breakers = list(self._breakers.items())
+            trips = self.trips
+        tripped = sorted(
+            ((host, breaker) for host, breaker in breakers if breaker.state != "closed"),
+            key=lambda item: item[1].opened_at
+        )
+        hosts = [
+            {
+                "host": host,
+                "state": breaker.state,
+                "failures": breaker.failures,
+                "opened_at": _iso(breaker.opened_at),
+                "retry_at": _iso(breaker.retry_at)
+            }
+            for host, breaker in tripped
+        ]
+        return {
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+            "failing": len(breakers),
+            "open": sum(1 for entry in hosts if entry["state"] == "open"),
+            "half_open": sum(1 for entry in hosts if entry["state"] == "half_open"),
+            "trips": trips,
+            "hosts": hosts
+        }
+
+
+class RetryQueue:
+    """Failed rotations waiting to be attempted again later, in an SQLite table shared by every process.
+
+    A secret's n-th deferral waits ``backoff.delay(n)``, or longer if its host's
+    circuit breaker is open. After ``max_deferrals`` deferrals in a row the
+    secret is given up on and left to its normal rotation schedule. A
+    successful rotation clears its row. Any process's scheduler can drain the
+    table: pop_due() claims due rows by pushing their ``retry_at`` out by
+    ``lease_seconds``, so each retry runs once, and a retry lost with its
+    process comes due again. Uses a WAL ConnectionPool (the vault's, when
+    sharing its file).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        pool: Optional[ConnectionPool] = None,
+        backoff: Optional[Backoff] = None,
+        max_deferrals: int = 5,
+        lease_seconds: float = 3600.0
+    ):
+        self.db_path = db_path
+        self.pool = pool or ConnectionPool(db_path)
+        self.backoff = backoff or Backoff(300.0, 3600.0)
+        self.max_deferrals = max_deferrals
+        self.lease_seconds = lease_seconds
+        # Counted by this process; the table holds what is pending for all of them.
+        self.deferred = 0
+        self.given_up = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self.pool.connection() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS rotation_retries (
+                    secret_id TEXT PRIMARY KEY,
+                    retry_at REAL NOT NULL,
+                    deferrals INTEGER NOT NULL,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_rotation_retries_due ON rotation_retries (retry_at);
+            ''')
+            conn.commit()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def defer(self, secret_id: str, error: str, not_before: Optional[float] = None) -> Optional[float]:
+        """Queue ``secret_id`` for another attempt. Returns when it is due, or None if it was given up on."""
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT deferrals FROM rotation_retries WHERE secret_id = ?", (secret_id,)
+            ).fetchone()
+            deferrals = row[0] if row else 0
+            if deferrals >= self.max_deferrals:
+                conn.execute("DELETE FROM rotation_retries WHERE secret_id = ?", (secret_id,))
+                conn.commit()
+                with self._lock:
+                    self.given_up += 1
+                return None
+            retry_at = time.time() + self.backoff.delay(deferrals)
+            if not_before is not None:
+                retry_at = max(retry_at, not_before)
+            conn.execute(
+                "INSERT OR REPLACE INTO rotation_retries (secret_id, retry_at, deferrals, error) VALUES (?, ?, ?, ?)",
+                (secret_id, retry_at, deferrals + 1, error)
+            )
+            conn.commit()
+        with self._lock:
+            self.deferred += 1
+        return retry_at
+
+    def discard(self, secret_ids: Iterable[str]) -> None:
+        """Forget secrets that rotated successfully (one transaction)."""
+        with self.pool.connection() as conn:
+            conn.executemany("DELETE FROM rotation_retries WHERE secret_id = ?", [(i,) for i in secret_ids])
+            conn.commit()
+
+    def next_due(self) -> Optional[float]:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT MIN(retry_at) FROM rotation_retries").fetchone()[0]
+
+    def pop_due(self, now: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """Claim and return secrets whose retry is due (at most ``limit``), soonest first."""
+        now = time.time() if now is None else now
+        if limit is not None and limit <= 0:
+            return []
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            due = [
+                row[0] for row in conn.execute(
+                    "SELECT secret_id FROM rotation_retries WHERE retry_at <= ? ORDER BY retry_at LIMIT ?",
+                    (now, -1 if limit is None else limit)
+                )
+            ]
+            conn.executemany(
+                "UPDATE rotation_retries SET retry_at = ? WHERE secret_id = ?",
+                [(now + self.lease_seconds, secret_id) for secret_id in due]
+            )
+            conn.commit()
+        return due
+
+    def __contains__(self, secret_id: object) -> bool:
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT 1 FROM rotation_retries WHERE secret_id = ?", (secret_id,)
+            ).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rotation_retries").fetchone()[0]
+
+    def snapshot(self, limit: int = 100) -> Dict[str, Any]:
+        """Counters plus the ``limit`` soonest pending retries (claimed ones included)."""
+        with self.pool.connection() as conn:
+            pending = conn.execute("SELECT COUNT(*) FROM rotation_retries").fetchone()[0]
+            rows = conn.execute(
+                "SELECT secret_id, retry_at, deferrals, error FROM rotation_retries ORDER BY retry_at LIMIT ?",
+                (limit,)
+            ).fetchall()
+        with self._lock:
+            counts = {"pending": pending, "deferred": self.deferred, "given_up": self.given_up}
+        return {
+            **counts,
+            "max_deferrals": self.max_deferrals,
+            "next": [
+                {"id": secret_id, "retry_at": _iso(retry_at), "deferrals": deferrals, "error": error}
+                for secret_id, retry_at, deferrals, error in rows
+            ]
+        }
@@ -1,27 +1,134 @@
 import logging
 import secrets
 import string
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
 
 from audit.audit_log import AuditLogger
+from telemetry.metrics import REGISTRY, stage
+from telemetry.tracing import traced
 from vault.vault_engine import VaultEngine
 
+from .resilience import CircuitOpenError, HostBreakers, RetryPolicy, RetryQueue
 from .simulators import DatabaseSimulator, LinuxSimulator, WindowsSimulator
 
 logger = logging.getLogger(__name__)
+_target_change_stage = stage("target_change")
+_retries_total = REGISTRY.counter("pam_rotation_retries_total", "Target password changes retried after a failure")
+_short_circuits_total = REGISTRY.counter(
+    "pam_rotation_short_circuits_total", "Rotations refused because the host's circuit breaker was open"
+)
 
 class Rotator:
-    def __init__(self, vault: VaultEngine, auditor: AuditLogger):
+    def __init__(
+        self,
+        vault: VaultEngine,
+        auditor: AuditLogger,
+        type_limits: Optional[Dict[str, int]] = None,
+        write_batch_size: int = 100,
+        simulators: Optional[Dict[str, Any]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breakers: Optional[HostBreakers] = None,
+        retry_queue: Optional[RetryQueue] = None
+    ):
         self.vault = vault
         self.auditor = auditor
-        self.win_sim = WindowsSimulator()
-        self.linux_sim = LinuxSimulator()
-        self.db_sim = DatabaseSimulator()
+        # Target systems per secret type (see rotation.simulators.build_simulators).
+        simulators = simulators or {}
+        self.win_sim = simulators.get('windows') or WindowsSimulator()
+        self.linux_sim = simulators.get('linux') or LinuxSimulator()
+        self.db_sim = simulators.get('database') or DatabaseSimulator()
+        # Maximum simultaneous target changes per secret type during rotate_many().
+        self.type_limits = type_limits or {}
+        self.write_batch_size = write_batch_size
+        # Attempts per rotation, per-host circuit breakers, and where failed rotations are
+        # deferred for a scheduler to retry (None: nothing drains a queue, so don't defer).
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or HostBreakers()
+        self.retry_queue = retry_queue
+        self.stats = {"attempts": 0, "retries": 0, "short_circuited": 0}
+        self._stats_lock = threading.Lock()
 
     def generate_password(self, length: int = 24) -> str:
         """Generate a strong random password."""
         chars = string.ascii_letters + string.digits + "!@#$%^&*()"
         return ''.join(secrets.choice(chars) for _ in range(length))
 
+    def _simulator_for(self, secret_type: str) -> Any:
+        return {
+            'windows': self.win_sim,
+            'linux': self.linux_sim,
+            'database': self.db_sim,
+        }.get(secret_type)
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def retry_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            counts = dict(self.stats)
+        return {
+            **counts,
+            "attempts_per_rotation": self.retry_policy.attempts,
+            "queue": self.retry_queue.snapshot() if self.retry_queue is not None else None
+        }
+
+    def _change_with_retries(self, simulator: Any, target_host: str, username: str, new_password: str) -> None:
+        """Change the password on the target, retrying with backoff. Raises the last error if no attempt succeeds.
+
+        Timeouts and connection errors count against the host's circuit
+        breaker; while it is open, CircuitOpenError is raised without
+        contacting the host.
+        """
+        policy = self.retry_policy
+        error: Exception = Exception("Target system update failed")
+        for attempt in range(policy.attempts):
+            if not self.breakers.allow(target_host):
+                self._count("short_circuited")
+                _short_circuits_total.inc()
+                raise CircuitOpenError(target_host, self.breakers.retry_at(target_host) or time.time())
+            self._count("attempts")
+            try:
+                with _target_change_stage.time():
+                    changed = simulator.change_password(
+                        target_host, username, new_password, timeout=policy.attempt_timeout
+                    )
+            except OSError as e:  # TimeoutError, ConnectionError: the host may be down
+                self.breakers.record_failure(target_host)
+                error = e
+            except Exception as e:
+                self.breakers.record_success(target_host)
+                error = e
+            else:
+                self.breakers.record_success(target_host)
+                if changed:
+                    return
+                error = Exception("Target system update failed")
+
+            if attempt + 1 < policy.attempts and not self.breakers.is_open(target_host):
+                self._count("retries")
+                _retries_total.inc()
+                logger.warning(f"⚠️ Attempt {attempt + 1} on {target_host} failed ({error}), retrying...")
+                time.sleep(policy.backoff.delay(attempt))
+        raise error
+
+    def _defer(self, secret_id: str, error: Exception) -> Optional[str]:
+        """Queue a failed rotation for a later retry. Returns when it is due (ISO), or None if not deferred."""
+        if self.retry_queue is None:
+            return None
+        not_before = error.retry_at if isinstance(error, CircuitOpenError) else None
+        retry_at = self.retry_queue.defer(secret_id, str(error), not_before=not_before)
+        if retry_at is None:
+            logger.error(f"❌ Giving up on retries for {secret_id} after {self.retry_queue.max_deferrals} deferrals.")
+            return None
+        return datetime.fromtimestamp(retry_at).isoformat()
+
+    @traced()
     def rotate_secret(self, secret_id: str, triggered_by: str = "system") -> bool:
         """Perform rotation for a specific secret."""
         meta = self.vault.get_metadata(secret_id)
@@ -34,42 +141,193 @@ class Rotator:
         username = meta['metadata'].get('username', 'admin')
 
         logger.info(f"🔄 Starting rotation for {secret_id} ({secret_type})...")
-        
+
         new_password = self.generate_password()
-        success = False
 
         try:
-            if secret_type == 'windows':
-                success = self.win_sim.change_password(target_host, username, new_password)
-            elif secret_type == 'linux':
-                success = self.linux_sim.change_password(target_host, username, new_password)
-            elif secret_type == 'database':
-                success = self.db_sim.change_password(target_host, username, new_password)
-            else:
+            simulator = self._simulator_for(secret_type)
+            if simulator is None:
                 logger.error(f"Unknown secret type: {secret_type}")
                 return False
 
-            if success:
-                self.vault.update_secret_value(secret_id, new_password)
-                self.auditor.log_event(
-                    action="ROTATE_SECRET",
-                    user=triggered_by,
-                    secret_id=secret_id,
-                    details={"host": target_host, "status": "rotated"},
-                    success=True
-                )
-                logger.info(f"✅ Rotation complete for {secret_id}.")
-                return True
-            else:
-                raise Exception("Target system update failed")
+            self._change_with_retries(simulator, target_host, username, new_password)
+            self.vault.update_secret_value(secret_id, new_password)
+            if self.retry_queue is not None:
+                self.retry_queue.discard([secret_id])
+            self.auditor.log_event(
+                action="ROTATE_SECRET",
+                user=triggered_by,
+                secret_id=secret_id,
+                details={"host": target_host, "status": "rotated"},
+                success=True
+            )
+            logger.info(f"✅ Rotation complete for {secret_id}.")
+            return True
 
         except Exception as e:
+            retry_at = self._defer(secret_id, e)
             self.auditor.log_event(
                 action="ROTATE_FAILURE",
                 user=triggered_by,
                 secret_id=secret_id,
-                details={"error": str(e)},
+                details={"error": str(e), "retry_at": retry_at},
                 success=False
             )
             logger.error(f"❌ Rotation failed for {secret_id}: {e}")
             return False
+
+    def _change_target(
+        self, meta: Dict[str, Any], limiter: Optional[threading.Semaphore]
+    ) -> Tuple[str, float]:
+        """Change the password on the target system. Returns (new_password, seconds)."""
+        target_host = meta['metadata'].get('host', 'localhost')
+        username = meta['metadata'].get('username', 'admin')
+        new_password = self.generate_password()
+
+        if self.breakers.is_open(target_host):
+            # Fail fast, before taking a type slot, so dead hosts don't hold up the batch.
+            self._count("short_circuited")
+            _short_circuits_total.inc()
+            raise CircuitOpenError(target_host, self.breakers.retry_at(target_host) or time.time())
+
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            start = time.perf_counter()
+            self._change_with_retries(self._simulator_for(meta['type']), target_host, username, new_password)
+            return new_password, time.perf_counter() - start
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+    @traced()
+    def rotate_many(
+        self,
+        secret_ids: Iterable[str],
+        max_concurrency: int = 16,
+        triggered_by: str = "system"
+    ) -> Dict[str, Any]:
+        """Rotate many secrets concurrently on a bounded worker pool.
+
+        Target changes run in parallel (further capped per secret type by
+        ``type_limits``); new values are written to the vault and audited in
+        batches of ``write_batch_size``. Each change is retried per
+        ``retry_policy``; secrets on hosts with an open circuit breaker fail at
+        once, and failures are deferred to ``retry_queue`` when there is one. Returns a summary of
+        rotated, failed (with ``retry_at``) and skipped secrets with per-secret
+        timings.
+        """
+        start = time.perf_counter()
+        ids = [*dict.fromkeys(secret_ids)]
+        metadata = self.vault.get_metadata_bulk(ids)
+        summary: Dict[str, Any] = {"rotated": [], "failed": [], "skipped": []}
+
+        # Interleave secret types so a type at its limit doesn't hold every worker.
+        by_type: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        for secret_id in ids:
+            meta = metadata.get(secret_id)
+            if not meta:
+                summary["skipped"].append({"id": secret_id, "reason": "not_found"})
+            elif self._simulator_for(meta['type']) is None:
+                summary["skipped"].append({"id": secret_id, "reason": f"unknown_type:{meta['type']}"})
+            else:
+                by_type[meta['type']].append(meta)
+        ordered: List[Dict[str, Any]] = []
+        while by_type:
+            for secret_type in [*by_type]:
+                ordered.append(by_type[secret_type].popleft())
+                if not by_type[secret_type]:
+                    del by_type[secret_type]
+
+        limiters = {
+            secret_type: threading.BoundedSemaphore(limit)
+            for secret_type, limit in self.type_limits.items() if limit > 0
+        }
+        pending_values: Dict[str, str] = {}
+        pending_events: List[Dict[str, Any]] = []
+        pending_timings: Dict[str, float] = {}
+
+        logger.info(f"🔄 Starting batch rotation of {len(ordered)} secrets (concurrency {max_concurrency})...")
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures: Dict[Future, Dict[str, Any]] = {
+                executor.submit(self._change_target, meta, limiters.get(meta['type'])): meta
+                for meta in ordered
+            }
+            for future in as_completed(futures):
+                meta = futures[future]
+                try:
+                    new_password, seconds = future.result()
+                except Exception as e:
+                    retry_at = self._defer(meta['id'], e)
+                    summary["failed"].append({"id": meta['id'], "error": str(e), "retry_at": retry_at})
+                    pending_events.append({
+                        "action": "ROTATE_FAILURE", "user": triggered_by, "secret_id": meta['id'],
+                        "details": {"error": str(e), "retry_at": retry_at}, "success": False
+                    })
+                    continue
+
+                pending_values[meta['id']] = new_password
+                pending_timings[meta['id']] = seconds
+                pending_events.append({
+                    "action": "ROTATE_SECRET", "user": triggered_by, "secret_id": meta['id'],
+                    "details": {"host": meta['metadata'].get('host', 'localhost'), "status": "rotated"}
+                })
+                if len(pending_values) >= self.write_batch_size:
+                    self._flush_rotations(pending_values, pending_events, pending_timings, summary, triggered_by)
+
+        self._flush_rotations(pending_values, pending_events, pending_timings, summary, triggered_by)
+        summary["total_seconds"] = round(time.perf_counter() - start, 3)
+        logger.info(
+            f"✅ Batch rotation done: {len(summary['rotated'])} rotated, {len(summary['failed'])} failed, "
+            f"{len(summary['skipped'])} skipped in {summary['total_seconds']}s."
+        )
+        return summary
+
+    def _flush_rotations(
+        self,
+        values: Dict[str, str],
+        events: List[Dict[str, Any]],
+        timings: Dict[str, float],
+        summary: Dict[str, Any],
+        triggered_by: str
+    ) -> None:
+        """Persist buffered rotations with one vault transaction and one audit write.
+
+        If the batched write fails, each secret is written on its own, so only
+        the secrets whose own write also fails are deferred.
+        """
+        if values:
+            written = list(values)
+            try:
+                self.vault.update_secret_values_bulk(dict(values))
+            except Exception as e:
+                logger.warning(f"⚠️ Vault write failed for {len(values)} rotated secrets, writing them one by one: {e}")
+                written = []
+                failures: List[Dict[str, Any]] = []
+                for secret_id, new_password in values.items():
+                    try:
+                        self.vault.update_secret_value(secret_id, new_password)
+                        written.append(secret_id)
+                    except Exception as write_error:
+                        error = Exception(f"vault write failed: {write_error}")
+                        logger.error(f"❌ Rotation failed for {secret_id}: {error}")
+                        retry_at = self._defer(secret_id, error)
+                        summary["failed"].append({"id": secret_id, "error": str(error), "retry_at": retry_at})
+                        failures.append({
+                            "action": "ROTATE_FAILURE", "user": triggered_by, "secret_id": secret_id,
+                            "details": {"error": str(error), "retry_at": retry_at}, "success": False
+                        })
+                failed = {failure["secret_id"] for failure in failures}
+                events[:] = [
+                    ev for ev in events if not (ev["action"] == "ROTATE_SECRET" and ev["secret_id"] in failed)
+                ] + failures
+            if self.retry_queue is not None and written:
+                self.retry_queue.discard(written)
+            summary["rotated"].extend(
+                {"id": secret_id, "seconds": round(timings[secret_id], 3)} for secret_id in written
+            )
+        if events:
+            self.auditor.log_events(events[:])
+        values.clear()
+        events.clear()
+        timings.clear()
@@ -0,0 +1,241 @@
+import heapq
+import logging
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from api.policies import DEFAULT_ROLE, PolicyEngine
+from vault.vault_engine import VaultEngine
+
+from .rotator import Rotator
+
+logger = logging.getLogger(__name__)
+
+class RotationScheduler:
+    """Rotates secrets when their role's ``rotation_hours`` have elapsed.
+
+    Keeps a min-heap of (next_due, secret_id) built from the vault's rotation
+    index and sleeps until the earliest entry is due. Due secrets are handed to
+    Rotator.rotate_many in batches. Each secret's due time is offset by a stable
+    per-secret jitter so secrets created together don't all rotate together.
+
+    Run exactly one scheduler per vault (inside one API worker or standalone
+    via ``python -m rotation.scheduler``).
+    """
+
+    def __init__(
+        self,
+        vault: VaultEngine,
+        rotator: Rotator,
+        policy_engine: PolicyEngine,
+        batch_size: int = 50,
+        max_concurrency: int = 16,
+        jitter_seconds: float = 300,
+        retry_seconds: float = 600,
+        rescan_seconds: float = 900,
+        error_wait_seconds: float = 30
+    ):
+        self.vault = vault
+        self.rotator = rotator
+        self.policy_engine = policy_engine
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.jitter_seconds = jitter_seconds
+        self.retry_seconds = retry_seconds
+        # The heap is rebuilt periodically to pick up secrets created or rotated elsewhere.
+        self.rescan_seconds = rescan_seconds
+        # Pause after a failed iteration (e.g. the database is locked) so errors can't spin the thread.
+        self.error_wait_seconds = error_wait_seconds
+
+        self._heap: List[Tuple[float, str]] = []
+        self._roles: Dict[str, str] = {}
+        # Popped secrets whose failed rotation now waits in the rotator's retry queue.
+        self._deferred: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _jitter(self, secret_id: str) -> float:
+        if self.jitter_seconds <= 0:
+            return 0.0
+        return (zlib.crc32(secret_id.encode()) % 1000) / 1000 * self.jitter_seconds
+
+    def _next_due(self, secret_id: str, role: str, last_rotated: float) -> Optional[float]:
+        hours = self.policy_engine.rotation_hours(role)
+        if hours is None:
+            return None
+        return last_rotated + hours * 3600 + self._jitter(secret_id)
+
+    def rebuild(self) -> int:
+        """Rebuild the heap from one indexed scan of the vault. Returns the number of scheduled secrets."""
+        heap: List[Tuple[float, str]] = []
+        roles: Dict[str, str] = {}
+        with self._lock:
+            queue = self.rotator.retry_queue
+            deferred = {secret_id for secret_id in self._deferred if queue is not None and secret_id in queue}
+        for secret_id, role, last_rotated in self.vault.rotation_schedule():
+            role = role or DEFAULT_ROLE
+            roles[secret_id] = role
+            if secret_id in deferred:
+                continue  # back in the heap once its deferred retry settles
+            rotated_at = datetime.fromisoformat(last_rotated).timestamp() if last_rotated else 0.0
+            due = self._next_due(secret_id, role, rotated_at)
+            if due is not None:
+                heap.append((due, secret_id))
+        heapq.heapify(heap)
+
+        with self._lock:
+            self._heap = heap
+            self._roles = roles
+            self._deferred = deferred
+        self._wakeup.set()
+        return len(heap)
+
+    def overdue_count(self, now: Optional[float] = None) -> int:
+        """Count secrets whose role's ``rotation_hours`` have elapsed since their last rotation (jitter aside).
+
+        Reads from the vault rather than the heap, so it works whether or not
+        this process runs the scheduler. Only secrets older than the shortest
+        rotation interval are fetched.
+        """
+        now = time.time() if now is None else now
+        policies = self.policy_engine.policies.values()
+        intervals = [float(p['rotation_hours']) for p in policies if p.get('rotation_hours')]
+        if not intervals:
+            return 0
+        cutoff = datetime.fromtimestamp(now - min(intervals) * 3600).isoformat()
+        overdue = 0
+        for _, role, last_rotated in self.vault.rotation_schedule(rotated_before=cutoff):
+            hours = self.policy_engine.rotation_hours(role or DEFAULT_ROLE)
+            rotated_at = datetime.fromisoformat(last_rotated).timestamp() if last_rotated else 0.0
+            if hours is not None and rotated_at + hours * 3600 <= now:
+                overdue += 1
+        return overdue
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return up to ``batch_size`` secrets that are due."""
+        now = time.time() if now is None else now
+        due: List[str] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def run_once(self, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Rotate one batch of due secrets and reschedule them. Returns the rotation summary, if any.
+
+        The batch also takes failed rotations whose deferred retry is due from
+        the rotator's retry queue. A failure the rotator deferred is left to
+        that queue; once it gives up, the secret is retried after
+        ``retry_seconds``. If the batch raises, its scheduled secrets go back
+        on the heap (claimed retries come due again when their lease lapses).
+        """
+        due = self.pop_due(now)
+        try:
+            queue = self.rotator.retry_queue
+            retries = queue.pop_due(now, limit=self.batch_size - len(due)) if queue is not None else []
+            if not due and not retries:
+                return None
+            summary = self.rotator.rotate_many(
+                [*due, *retries], max_concurrency=self.max_concurrency, triggered_by="scheduler"
+            )
+        except Exception:
+            requeued = time.time()
+            with self._lock:
+                for secret_id in due:
+                    heapq.heappush(self._heap, (requeued, secret_id))
+            raise
+        finished = time.time()
+        scheduled = set(due)
+        with self._lock:
+            for result in summary["rotated"]:
+                if result["id"] in scheduled or result["id"] in self._deferred:
+                    self._deferred.discard(result["id"])
+                    due_at = self._next_due(result["id"], self._roles.get(result["id"], DEFAULT_ROLE), finished)
+                    if due_at is not None:
+                        heapq.heappush(self._heap, (due_at, result["id"]))
+            for result in summary["failed"]:
+                if result["id"] not in scheduled and result["id"] not in self._deferred:
+                    continue  # a manual rotation's retry; the secret is still in the heap
+                if result.get("retry_at"):
+                    self._deferred.add(result["id"])
+                else:
+                    self._deferred.discard(result["id"])
+                    heapq.heappush(self._heap, (finished + self.retry_seconds, result["id"]))
+        return summary
+
+    def _next_retry(self) -> Optional[float]:
+        """When the retry queue's next retry is due; None (wait for the rescan) if the query fails."""
+        queue = self.rotator.retry_queue
+        if queue is None:
+            return None
+        try:
+            return queue.next_due()
+        except Exception as e:
+            logger.error(f"❌ Could not read the rotation retry queue: {e}")
+            return None
+
+    def _run(self) -> None:
+        next_rescan = time.monotonic() + self.rescan_seconds
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() >= next_rescan:
+                    self.rebuild()
+                    next_rescan = time.monotonic() + self.rescan_seconds
+
+                # Drain every due batch before sleeping again.
+                while not self._stopping.is_set() and self.run_once():
+                    pass
+
+                timeout = next_rescan - time.monotonic()
+                for next_due in (self.next_due(), self._next_retry()):
+                    if next_due is not None:
+                        timeout = min(timeout, next_due - time.time())
+            except Exception as e:
+                logger.error(f"❌ Scheduled rotation failed, retrying in {self.error_wait_seconds}s: {e}")
+                timeout = self.error_wait_seconds
+            self._wakeup.wait(max(0.0, timeout))
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        """Build the schedule and start the background thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        scheduled = self.rebuild()
+        logger.info(f"⏰ Rotation scheduler started with {scheduled} scheduled secrets.")
+        self._thread = threading.Thread(target=self._run, name="rotation-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background thread after the batch in progress finishes."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def main() -> None:
+    """Run the scheduler as a standalone worker using the API's configuration."""
+    from api.server import retry_queue, scheduler
+
+    logging.basicConfig(level=logging.INFO)
+    scheduler.rotator.retry_queue = retry_queue  # this process drains the deferred retries
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
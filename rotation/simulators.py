@@ -1,33 +1,312 @@
+import asyncio
 import logging
+import math
+import random
+import threading
 import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+import requests
 
 logger = logging.getLogger(__name__)
 
-class WindowsSimulator:
-    def change_password(self, hostname: str, username: str, _new_password: str) -> bool:
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+PROFILE_FIELDS = (
+    "latency_ms", "distribution", "jitter_ms", "sigma", "failure_rate", "timeout_rate", "timeout_seconds",
+    "host_capacity", "seed"
+)
+
+
+class SimulatorProfile:
+    """How a simulated target behaves on each password change.
+
+    Latency is drawn from ``distribution``: "fixed" (always ``latency_ms``),
+    "uniform" (``latency_ms`` ± ``jitter_ms``), "exponential" (mean
+    ``latency_ms``) or "lognormal" (median ``latency_ms``, shape ``sigma``).
+    A ``failure_rate`` fraction of changes are rejected, and a ``timeout_rate``
+    fraction hang for ``timeout_seconds`` and raise TimeoutError. With
+    ``host_capacity`` > 0, each host accepts at most that many changes at once
+    and further callers queue.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 500,
+        distribution: str = "fixed",
+        jitter_ms: float = 0,
+        sigma: float = 0.5,
+        failure_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 5.0,
+        host_capacity: int = 0,
+        seed: Optional[int] = None
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        if not 0 <= failure_rate + timeout_rate <= 1 or failure_rate < 0 or timeout_rate < 0:
+            raise ValueError("failure_rate and timeout_rate must be non-negative and add up to at most 1")
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.jitter_ms = jitter_ms
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.host_capacity = host_capacity
+        self.seed = seed
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SimulatorProfile":
+        unknown = set(data) - set(PROFILE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown simulator profile fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def latency(self, rng: random.Random) -> float:
+        """Draw one change's latency in seconds."""
+        base = self.latency_ms / 1000
+        if self.distribution == "uniform":
+            jitter = self.jitter_ms / 1000
+            return rng.uniform(max(0.0, base - jitter), base + jitter)
+        if self.distribution == "exponential":
+            return rng.expovariate(1 / base) if base > 0 else 0.0
+        if self.distribution == "lognormal":
+            return base * math.exp(rng.gauss(0, self.sigma))
+        return base
+
+    def outcome(self, rng: random.Random) -> str:
+        """Draw "ok", "fail" or "timeout"."""
+        roll = rng.random()
+        if roll < self.timeout_rate:
+            return "timeout"
+        if roll < self.timeout_rate + self.failure_rate:
+            return "fail"
+        return "ok"
+
+
+class TargetSimulator:
+    """A simulated target system behaving according to a SimulatorProfile.
+
+    Keeps the passwords it accepted, keyed by (host, username), so tests and
+    benchmarks can check the target and the vault agree. ``change_password``
+    blocks the calling thread; ``change_password_async`` sleeps on the event
+    loop, which lets one process drive thousands of hosts at once.
+    """
+
+    label = "Target-Sim"
+
+    def __init__(self, profile: Optional[SimulatorProfile] = None):
+        self.profile = profile or SimulatorProfile()
+        self.passwords: Dict[Tuple[str, str], str] = {}
+        self.stats = {"changed": 0, "failed": 0, "timed_out": 0}
+        self._rng = random.Random(self.profile.seed)
+        self._lock = threading.Lock()
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._async_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    def _draw(self) -> Tuple[float, str]:
+        with self._lock:
+            return self.profile.latency(self._rng), self.profile.outcome(self._rng)
+
+    def _host_slot(self, hostname: str) -> Optional[threading.BoundedSemaphore]:
+        if self.profile.host_capacity <= 0:
+            return None
+        with self._lock:
+            slot = self._host_slots.get(hostname)
+            if slot is None:
+                slot = self._host_slots[hostname] = threading.BoundedSemaphore(self.profile.host_capacity)
+            return slot
+
+    def _async_host_slot(self, hostname: str) -> Optional[asyncio.Semaphore]:
+        if self.profile.host_capacity <= 0:
+            return None
+        slot = self._async_host_slots.get(hostname)
+        if slot is None:
+            slot = self._async_host_slots[hostname] = asyncio.Semaphore(self.profile.host_capacity)
+        return slot
+
+    def snapshot(self) -> Dict[str, int]:
+        """Change counters plus the number of hosts holding a password set here."""
+        with self._lock:
+            return {**self.stats, "hosts": len({host for host, _ in self.passwords})}
+
+    def _connect(self, hostname: str, username: str) -> None:
+        """Log the steps of a change (overridden per target type)."""
+        logger.info(f"[{self.label}] Changing password for {username}@{hostname}")
+
+    def _timed_out(self, hostname: str, seconds: float) -> TimeoutError:
+        with self._lock:
+            self.stats["timed_out"] += 1
+        logger.warning(f"[{self.label}] {hostname} did not respond within {seconds:g}s")
+        return TimeoutError(f"{hostname} did not respond within {seconds:g}s")
+
+    def _finish(self, hostname: str, username: str, new_password: str, outcome: str) -> bool:
+        with self._lock:
+            if outcome == "fail":
+                self.stats["failed"] += 1
+            else:
+                self.stats["changed"] += 1
+                self.passwords[(hostname, username)] = new_password
+        if outcome == "fail":
+            logger.warning(f"[{self.label}] {hostname} rejected the password change for {username}")
+            return False
+        logger.info(f"[{self.label}] Password changed successfully for {username}@{hostname}")
+        return True
+
+    def _wait(
+        self, latency: float, outcome: str, timeout: Optional[float], started: float
+    ) -> Tuple[float, Optional[float]]:
+        """How long the change keeps the caller waiting, and the timeout it then reports (None if it completes)."""
+        if timeout is not None:
+            remaining = max(0.0, timeout - (time.monotonic() - started))
+            if (self.profile.timeout_seconds if outcome == "timeout" else latency) >= remaining:
+                return remaining, timeout
+        if outcome == "timeout":
+            return self.profile.timeout_seconds, self.profile.timeout_seconds
+        return latency, None
+
+    def change_password(
+        self, hostname: str, username: str, new_password: str, timeout: Optional[float] = None
+    ) -> bool:
+        """Change a password, blocking for the drawn latency. Returns False if the target rejects it.
+
+        Raises TimeoutError if the target hangs, or once ``timeout`` seconds
+        (including any wait for a host slot) have passed.
+        """
+        started = time.monotonic()
+        latency, outcome = self._draw()
+        slot = self._host_slot(hostname)
+        if slot is not None and not slot.acquire(timeout=timeout):
+            raise self._timed_out(hostname, timeout or 0)
+        try:
+            self._connect(hostname, username)
+            wait, timed_out = self._wait(latency, outcome, timeout, started)
+            time.sleep(wait)
+            if timed_out is not None:
+                raise self._timed_out(hostname, timed_out)
+            return self._finish(hostname, username, new_password, outcome)
+        finally:
+            if slot is not None:
+                slot.release()
+
+    async def change_password_async(
+        self, hostname: str, username: str, new_password: str, timeout: Optional[float] = None
+    ) -> bool:
+        """change_password for asyncio callers; waits without holding a thread."""
+        started = time.monotonic()
+        latency, outcome = self._draw()
+        slot = self._async_host_slot(hostname)
+        if slot is not None:
+            try:
+                await asyncio.wait_for(slot.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise self._timed_out(hostname, timeout or 0) from None
+        try:
+            self._connect(hostname, username)
+            wait, timed_out = self._wait(latency, outcome, timeout, started)
+            await asyncio.sleep(wait)
+            if timed_out is not None:
+                raise self._timed_out(hostname, timed_out)
+            return self._finish(hostname, username, new_password, outcome)
+        finally:
+            if slot is not None:
+                slot.release()
+
+
+class WindowsSimulator(TargetSimulator):
+    label = "Windows-Sim"
+
+    def _connect(self, hostname: str, username: str) -> None:
         """Simulate changing a Windows password via WinRM/WMI."""
         logger.info(f"[Windows-Sim] Connecting to {hostname}...")
-        time.sleep(0.5) # Simulate network latency
         logger.info("[Windows-Sim] Authenticating as Administrator...")
         logger.info(f"[Windows-Sim] Executing: net user {username} *******")
-        logger.info(f"[Windows-Sim] Password changed successfully for {username}@{hostname}")
-        return True
 
-class LinuxSimulator:
-    def change_password(self, hostname: str, username: str, _new_password: str) -> bool:
+
+class LinuxSimulator(TargetSimulator):
+    label = "Linux-Sim"
+
+    def _connect(self, hostname: str, username: str) -> None:
         """Simulate changing a Linux password via SSH."""
         logger.info(f"[Linux-Sim] Connecting to {hostname} via SSH...")
-        time.sleep(0.5)
         logger.info("[Linux-Sim] Authenticating...")
         logger.info(f"[Linux-Sim] Executing: echo '{username}:******' | chpasswd")
-        logger.info(f"[Linux-Sim] Password changed successfully for {username}@{hostname}")
-        return True
 
-class DatabaseSimulator:
-    def change_password(self, connection_string: str, username: str, _new_password: str) -> bool:
-        """Simulate changing a DB password."""
-        logger.info(f"[DB-Sim] Connecting to {connection_string}...")
-        time.sleep(0.5)
+
+class DatabaseSimulator(TargetSimulator):
+    label = "DB-Sim"
+
+    def _connect(self, hostname: str, username: str) -> None:
+        """Simulate changing a DB password (``hostname`` is the connection string)."""
+        logger.info(f"[DB-Sim] Connecting to {hostname}...")
         logger.info(f"[DB-Sim] Executing: ALTER USER {username} WITH PASSWORD '****';")
-        logger.info("[DB-Sim] Password updated.")
-        return True
+
+
+class HttpTargetSimulator:
+    """Changes passwords on a TargetService over HTTP (see rotation.target_service).
+
+    Each rotator thread keeps its own keep-alive session. A request that outlives
+    ``timeout_seconds`` raises TimeoutError, like a target that stops answering.
+    """
+
+    def __init__(self, base_url: str, secret_type: str, timeout_seconds: float = 10.0):
+        self.base_url = base_url.rstrip("/")
+        self.secret_type = secret_type
+        self.timeout_seconds = timeout_seconds
+        self._local = threading.local()
+
+    def _url(self, hostname: str, username: str) -> str:
+        return f"{self.base_url}/hosts/{quote(hostname, safe='')}/users/{quote(username, safe='')}/password"
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def change_password(
+        self, hostname: str, username: str, new_password: str, timeout: Optional[float] = None
+    ) -> bool:
+        """POST the change; ``timeout`` overrides ``timeout_seconds`` for this call."""
+        timeout = timeout or self.timeout_seconds
+        try:
+            response = self._session().post(
+                self._url(hostname, username),
+                json={"password": new_password, "type": self.secret_type},
+                timeout=timeout
+            )
+        except requests.Timeout as e:
+            raise TimeoutError(f"{hostname} did not respond within {timeout:g}s") from e
+        except requests.ConnectionError as e:
+            raise ConnectionError(f"{hostname}: target service unreachable ({e})") from e
+        if response.status_code == 504:
+            raise TimeoutError(f"{hostname} timed out at the target service")
+        return response.status_code == 200
+
+    async def change_password_async(
+        self, hostname: str, username: str, new_password: str, timeout: Optional[float] = None
+    ) -> bool:
+        return await asyncio.to_thread(self.change_password, hostname, username, new_password, timeout)
+
+
+SIMULATOR_TYPES = {"windows": WindowsSimulator, "linux": LinuxSimulator, "database": DatabaseSimulator}
+
+
+def build_simulators(
+    profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+    service_url: Optional[str] = None,
+    timeout_seconds: float = 10.0
+) -> Dict[str, Any]:
+    """Simulators per secret type: in-process ones shaped by ``profiles`` (keyed by type), or
+    HTTP clients of the target service at ``service_url``."""
+    if service_url:
+        return {kind: HttpTargetSimulator(service_url, kind, timeout_seconds) for kind in SIMULATOR_TYPES}
+    profiles = profiles or {}
+    unknown = set(profiles) - set(SIMULATOR_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown simulator types: {', '.join(sorted(unknown))}")
+    return {
+        kind: simulator(SimulatorProfile.from_dict(profiles[kind]) if kind in profiles else None)
+        for kind, simulator in SIMULATOR_TYPES.items()
+    }
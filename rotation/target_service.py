@@ -0,0 +1,158 @@
+"""A local stand-in for a fleet of target systems, for scale-testing rotation.
+
+One HTTP server plays every host: any hostname in the URL is a host, created
+on first use, so the rotator can be pointed at 10k+ simulated hosts on one
+machine. Changes go through a TargetSimulator, so the server applies the same
+latency distribution, failure and timeout rates and per-host capacity as the
+in-process simulators, and keeps the resulting password table.
+
+  POST /hosts/{host}/users/{user}/password  {"password": "..."}  200, 503 (rejected) or 504 (timed out)
+  GET  /hosts/{host}/users/{user}/password                      the current password, or 404
+  GET  /stats                                                   change counters and host count
+
+Run standalone with ``python -m rotation.target_service --port 9100 --latency-ms 50 ...`` and
+set ``TARGET_SERVICE_URL`` on the API, or embed it with ``TargetService(...).start()``.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote
+
+from .simulators import LATENCY_DISTRIBUTIONS, SimulatorProfile, TargetSimulator
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so rotator sessions reuse connections
+    server: "_Server"
+
+    def log_message(self, *_args: Any) -> None:
+        pass
+
+    def _send(self, status: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _target(self) -> Optional[Tuple[str, str]]:
+        parts = self.path.split("/")
+        # ['', 'hosts', host, 'users', user, 'password']
+        if len(parts) != 6 or parts[1] != "hosts" or parts[3] != "users" or parts[5] != "password":
+            return None
+        return unquote(parts[2]), unquote(parts[4])
+
+    def do_GET(self) -> None:
+        simulator = self.server.simulator
+        if self.path == "/stats":
+            self._send(200, simulator.snapshot())
+            return
+        target = self._target()
+        password = simulator.passwords.get(target) if target else None
+        if password is None:
+            self._send(404, {"detail": "Not found"})
+        else:
+            self._send(200, {"password": password})
+
+    def do_POST(self) -> None:
+        target = self._target()
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            password = json.loads(self.rfile.read(length) or b"{}").get("password")
+        except ValueError:
+            password = None
+        if target is None or not password:
+            self._send(400, {"detail": "Expected POST /hosts/{host}/users/{user}/password with a password"})
+            return
+        try:
+            changed = self.server.simulator.change_password(target[0], target[1], password)
+        except TimeoutError as e:
+            self._send(504, {"detail": str(e)})
+            return
+        if changed:
+            self._send(200, {"changed": True})
+        else:
+            self._send(503, {"detail": "Target rejected the password change"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+    simulator: TargetSimulator
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # quiet when a client stopped waiting
+            super().handle_error(request, client_address)
+
+
+class TargetService:
+    """The target service on ``host:port`` (port 0 picks a free one), served from a background thread."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, profile: Optional[SimulatorProfile] = None):
+        self.host = host
+        self.simulator = TargetSimulator(profile)
+        self._server = _Server((host, port), _Handler)
+        self._server.simulator = self.simulator
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._server.server_port}"
+
+    def start(self) -> "TargetService":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="target-service", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-seconds", type=float, default=5.0)
+    parser.add_argument("--host-capacity", type=int, default=1, help="concurrent changes per host (0: unlimited)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    profile = SimulatorProfile(
+        latency_ms=args.latency_ms,
+        distribution=args.distribution,
+        jitter_ms=args.jitter_ms,
+        sigma=args.sigma,
+        failure_rate=args.failure_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        host_capacity=args.host_capacity,
+        seed=args.seed
+    )
+    service = TargetService(args.host, args.port, profile)
+    print(f"🎯 Target service listening on {service.url}")
+    try:
+        service._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""In-process counters, gauges and fixed-bucket histograms in the Prometheus text format.
+
+Recording a sample costs a lock, a bisect and a couple of additions, so the
+instrumented hot paths stay cheap. Values are per process: with several
+uvicorn workers each one serves its own counts at /metrics, and crypto run in
+worker processes (CRYPTO_EXECUTOR=process) is not recorded.
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a single AES-GCM call up to a slow target system.
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labels: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _check_labels(self, values: Tuple[str, ...]) -> None:
+        if len(values) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+
+    def reset(self) -> None:
+        pass
+
+
+class CounterSeries:
+    """One labelled counter value."""
+
+    __slots__ = ("_metric", "value")
+
+    def __init__(self, metric: "Counter"):
+        self._metric = metric
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        if not self._metric.registry.enabled:
+            return
+        with self._metric._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(registry, name, documentation, labels)
+        self._series: Dict[Tuple[str, ...], CounterSeries] = {}
+
+    def labels(self, *values: str) -> CounterSeries:
+        series = self._series.get(values)
+        if series is None:
+            self._check_labels(values)
+            with self._lock:
+                series = self._series.setdefault(values, CounterSeries(self))
+        return series
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        self.labels(*values).inc(amount)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            series = sorted((values, s.value) for values, s in self._series.items())
+        for values, value in series:
+            lines.append(f"{self.name}{_labels(self.label_names, values)} {_number(value)}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            for series in self._series.values():
+                series.value = 0.0
+
+
+class _Timer:
+    __slots__ = ("_series", "_start")
+
+    def __init__(self, series: "HistogramSeries"):
+        self._series = series
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._series.observe(time.perf_counter() - self._start)
+
+
+class HistogramSeries:
+    """Bucket counts, sum and count for one label combination."""
+
+    __slots__ = ("_metric", "buckets", "sum", "count")
+
+    def __init__(self, metric: "Histogram"):
+        self._metric = metric
+        self.buckets = [0] * (len(metric.bounds) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        if not self._metric.registry.enabled:
+            return
+        index = bisect.bisect_left(self._metric.bounds, value)
+        with self._metric._lock:
+            self.buckets[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        """Context manager that observes the duration of its block in seconds."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(registry, name, documentation, labels)
+        self.bounds = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], HistogramSeries] = {}
+
+    def labels(self, *values: str) -> HistogramSeries:
+        series = self._series.get(values)
+        if series is None:
+            self._check_labels(values)
+            with self._lock:
+                series = self._series.setdefault(values, HistogramSeries(self))
+        return series
+
+    def observe(self, value: float, *values: str) -> None:
+        self.labels(*values).observe(value)
+
+    def time(self, *values: str) -> _Timer:
+        return self.labels(*values).time()
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            snapshot = sorted((values, [*s.buckets], s.sum, s.count) for values, s in self._series.items())
+        for values, buckets, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket in zip((*self.bounds, math.inf), buckets):
+                cumulative += bucket
+                labels = _labels((*self.label_names, "le"), (*values, _number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            for series in self._series.values():
+                series.buckets = [0] * len(series.buckets)
+                series.sum = 0.0
+                series.count = 0
+
+
+class Gauge(_Metric):
+    """A value read from ``function`` at scrape time; scrape failures omit the sample."""
+
+    kind = "gauge"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(registry, name, documentation)
+        self.function = function
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        try:
+            lines.append(f"{self.name} {_number(self.function())}")
+        except Exception as e:
+            logger.error(f"❌ Could not collect gauge {self.name}: {e}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together. Asking for an existing name returns the registered metric."""
+
+    def __init__(self) -> None:
+        # When False, observations and increments are dropped at the first check.
+        self.enabled = True
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind or existing.label_names != metric.label_names:
+                    raise ValueError(f"Metric {metric.name} is already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        metric = self._register(Counter(self, name, documentation, labels))
+        assert isinstance(metric, Counter)
+        return metric
+
+    def histogram(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        metric = self._register(Histogram(self, name, documentation, labels, buckets))
+        assert isinstance(metric, Histogram)
+        return metric
+
+    def gauge(self, name: str, documentation: str, function: Callable[[], float]) -> Gauge:
+        """Register a gauge, replacing the function of one already registered under ``name``."""
+        metric = self._register(Gauge(self, name, documentation, function))
+        assert isinstance(metric, Gauge)
+        metric.function = function
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Zero every counter and histogram (gauges are read live)."""
+        with self._lock:
+            metrics = [*self._metrics.values()]
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pam_stage_duration_seconds",
+    "Time spent in internal stages: kdf, aes, db_read, db_write, audit_write, target_change",
+    labels=("stage",)
+)
+STAGES = ("kdf", "aes", "db_read", "db_write", "audit_write", "target_change")
+
+
+def stage(name: str) -> HistogramSeries:
+    """The latency series for an internal stage; time a block with ``with stage("kdf").time():``."""
+    if name not in STAGES:
+        raise ValueError(f"Unknown stage '{name}' (expected one of {', '.join(STAGES)})")
+    return STAGE_SECONDS.labels(name)
@@ -0,0 +1,93 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, MutableMapping
+
+from .metrics import REGISTRY, MetricsRegistry
+from .tracing import Tracer
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+
+class RouteNames:
+    """Labels requests with their route template ("GET /credential/{request_id}") rather than the raw path.
+
+    The router records the matched endpoint function in the scope; this maps it
+    back to the route's path, so ids never end up in metric labels or trace
+    names. Requests that match no route are "unmatched".
+    """
+
+    def __init__(self) -> None:
+        self._paths: Dict[Any, str] = {}
+
+    def __call__(self, scope: Scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            routes = getattr(scope.get("app"), "routes", [])
+            self._paths = {getattr(route, "endpoint", None): getattr(route, "path", "") for route in routes}
+            path = self._paths.get(endpoint, "unmatched")
+        return f"{scope['method']} {path}"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing HTTP requests per route (see RouteNames).
+
+    Streaming responses are timed until the last chunk is sent.
+    """
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]], registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.requests = registry.counter(
+            "pam_http_requests_total", "HTTP requests by route and status code", labels=("endpoint", "status")
+        )
+        self.latency = registry.histogram(
+            "pam_http_request_duration_seconds", "HTTP request latency by route", labels=("endpoint",)
+        )
+        self._route_name = RouteNames()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint = self._route_name(scope)
+            self.latency.observe(time.perf_counter() - start, endpoint)
+            self.requests.inc(endpoint, str(status))
+
+
+class TracingMiddleware:
+    """ASGI middleware that starts a trace for sampled requests and records it when the response is done."""
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]], tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+        self._route_name = RouteNames()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        started = self.tracer.start(scope.get("path", "")) if scope["type"] == "http" else None
+        if started is None:
+            await self.app(scope, receive, send)
+            return
+
+        failed = True
+        try:
+            await self.app(scope, receive, send)
+            failed = False
+        finally:
+            self.tracer.finish(started, name=self._route_name(scope), error=failed)
@@ -0,0 +1,348 @@
+"""Opt-in request tracing with a sampling profiler for the slowest requests.
+
+A ``Tracer`` decides per request whether to trace it (``sample_rate``). A traced
+request carries its trace in a context variable, so ``span()`` blocks and
+``@traced`` functions record themselves under it. This works through awaits,
+Starlette's threadpool and AsyncVault's executors, which copy the context into
+their threads. Untraced code pays one context variable lookup per call.
+
+Finished traces are appended to ``output_file``, either as one JSON object per
+line or as Chrome trace events (open the file in chrome://tracing or Perfetto).
+
+With ``profile_slowest`` set, a sampler thread snapshots the stacks of the
+threads each traced request has run on while it is in flight. The profiles of
+the slowest ``profile_slowest`` requests are kept as collapsed stacks, the
+input format of flamegraph tools. Requests that share the event loop thread
+can show up in each other's samples.
+"""
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Counter, Dict, List, Optional, Set, Tuple, TypeVar, cast
+
+logger = logging.getLogger(__name__)
+
+TRACE_FORMATS = ("json", "chrome")
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    __slots__ = ("trace", "id", "parent", "name", "thread", "start", "end", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent: Optional[int]):
+        self.trace = trace
+        self.id = next(trace._ids)
+        self.parent = parent
+        self.name = name
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error = False
+
+
+class Trace:
+    """Spans recorded for one request, plus its stack samples when profiled."""
+
+    def __init__(self, name: str, profiled: bool = False):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.wall_start = time.time()
+        self.spans: List[Span] = []
+        self.profiled = profiled
+        # Threads the request has run on, and collapsed stack -> sample count.
+        self.threads: Set[int] = set()
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._ids = itertools.count()
+        self.root = self.open(name, None)
+
+    def open(self, name: str, parent: Optional[int]) -> Span:
+        span = Span(self, name, parent)
+        self.spans.append(span)  # list.append is atomic, so spans from executor threads are safe
+        self.threads.add(span.thread)
+        return span
+
+    @property
+    def duration(self) -> float:
+        return (self.root.end or time.perf_counter()) - self.root.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        origin = self.root.start
+        record: Dict[str, Any] = {
+            "trace_id": self.id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.wall_start).isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [
+                {
+                    "id": s.id,
+                    "parent": s.parent,
+                    "name": s.name,
+                    "thread": s.thread,
+                    "start_ms": round((s.start - origin) * 1000, 3),
+                    "duration_ms": round(((s.end or s.start) - s.start) * 1000, 3),
+                    **({"error": True} if s.error else {})
+                }
+                for s in self.spans
+            ]
+        }
+        if self.profiled:
+            record["profile"] = {"samples": self.samples, "stacks": dict(self.stacks.most_common())}
+        return record
+
+    def to_chrome_events(self) -> List[Dict[str, Any]]:
+        """Complete ("X") events; ts and dur are microseconds on the wall clock."""
+        origin_us = self.wall_start * 1e6 - self.root.start * 1e6
+        pid = os.getpid()
+        return [
+            {
+                "name": s.name,
+                "cat": self.name,
+                "ph": "X",
+                "ts": round(origin_us + s.start * 1e6, 1),
+                "dur": round(((s.end or s.start) - s.start) * 1e6, 1),
+                "pid": pid,
+                "tid": s.thread,
+                "args": {"trace_id": self.id, **({"error": True} if s.error else {})}
+            }
+            for s in self.spans
+        ]
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("pam_trace_span", default=None)
+
+
+class _SpanContext:
+    __slots__ = ("name", "_span", "_token")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._span: Optional[Span] = None
+        self._token: Any = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current.get()
+        if parent is not None:
+            self._span = parent.trace.open(self.name, parent.id)
+            self._token = _current.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type: Any, *_exc: object) -> None:
+        if self._span is not None:
+            self._span.end = time.perf_counter()
+            self._span.error = exc_type is not None
+            _current.reset(self._token)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *_exc: object) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str) -> Any:
+    """Context manager recording a span under the current trace; a no-op outside one."""
+    if _current.get() is None:
+        return _NO_SPAN
+    return _SpanContext(name)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator recording each call as a span named ``name`` (default: the function's qualified name)."""
+
+    def decorate(fn: F) -> F:
+        label = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with _SpanContext(label):
+                    return await fn(*args, **kwargs)
+            return cast(F, async_wrapper)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with _SpanContext(label):
+                return fn(*args, **kwargs)
+        return cast(F, wrapper)
+
+    return decorate
+
+
+def current_trace() -> Optional[Trace]:
+    current = _current.get()
+    return current.trace if current is not None else None
+
+
+def _collapse(frame: Any) -> str:
+    names: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Tracer:
+    """Samples requests for tracing and writes finished traces to a file."""
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        output_file: Optional[str] = "traces.jsonl",
+        fmt: str = "json",
+        profile_slowest: int = 0,
+        profile_interval_ms: float = 5
+    ):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"trace format must be one of {', '.join(TRACE_FORMATS)}")
+        self.sample_rate = sample_rate
+        self.output_file = output_file
+        self.fmt = fmt
+        self.profile_slowest = profile_slowest
+        self.profile_interval = profile_interval_ms / 1000
+
+        self._file: Optional[Any] = None
+        self._write_lock = threading.Lock()
+        # Min-heap of (duration, sequence, trace record) holding the slowest profiled traces.
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sequence = itertools.count()
+        self._active: Set[Trace] = set()
+        self._active_lock = threading.Lock()
+        self._has_active = threading.Event()
+        self._stopping = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self, name: str) -> Optional[Tuple[Trace, Any]]:
+        """Begin tracing the current request if it is sampled. Pass the result to finish()."""
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return None
+        trace = Trace(name, profiled=self.profile_slowest > 0)
+        token = _current.set(trace.root)
+        if trace.profiled:
+            self._ensure_sampler()
+            with self._active_lock:
+                self._active.add(trace)
+                self._has_active.set()
+        return trace, token
+
+    def finish(self, started: Tuple[Trace, Any], name: Optional[str] = None, error: bool = False) -> Trace:
+        """End the trace begun by start(), naming it (e.g. after routing) and recording it."""
+        trace, token = started
+        trace.root.end = time.perf_counter()
+        trace.root.error = error
+        _current.reset(token)
+        if name:
+            trace.name = trace.root.name = name
+        if trace.profiled:
+            with self._active_lock:
+                self._active.discard(trace)
+                if not self._active:
+                    self._has_active.clear()
+            self._keep_if_slow(trace)
+        self._write(trace)
+        return trace
+
+    def _keep_if_slow(self, trace: Trace) -> None:
+        with self._active_lock:
+            full = len(self._slowest) >= self.profile_slowest
+            if full and trace.duration <= self._slowest[0][0]:
+                return
+            entry = (trace.duration, next(self._sequence), trace.to_dict())
+            if full:
+                heapq.heapreplace(self._slowest, entry)
+            else:
+                heapq.heappush(self._slowest, entry)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        """Profiled traces of the slowest requests so far, slowest first."""
+        with self._active_lock:
+            return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    def _write(self, trace: Trace) -> None:
+        if not self.output_file:
+            return
+        if self.fmt == "chrome":
+            # A JSON array left open: trace viewers accept a missing closing bracket.
+            data = "".join(json.dumps(event) + ",\n" for event in trace.to_chrome_events())
+        else:
+            data = json.dumps(trace.to_dict()) + "\n"
+        try:
+            with self._write_lock:
+                if self._file is None:
+                    new_file = not os.path.exists(self.output_file) or os.path.getsize(self.output_file) == 0
+                    self._file = open(self.output_file, "a", encoding="utf-8")  # noqa: SIM115
+                    if self.fmt == "chrome" and new_file:
+                        self._file.write("[\n")
+                self._file.write(data)
+                self._file.flush()
+        except OSError as e:
+            logger.error(f"❌ Could not write trace to {self.output_file}: {e}")
+
+    def _ensure_sampler(self) -> None:
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        with self._active_lock:
+            if self._sampler is None or not self._sampler.is_alive():
+                self._stopping.clear()
+                self._sampler = threading.Thread(target=self._sample, name="trace-profiler", daemon=True)
+                self._sampler.start()
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        while not self._stopping.is_set():
+            if not self._has_active.wait(0.5):
+                continue
+            frames = sys._current_frames()
+            with self._active_lock:
+                active = [*self._active]
+            stacks: Dict[int, str] = {}
+            for trace in active:
+                trace.samples += 1
+                for thread in [*trace.threads]:
+                    if thread == own or thread not in frames:
+                        continue
+                    if thread not in stacks:
+                        stacks[thread] = _collapse(frames[thread])
+                    trace.stacks[stacks[thread]] += 1
+            del frames
+            self._stopping.wait(self.profile_interval)
+
+    def close(self) -> None:
+        self._stopping.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -10,21 +10,33 @@ if "PAM_MASTER_KEY" not in os.environ:
 if "DB_PATH" not in os.environ:
     os.environ["DB_PATH"] = "test_api.db"
 
+def remove_db(db_path: str) -> None:
+    """Delete a SQLite database along with its WAL sidecar files."""
+    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
 @pytest.fixture(autouse=True)
 def clean_db():
     """Clean up the test database before and after each test run."""
     # Import here to avoid circular imports or early initialization issues
-    from api.server import vault
+    from api.server import retry_queue, vault, workflow
+    from workflow.stores import SQLiteRequestStore
     
     db_path = os.environ.get("DB_PATH", "test_api.db")
     
-    # Setup: clean and init
-    if os.path.exists(db_path):
-        os.remove(db_path)
+    # Setup: clean and init (pooled connections must be closed before the file goes)
+    vault.close()
+    remove_db(db_path)
+    if vault.metadata_cache is not None:
+        vault.metadata_cache.clear()
     vault._init_db()
+    retry_queue._init_db()
+    if isinstance(workflow.store, SQLiteRequestStore):
+        workflow.store._init_db()
     
     yield
     
     # Teardown: clean
-    if os.path.exists(db_path):
-        os.remove(db_path)
+    vault.close()
+    remove_db(db_path)
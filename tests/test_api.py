@@ -61,3 +61,130 @@ def test_access_request_flow():
     response = client.get(f"/credential/{req_id}", headers={"X-User": "bob"})
     assert response.status_code == 200
     assert response.json()["secret"] == "FlowPass"
+
+def test_create_secrets_batch_reports_per_item():
+    response = client.post("/secrets:batch", json={"secrets": [
+        {"id": "batch-01", "name": "Batch 1", "type": "linux", "value": "One"},
+        {"id": "batch-02", "name": "Batch 2", "type": "windows"},
+        {"id": "batch-03", "name": "Batch 3", "type": "database", "value": "Three",
+         "metadata": {"role": "db-readonly"}},
+    ]}, headers={"X-User": "admin"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 1
+    assert [r["status"] for r in data["results"]] == ["created", "error", "created"]
+
+    response = client.get("/secrets", headers={"X-User": "admin"})
+    assert sorted(s["id"] for s in response.json()) == ["batch-01", "batch-03"]
+
+def test_audit_filters_by_user_and_action():
+    from api.server import auditor
+
+    client.post("/secrets", json={"id": "audit-01", "name": "Audit", "type": "linux", "value": "x"},
+                headers={"X-User": "carol"})
+    auditor.flush()
+    response = client.get("/audit", params={"user": "carol", "action": "CREATE_SECRET"},
+                          headers={"X-User": "auditor"})
+    assert response.status_code == 200
+    assert response.json()[-1]["secret_id"] == "audit-01"
+    assert {e["user"] for e in response.json()} == {"carol"}
+
+def test_list_secrets_pages_with_next_cursor():
+    client.post("/secrets:batch", json={"secrets": [
+        {"id": f"page-{i}", "name": "P", "type": "linux", "value": "x", "metadata": {"role": "db-readonly"}}
+        for i in range(5)
+    ]}, headers={"X-User": "admin"})
+
+    first = client.get("/secrets", params={"limit": 3, "role": "db-readonly"}, headers={"X-User": "admin"})
+    assert [s["id"] for s in first.json()] == ["page-0", "page-1", "page-2"]
+    assert first.headers["X-Next-Cursor"] == "page-2"
+
+    rest = client.get("/secrets", params={"limit": 3, "after": "page-2"}, headers={"X-User": "admin"})
+    assert [s["id"] for s in rest.json()] == ["page-3", "page-4"]
+    assert "X-Next-Cursor" not in rest.headers
+
+def test_export_streams_ndjson(monkeypatch):
+    import json
+
+    from api import server
+
+    monkeypatch.setattr(server, "EXPORT_CHUNK_LINES", 2)
+    client.post("/secrets:batch", json={"secrets": [
+        {"id": f"exp-{i}", "name": "E", "type": "windows" if i % 2 else "linux", "value": "x"} for i in range(5)
+    ]}, headers={"X-User": "admin"})
+
+    response = client.get("/secrets/export", params={"type": "linux"}, headers={"X-User": "admin"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == ["exp-0", "exp-2", "exp-4"]
+
+    server.auditor.flush()
+    audit = client.get("/audit/export", headers={"X-User": "auditor"})
+    actions = [json.loads(line)["action"] for line in audit.text.splitlines()]
+    assert actions[-1] == "EXPORT_AUDIT"
+    assert "EXPORT_SECRETS" in actions
+
+def test_metrics_exposes_endpoint_stage_and_gauge_series():
+    client.post("/secrets", json={
+        "id": "metrics-01", "name": "M", "type": "linux", "value": "x", "metadata": {"role": "linux-admin"}
+    }, headers={"X-User": "admin"})
+    client.post("/request", json={"user": "alice", "secret_id": "metrics-01", "reason": "check"})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'pam_http_requests_total{endpoint="POST /secrets",status="201"}' in body
+    assert 'pam_http_request_duration_seconds_count{endpoint="POST /request"}' in body
+    assert 'pam_stage_duration_seconds_bucket{stage="db_write",le="+Inf"}' in body
+    assert 'pam_stage_duration_seconds_count{stage="aes"}' in body
+    assert "pam_pending_requests 1" in body.splitlines()
+    assert "pam_active_leases 0" in body.splitlines()
+
+def test_rotate_all_pages_through_secret_ids(monkeypatch):
+    import api.server as server
+
+    assert client.post("/rotate:batch", json={"all": True}, headers={"X-User": "admin"}).status_code == 400
+    for i in range(5):
+        client.post("/secrets", json={
+            "id": f"page-{i}", "name": "P", "type": "linux", "value": "x"
+        }, headers={"X-User": "admin"})
+    pages = []
+
+    def rotate_many(secret_ids, **_options):
+        pages.append(list(secret_ids))
+        return {"rotated": [{"id": i, "seconds": 0.0} for i in secret_ids], "failed": [], "skipped": [],
+                "total_seconds": 0.1}
+
+    monkeypatch.setattr(server, "ROTATE_ALL_PAGE_SIZE", 2)
+    monkeypatch.setattr(server.rotator, "rotate_many", rotate_many)
+    summary = client.post("/rotate:batch", json={"all": True}, headers={"X-User": "admin"}).json()
+    assert pages == [["page-0", "page-1"], ["page-2", "page-3"], ["page-4"]]
+    assert summary["counts"] == {"rotated": 5, "failed": 0, "skipped": 0}
+    assert summary["total_seconds"] == 0.3
+
+def test_rotation_breakers_and_retries_endpoints(monkeypatch):
+    from api.server import retry_queue, rotator
+
+    client.post("/secrets", json={
+        "id": "breaker-01", "name": "B", "type": "linux", "value": "x", "metadata": {"host": "10.66.0.1"}
+    }, headers={"X-User": "admin"})
+    for _ in range(rotator.breakers.failure_threshold):
+        rotator.breakers.record_failure("10.66.0.1")
+
+    # The host's breaker is open, so the rotation fails without contacting it. With the
+    # scheduler off nothing would drain a deferral, so none is recorded.
+    assert client.post("/rotate/breaker-01", headers={"X-User": "admin"}).status_code == 500
+    breakers = client.get("/rotation/breakers", headers={"X-User": "admin"}).json()
+    assert breakers["open"] == 1
+    assert breakers["hosts"][0]["host"] == "10.66.0.1"
+    retries = client.get("/rotation/retries", headers={"X-User": "admin"}).json()
+    assert retries["short_circuited"] == 1
+    assert retries["queue"] is None and "breaker-01" not in retry_queue
+
+    # With deferred retries on, the failure is queued for a scheduler.
+    monkeypatch.setattr(rotator, "retry_queue", retry_queue)
+    assert client.post("/rotate/breaker-01", headers={"X-User": "admin"}).status_code == 500
+    retries = client.get("/rotation/retries", headers={"X-User": "admin"}).json()
+    assert [entry["id"] for entry in retries["queue"]["next"]] == ["breaker-01"]
+    retry_queue.discard(["breaker-01"])
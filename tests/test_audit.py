@@ -0,0 +1,147 @@
+import json
+import multiprocessing
+
+import pytest
+
+from audit import segments
+from audit.audit_log import AuditLogger
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    # Small blocks so records straddle block boundaries.
+    monkeypatch.setattr(segments, "READ_BLOCK_SIZE", 64)
+    path = tmp_path / "audit.log"
+    with open(path, "w") as f:
+        for i in range(30):
+            f.write(json.dumps({"action": "EVENT", "user": f"user-{i}", "seq": i}) + "\n")
+        f.write("not json\n")
+        f.write(json.dumps({"action": "EVENT", "user": "last", "seq": 30}) + "\n")
+        f.write('{"action": "PARTIAL"')  # record still being written
+    return str(path)
+
+def test_get_logs_returns_last_records_in_order(log_file):
+    auditor = AuditLogger(log_file=log_file)
+    logs = auditor.get_logs(limit=3)
+    assert [log["seq"] for log in logs] == [28, 29, 30]
+
+def test_get_logs_page_walks_backward_and_forward(log_file):
+    auditor = AuditLogger(log_file=log_file)
+    seen = []
+    page = auditor.get_logs_page(limit=7)
+    while page["events"]:
+        seen = [e["seq"] for e in page["events"]] + seen
+        page = auditor.get_logs_page(limit=7, before=page["before"])
+    assert seen == list(range(31))
+
+    first = auditor.get_logs_page(limit=5, before=auditor.get_logs_page(limit=26)["before"])
+    assert [e["seq"] for e in first["events"]] == [0, 1, 2, 3, 4]
+    following = auditor.get_logs_page(limit=3, after=first["after"])
+    assert [e["seq"] for e in following["events"]] == [5, 6, 7]
+
+def test_async_writer_group_commits_and_flushes_on_close(tmp_path):
+    path = str(tmp_path / "async.log")
+    auditor = AuditLogger(log_file=path, async_mode=True, batch_size=50, fsync_policy="batch")
+    for i in range(120):
+        auditor.log_event("EVENT", f"user-{i}")
+    auditor.log_events([{"action": "BATCH", "user": "bulk", "secret_id": "s-1"}])
+
+    auditor.flush()
+    assert len(auditor.get_logs(limit=500)) == 121
+
+    auditor.log_event("LAST", "closer")
+    auditor.close()
+    logs = AuditLogger(log_file=path).get_logs(limit=2)
+    assert [log["action"] for log in logs] == ["BATCH", "LAST"]
+
+def test_query_uses_index_and_catches_up_incrementally(tmp_path):
+    path = str(tmp_path / "indexed.log")
+    auditor = AuditLogger(log_file=path, index_path=str(tmp_path / "indexed.log.idx"))
+    auditor.log_event("SECRET_RETRIEVED", "alice", "linux-prod-01")
+    auditor.log_event("SECRET_RETRIEVED", "bob", "linux-prod-01")
+    auditor.log_event("ACCESS_DENIED", "alice", "win-db-01", success=False)
+
+    page = auditor.query(user="alice", action="SECRET_RETRIEVED")
+    assert [(e["user"], e["secret_id"]) for e in page["events"]] == [("alice", "linux-prod-01")]
+
+    auditor.log_event("SECRET_RETRIEVED", "alice", "linux-prod-01")
+    assert auditor.index.catch_up(auditor.segments) == 1
+    assert len(auditor.query(user="alice", secret_id="linux-prod-01")["events"]) == 2
+    assert [e["action"] for e in auditor.query(success=False)["events"]] == ["ACCESS_DENIED"]
+
+    older = auditor.query(user="alice", limit=1, before=auditor.query(user="alice", limit=1)["before"])
+    assert [e["action"] for e in older["events"]] == ["ACCESS_DENIED"]
+    assert auditor.query(since="2999-01-01T00:00:00")["events"] == []
+    auditor.close()
+
+def test_segments_roll_over_compress_and_stay_readable(tmp_path):
+    path = str(tmp_path / "seg.log")
+    auditor = AuditLogger(log_file=path, index_path=f"{path}.idx", segment_max_bytes=1024)
+    for i in range(40):
+        auditor.log_event("EVENT", f"user-{i % 4}", details={"seq": i})
+    auditor.run_maintenance()
+
+    sealed = auditor.segments.segments()
+    assert len(sealed) >= 2
+    assert all(s["compression"] == "gzip" and s["file"].endswith(".gz") for s in sealed)
+    assert sum(s["records"] for s in sealed) + len(auditor.get_logs_page(limit=1000)["events"]) >= 40
+
+    # Paging backward crosses from the active file into compressed segments.
+    seqs = []
+    page = auditor.get_logs_page(limit=7)
+    while page["events"]:
+        seqs = [e["details"]["seq"] for e in page["events"]] + seqs
+        page = auditor.get_logs_page(limit=7, before=page["before"])
+    assert seqs == list(range(40))
+
+    assert [e["details"]["seq"] for e in auditor.query(user="user-1", limit=3)["events"]] == [29, 33, 37]
+    assert [e["details"]["seq"] for e in auditor.iter_events()] == list(range(40))
+    auditor.close()
+
+def test_retention_removes_old_segments(tmp_path):
+    path = str(tmp_path / "old.log")
+    with open(path, "w") as f:
+        f.write(json.dumps({"timestamp": "2001-01-01T00:00:00", "action": "OLD", "user": "u"}) + "\n")
+    auditor = AuditLogger(log_file=path, index_path=f"{path}.idx", retention_days=30)
+    assert auditor.query(action="OLD")["events"]
+    auditor.rollover()
+    auditor.log_event("NEW", "u")
+    auditor.run_maintenance()
+
+    assert auditor.segments.segments() == []
+    assert not list(tmp_path.glob("old.log.0*"))
+    assert auditor.query(action="OLD")["events"] == []
+    assert [e["action"] for e in auditor.get_logs()] == ["NEW"]
+    auditor.close()
+
+def _write_from_worker(path, worker, count):
+    auditor = AuditLogger(log_file=path, segment_max_bytes=2048, maintenance_interval=0.01)
+    for i in range(count):
+        auditor.log_event("EVENT", f"worker-{worker}", details={"seq": i})
+        if i % 50 == 0:
+            auditor.run_maintenance()
+    auditor.close()
+
+def test_workers_sharing_a_log_roll_over_without_losing_records(tmp_path):
+    path = str(tmp_path / "shared.log")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_from_worker, args=(path, w, 300)) for w in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    auditor = AuditLogger(log_file=path, index_path=f"{path}.idx")
+    auditor.run_maintenance()
+    sealed = auditor.segments.segments()
+    assert len(sealed) > 3
+    # Segments are contiguous: each one starts where the previous ended.
+    for previous, segment in zip(sealed, sealed[1:]):
+        assert segment["start_offset"] == previous["start_offset"] + previous["size"]
+
+    events = list(auditor.iter_events())
+    for w in range(3):
+        assert [e["details"]["seq"] for e in events if e["user"] == f"worker-{w}"] == list(range(300))
+    assert len(auditor.query(user="worker-1", limit=1000)["events"]) == 300
+    auditor.close()
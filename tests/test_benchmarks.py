@@ -0,0 +1,32 @@
+from benchmarks.loadtest import compare as compare_load
+from benchmarks.loadtest import find_saturation, plan_stage
+from benchmarks.suite import compare, measure
+
+
+def test_measure_calibrates_calls_per_sample():
+    calls = []
+    result = measure(lambda: calls.append(1), min_time=0.001, repeat=3)
+    assert result["number"] > 1
+    assert len(calls) >= result["number"] * 3
+    assert result["ops_per_sec"] > 0
+
+def test_compare_flags_regressions_over_threshold():
+    baseline = {"fast": {"median_us": 10.0}, "slow": {"median_us": 10.0}}
+    results = {"fast": {"median_us": 11.0}, "slow": {"median_us": 13.0}, "new": {"median_us": 1.0}}
+    assert compare(results, baseline, threshold=0.2) == ["slow"]
+
+def test_loadtest_saturation_and_baseline_compare():
+    stages = [
+        {"concurrency": 10, "requests_per_second": 100.0, "endpoints": {"GET /audit": {"p99_ms": 10.0}}},
+        {"concurrency": 50, "requests_per_second": 180.0, "endpoints": {"GET /audit": {"p99_ms": 20.0}}},
+        {"concurrency": 100, "requests_per_second": 185.0, "endpoints": {"GET /audit": {"p99_ms": 40.0}}},
+    ]
+    assert find_saturation(stages, knee=0.1) == 50
+    assert find_saturation(stages[:2], knee=0.1) is None
+
+    baseline = {"stages": [
+        {"concurrency": 10, "requests_per_second": 130.0, "endpoints": {"GET /audit": {"p99_ms": 10.0}}},
+        {"concurrency": 50, "requests_per_second": 180.0, "endpoints": {"GET /audit": {"p99_ms": 10.0}}},
+    ]}
+    assert compare_load(stages, baseline, threshold=0.2) == ["c=10 req/s", "GET /audit p99 ms"]
+    assert plan_stage({"jit": 1, "audit": 1}, 50, seed=3) == plan_stage({"jit": 1, "audit": 1}, 50, seed=3)
@@ -0,0 +1,125 @@
+import os
+import time
+
+import pytest
+
+from api.policies import PolicyEngine
+from vault.cache import PlaintextCache, TTLCache
+from vault.vault_engine import VaultEngine
+
+
+def test_lru_eviction_and_ttl():
+    cache = TTLCache(max_size=2, ttl_seconds=0.05)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "size": 1, "max_size": 2, "ttl_seconds": 0.05, "hits": 2, "misses": 2, "evictions": 1, "hit_rate": 0.5
+    }
+
+def test_disabled_cache_never_stores():
+    cache = TTLCache(max_size=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+@pytest.fixture
+def cached_vault(tmp_path):
+    vault = VaultEngine("cache-test-key", db_path=str(tmp_path / "cache.db"), metadata_cache=TTLCache(100))
+    yield vault
+    vault.close()
+
+def test_metadata_cache_skips_db_and_invalidates_on_write(cached_vault):
+    cached_vault.store_secret("s1", "Secret", "linux", "pw", {"role": "linux-admin"})
+    assert cached_vault.get_metadata("s1")["metadata"]["role"] == "linux-admin"
+
+    cached_vault.close()
+    os.remove(cached_vault.db_path)  # a hit must not touch the database
+    assert cached_vault.get_metadata("s1")["metadata"]["role"] == "linux-admin"
+    assert cached_vault.metadata_cache.stats()["hits"] == 1
+
+    cached_vault._init_db()
+    cached_vault.store_secret("s1", "Secret", "linux", "pw", {"role": "db-readonly"})
+    assert cached_vault.get_metadata("s1")["metadata"]["role"] == "db-readonly"
+
+    before = cached_vault.get_metadata("s1")["last_rotated"]
+    time.sleep(0.001)
+    cached_vault.update_secret_values_bulk({"s1": "new"})
+    assert cached_vault.get_metadata("s1")["last_rotated"] != before
+
+def test_decision_cache_is_cleared_on_reload(tmp_path):
+    path = tmp_path / "policies.yaml"
+    path.write_text("policies:\n  - role: ops\n    allowed_users: ['alice']\n")
+    engine = PolicyEngine(str(path), decision_cache_size=100)
+    assert engine.check_access("alice", "ops")["allowed"]
+    assert engine.check_access("alice", "ops")["allowed"]
+    assert engine.decision_cache.stats()["hits"] == 1
+
+    path.write_text("policies:\n  - role: ops\n    allowed_users: ['bob']\n")
+    os.utime(path, (1, 1))
+    assert engine.reload()
+    assert not engine.check_access("alice", "ops")["allowed"]
+
+def test_plaintext_cache_zeroes_buffers_and_is_invalidated_by_rotation(tmp_path):
+    cache = PlaintextCache(max_size=1, ttl_seconds=60)
+    vault = VaultEngine("cache-test-key", db_path=str(tmp_path / "plain.db"), plaintext_cache=cache)
+    vault.store_secret("s1", "One", "linux", "first")
+    vault.store_secret("s2", "Two", "linux", "second")
+
+    assert vault.get_secret("s1") == "first"
+    assert len(cache) == 0  # caching needs a lease-bounded cache_seconds
+    assert vault.get_secret("s1", cache_seconds=30) == "first"
+    buffer = cache.get("s1")[1]
+    assert vault.get_secret("s1", cache_seconds=30) == "first"
+    assert cache.stats()["hits"] == 2
+
+    vault.update_secret_value("s1", "rotated")
+    assert buffer == bytearray(len("first"))  # wiped on invalidation
+    assert vault.get_secret("s1", cache_seconds=30) == "rotated"
+
+    buffer = cache.get("s1")[1]
+    assert vault.get_secret("s2", cache_seconds=30) == "second"  # evicts s1
+    assert buffer == bytearray(len("rotated"))
+
+    # A value read before a concurrent invalidation is not cached.
+    generation = cache.generation()
+    cache.invalidate("s2")
+    assert not cache.put_text("s2", "stale", "stamp", generation)
+    vault.close()
+
+def test_plaintext_cache_sees_writes_from_other_processes(tmp_path):
+    db_path = str(tmp_path / "plain.db")
+    cache = PlaintextCache(max_size=10, ttl_seconds=60)
+    vault = VaultEngine("cache-test-key", db_path=db_path, plaintext_cache=cache)
+    vault.store_secret("s1", "One", "linux", "first")
+    assert vault.get_secret("s1", cache_seconds=30) == "first"
+    buffer = cache.get("s1")[1]
+
+    other = VaultEngine("cache-test-key", db_path=db_path)  # another worker, with its own cache
+    other.update_secret_value("s1", "rotated")
+    assert vault.get_secret("s1", cache_seconds=30) == "rotated"
+    assert buffer == bytearray(len("first"))
+    assert vault.get_secret("s1", cache_seconds=30) == "rotated"
+    assert cache.stats()["misses"] == 2  # the first read, then the stale hit
+    other.close()
+    vault.close()
+
+def test_expired_entries_are_swept_and_zeroed():
+    cache = PlaintextCache(max_size=10, ttl_seconds=60, sweep_seconds=0.01)
+    cache.put_text("s1", "value", "stamp", cache.generation(), ttl_seconds=0.01)
+    buffer = cache.get("s1")[1]
+    time.sleep(0.02)
+    cache.put_text("s2", "other", "stamp", cache.generation())  # an insert sweeps s1 out
+    assert len(cache) == 1 and buffer == bytearray(len("value"))
+
+def test_plaintext_ttl_is_capped_by_lease():
+    cache = PlaintextCache(max_size=10, ttl_seconds=60)
+    cache.put_text("s1", "value", "stamp", cache.generation(), ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert cache.get_text("s1", "stamp") is None
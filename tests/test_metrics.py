@@ -0,0 +1,35 @@
+import pytest
+
+from telemetry.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("op_seconds", "Op latency", labels=("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value, "read")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP op_seconds Op latency", "# TYPE op_seconds histogram"]
+    assert 'op_seconds_bucket{op="read",le="0.1"} 1' in lines
+    assert 'op_seconds_bucket{op="read",le="1"} 3' in lines
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 4' in lines
+    assert 'op_seconds_sum{op="read"} 4.25' in lines
+    assert 'op_seconds_count{op="read"} 4' in lines
+
+def test_counter_labels_gauges_and_disabling():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls", labels=("path",))
+    calls.inc('/a"b')
+    registry.gauge("queue_depth", "Depth", lambda: 7)
+    registry.gauge("broken", "Fails", lambda: 1 / 0)
+    assert registry.counter("calls_total", "Calls", labels=("path",)) is calls
+    with pytest.raises(ValueError):
+        registry.histogram("calls_total", "Calls")
+
+    registry.enabled = False
+    calls.inc('/a"b')
+    lines = registry.render().splitlines()
+    assert 'calls_total{path="/a\\"b"} 1' in lines
+    assert "queue_depth 7" in lines
+    assert not any(line.startswith("broken ") for line in lines)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+import yaml
+
+from api.policies import PolicyEngine, PolicyError, compile_policies
+
+POLICIES = """
+groups:
+  dba: ["dave", "erin", "svc-db-*"]
+policies:
+  - role: db-admin
+    approval_required: true
+    ttl_minutes: 20
+    allowed_users: ["@dba", "alice"]
+  - role: "linux-*"
+    ttl_minutes: 10
+    rotation_hours: 6
+    allowed_users: ["ops-*"]
+  - role: public
+    allowed_users: ["*"]
+"""
+
+
+@pytest.fixture
+def policy_file(tmp_path):
+    path = tmp_path / "policies.yaml"
+    path.write_text(POLICIES)
+    return str(path)
+
+def test_groups_and_globs(policy_file):
+    engine = PolicyEngine(policy_file)
+    assert engine.check_access("dave", "db-admin") == {"allowed": True, "approval_required": True, "ttl_minutes": 20}
+    assert engine.check_access("svc-db-7", "db-admin")["allowed"]
+    assert engine.check_access("alice", "db-admin")["allowed"]
+    assert not engine.check_access("bob", "db-admin")["allowed"]
+
+    assert engine.check_access("ops-kim", "linux-web")["ttl_minutes"] == 10
+    assert engine.rotation_hours("linux-db") == 6
+    assert not engine.check_access("kim", "linux-web")["allowed"]
+    assert engine.check_access("anyone", "public")["allowed"]
+    assert engine.check_access("alice", "windows-admin") == {"allowed": False, "reason": "Role not defined"}
+
+@pytest.mark.parametrize("bad", [
+    "policies: {}",
+    "policies:\n  - ttl_minutes: 5",
+    "policies:\n  - role: a\n  - role: a",
+    "policies:\n  - role: a\n    ttl_minutes: -1",
+    "policies:\n  - role: a\n    ttl_minutes: true",
+    "policies:\n  - role: a\n    allowed_users: ['@nobody']",
+])
+def test_validation_rejects_bad_policies(bad):
+    with pytest.raises(PolicyError):
+        compile_policies(yaml.safe_load(bad))
+
+def test_ttl_minutes_accepts_fractions():
+    compiled = compile_policies(yaml.safe_load("policies:\n  - role: a\n    ttl_minutes: 0.5"))
+    assert compiled.exact["a"].raw["ttl_minutes"] == 0.5
+
+def test_reload_swaps_valid_files_and_keeps_previous_on_error(policy_file):
+    engine = PolicyEngine(policy_file)
+    assert not engine.reload()  # unchanged
+
+    with open(policy_file, "a") as f:
+        f.write("  - role: extra\n    allowed_users: ['bob']\n")
+    os.utime(policy_file, (1, 1))
+    assert engine.reload()
+    assert engine.check_access("bob", "extra")["allowed"]
+
+    with open(policy_file, "w") as f:
+        f.write("policies:\n  - role: extra\n    ttl_minutes: soon\n")
+    assert not engine.reload()
+    assert engine.check_access("bob", "extra")["allowed"]
+    assert engine.check_access("dave", "db-admin")["allowed"]
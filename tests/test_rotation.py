@@ -1,9 +1,19 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
 from unittest.mock import MagicMock
 
 import pytest
 
+from api.policies import PolicyEngine
 from audit.audit_log import AuditLogger
+from rotation.resilience import Backoff, CircuitOpenError, HostBreakers, RetryPolicy, RetryQueue
 from rotation.rotator import Rotator
+from rotation.scheduler import RotationScheduler
+from rotation.simulators import HttpTargetSimulator, LinuxSimulator, SimulatorProfile, build_simulators
+from rotation.target_service import TargetService
 from vault.vault_engine import VaultEngine
 
 
@@ -44,3 +54,285 @@ def test_rotator_failure(mock_vault, mock_auditor):
     
     assert success is False
     mock_vault.update_secret_value.assert_not_called()
+
+def test_rotate_many_batches_writes_and_audit(mock_vault, mock_auditor):
+    mock_vault.get_metadata_bulk.return_value = {
+        f"rot-{i}": {"id": f"rot-{i}", "type": "linux", "metadata": {"host": f"10.0.0.{i}"}} for i in range(5)
+    }
+    mock_vault.get_metadata_bulk.return_value["rot-fail"] = {"id": "rot-fail", "type": "windows", "metadata": {}}
+    rotator = Rotator(mock_vault, mock_auditor, type_limits={"linux": 2}, write_batch_size=3)
+    rotator.linux_sim.change_password = MagicMock(return_value=True)
+    rotator.win_sim.change_password = MagicMock(return_value=False)
+
+    summary = rotator.rotate_many([*mock_vault.get_metadata_bulk.return_value, "missing"], max_concurrency=4)
+
+    assert sorted(r["id"] for r in summary["rotated"]) == [f"rot-{i}" for i in range(5)]
+    assert [f["id"] for f in summary["failed"]] == ["rot-fail"]
+    assert summary["skipped"] == [{"id": "missing", "reason": "not_found"}]
+    assert mock_vault.update_secret_values_bulk.call_count == 2
+    mock_vault.update_secret_value.assert_not_called()
+    assert sum(len(call.args[0]) for call in mock_auditor.log_events.call_args_list) == 6
+
+def test_failed_bulk_write_falls_back_to_per_secret_writes(mock_vault, mock_auditor, tmp_path):
+    mock_vault.get_metadata_bulk.return_value = {
+        f"rot-{i}": {"id": f"rot-{i}", "type": "linux", "metadata": {"host": f"10.0.0.{i}"}} for i in range(3)
+    }
+    mock_vault.update_secret_values_bulk.side_effect = RuntimeError("database is locked")
+
+    def update_secret_value(secret_id, _value):
+        if secret_id == "rot-1":
+            raise RuntimeError("disk I/O error")
+
+    mock_vault.update_secret_value.side_effect = update_secret_value
+    rotator = Rotator(
+        mock_vault, mock_auditor, retry_queue=RetryQueue(str(tmp_path / "vault.db"), backoff=Backoff(0, 0))
+    )
+    rotator.linux_sim.change_password = MagicMock(return_value=True)
+
+    summary = rotator.rotate_many(["rot-0", "rot-1", "rot-2"])
+
+    assert sorted(r["id"] for r in summary["rotated"]) == ["rot-0", "rot-2"]
+    [failed] = summary["failed"]
+    assert failed["id"] == "rot-1" and "disk I/O error" in failed["error"] and failed["retry_at"]
+    assert mock_vault.update_secret_value.call_count == 3
+    assert "rot-1" in rotator.retry_queue and len(rotator.retry_queue) == 1
+    [events] = [call.args[0] for call in mock_auditor.log_events.call_args_list]
+    assert sorted((ev["secret_id"], ev["action"]) for ev in events) == [
+        ("rot-0", "ROTATE_SECRET"), ("rot-1", "ROTATE_FAILURE"), ("rot-2", "ROTATE_SECRET")
+    ]
+
+def test_scheduler_rotates_only_due_secrets(mock_vault):
+    day_ago = (datetime.now() - timedelta(hours=25)).isoformat()
+    just_now = datetime.now().isoformat()
+    mock_vault.rotation_schedule.return_value = [
+        ("overdue-01", "linux-admin", day_ago),
+        ("fresh-01", "linux-admin", just_now),
+        ("manual-01", "no-rotation", day_ago),
+    ]
+    policy_engine = MagicMock(spec=PolicyEngine)
+    policy_engine.rotation_hours.side_effect = lambda role: 24 if role == "linux-admin" else None
+    rotator = MagicMock(spec=Rotator)
+    rotator.retry_queue = None
+    rotator.rotate_many.return_value = {"rotated": [{"id": "overdue-01", "seconds": 0.1}], "failed": [], "skipped": []}
+
+    scheduler = RotationScheduler(mock_vault, rotator, policy_engine, jitter_seconds=0)
+    assert scheduler.rebuild() == 2
+
+    scheduler.run_once()
+    rotator.rotate_many.assert_called_once_with(["overdue-01"], max_concurrency=16, triggered_by="scheduler")
+    assert scheduler.run_once() is None
+    assert scheduler.next_due() > time.time() + 23 * 3600
+
+def test_scheduler_thread_survives_database_errors(mock_vault):
+    locked = sqlite3.OperationalError("database is locked")
+    scans = []
+
+    def rotation_schedule():
+        scans.append(1)
+        if len(scans) == 2:
+            raise locked
+        rotated_at = datetime.now() - timedelta(hours=0 if rotator.rotate_many.call_count >= 2 else 25)
+        return [("overdue-01", "linux-admin", rotated_at.isoformat())]
+
+    mock_vault.rotation_schedule.side_effect = rotation_schedule
+    policy_engine = MagicMock(spec=PolicyEngine)
+    policy_engine.rotation_hours.return_value = 24
+    rotator = MagicMock(spec=Rotator)
+    rotator.retry_queue = None
+    rotated = {"rotated": [{"id": "overdue-01", "seconds": 0.1}], "failed": [], "skipped": []}
+    rotator.rotate_many.side_effect = [locked, rotated]
+    scheduler = RotationScheduler(
+        mock_vault, rotator, policy_engine, jitter_seconds=0, rescan_seconds=0, error_wait_seconds=0.01
+    )
+
+    # A failed rebuild, then a failed batch: the thread logs, waits and carries on.
+    scheduler.start()
+    deadline = time.monotonic() + 5
+    while rotator.rotate_many.call_count < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop(timeout=5)
+    assert rotator.rotate_many.call_count == 2
+    assert scheduler.next_due() > time.time() + 23 * 3600
+
+    # The secrets of a batch that raised go back on the heap.
+    rotator.rotate_many.side_effect = locked
+    scheduler.rebuild()
+    with pytest.raises(sqlite3.OperationalError):
+        scheduler.run_once(now=time.time() + 25 * 3600)
+    assert scheduler.pop_due(now=time.time()) == ["overdue-01"]
+
+    # An unreadable retry queue leaves the wait bounded by the rescan instead of raising.
+    rotator.retry_queue = MagicMock(spec=RetryQueue)
+    rotator.retry_queue.next_due.side_effect = locked
+    assert scheduler._next_retry() is None
+
+def test_scheduler_counts_overdue_secrets_from_vault(tmp_path):
+    vault = VaultEngine("test-master-key", db_path=str(tmp_path / "overdue.db"))
+    for secret_id, role in (("old-01", "linux-admin"), ("old-02", "no-rotation"), ("new-01", "linux-admin")):
+        vault.store_secret(secret_id, secret_id, "linux", "x", {"role": role})
+    two_days_ago = (datetime.now() - timedelta(hours=48)).isoformat()
+    with vault._get_conn() as conn:
+        conn.execute("UPDATE secrets SET last_rotated = ? WHERE id LIKE 'old-%'", (two_days_ago,))
+        conn.commit()
+
+    policy_engine = MagicMock(spec=PolicyEngine)
+    policy_engine.policies = {"linux-admin": {"rotation_hours": 24}, "no-rotation": {}}
+    policy_engine.rotation_hours.side_effect = lambda role: 24 if role == "linux-admin" else None
+    scheduler = RotationScheduler(vault, MagicMock(spec=Rotator), policy_engine)
+    assert scheduler.overdue_count() == 1
+    assert scheduler.overdue_count(now=time.time() + 3 * 24 * 3600) == 2
+    vault.close()
+
+def test_simulator_profile_failures_timeouts_and_host_capacity():
+    failing = LinuxSimulator(SimulatorProfile(latency_ms=0, failure_rate=1.0))
+    assert failing.change_password("10.0.0.1", "root", "pw") is False
+    hanging = LinuxSimulator(SimulatorProfile(latency_ms=0, timeout_rate=1.0, timeout_seconds=0.01))
+    with pytest.raises(TimeoutError):
+        hanging.change_password("10.0.0.1", "root", "pw")
+    assert (failing.stats["failed"], hanging.stats["timed_out"]) == (1, 1)
+
+    # One change at a time per host: two changes to the same host take twice as long.
+    simulator = LinuxSimulator(SimulatorProfile(latency_ms=50, host_capacity=1))
+    threads = [
+        threading.Thread(target=simulator.change_password, args=(host, "root", f"pw-{i}"))
+        for i, host in enumerate(["10.0.0.1", "10.0.0.1", "10.0.0.2"])
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - start >= 0.1
+    assert simulator.snapshot() == {"changed": 3, "failed": 0, "timed_out": 0, "hosts": 2}
+
+    async def change_many():
+        simulator = LinuxSimulator(SimulatorProfile(latency_ms=20, distribution="lognormal", seed=1))
+        results = await asyncio.gather(
+            *(simulator.change_password_async(f"10.1.0.{i}", "root", "pw") for i in range(200))
+        )
+        return simulator, results
+
+    start = time.perf_counter()
+    simulator, results = asyncio.run(change_many())
+    assert all(results) and len(simulator.passwords) == 200
+    assert time.perf_counter() - start < 2  # concurrent, not 200 sequential sleeps
+
+    with pytest.raises(ValueError):
+        build_simulators({"linux": {"latency": 5}})
+
+def test_rotator_against_target_service(tmp_path):
+    vault = VaultEngine("test-master-key", db_path=str(tmp_path / "targets.db"))
+    for i in range(3):
+        vault.store_secret(f"tgt-{i}", f"Host {i}", "linux", "Initial!1", {"host": f"10.2.0.{i}", "username": "root"})
+    auditor = AuditLogger(log_file=str(tmp_path / "audit.log"))
+    service = TargetService(profile=SimulatorProfile(latency_ms=5, host_capacity=1)).start()
+    try:
+        rotator = Rotator(vault, auditor, simulators=build_simulators(service_url=service.url))
+        summary = rotator.rotate_many(["tgt-0", "tgt-1", "tgt-2"], max_concurrency=3)
+
+        assert len(summary["rotated"]) == 3
+        for i in range(3):
+            assert service.simulator.passwords[(f"10.2.0.{i}", "root")] == vault.get_secret(f"tgt-{i}")
+
+        service.simulator.profile.failure_rate = 1.0
+        assert HttpTargetSimulator(service.url, "linux").change_password("10.2.0.0", "root", "pw") is False
+        assert rotator.rotate_secret("tgt-0") is False
+    finally:
+        service.stop()
+        auditor.close()
+        vault.close()
+
+def test_retries_time_out_and_open_the_host_breaker(mock_vault, mock_auditor, tmp_path):
+    simulator = LinuxSimulator(SimulatorProfile(latency_ms=0, timeout_rate=1.0, timeout_seconds=5))
+    rotator = Rotator(
+        mock_vault, mock_auditor,
+        simulators={"linux": simulator},
+        retry_policy=RetryPolicy(attempts=3, attempt_timeout=0.02, backoff=Backoff(0.001, 0.002)),
+        breakers=HostBreakers(failure_threshold=2, reset_seconds=0.2),
+        retry_queue=RetryQueue(str(tmp_path / "vault.db"))
+    )
+
+    start = time.perf_counter()
+    assert rotator.rotate_secret("test-rot-01") is False
+    assert time.perf_counter() - start < 1  # bounded by the attempt timeout, not the 5s hang
+    # Two timeouts open the breaker, so the third attempt never reaches the host.
+    assert simulator.stats["timed_out"] == 2
+    assert rotator.breakers.state("192.168.1.50") == "open"
+    assert rotator.stats == {"attempts": 2, "retries": 1, "short_circuited": 1}
+    [entry] = rotator.retry_queue.snapshot()["next"]
+    assert entry["id"] == "test-rot-01" and "circuit open" in entry["error"]
+    assert rotator.retry_queue.next_due() >= rotator.breakers.retry_at("192.168.1.50")
+
+    with pytest.raises(CircuitOpenError):
+        rotator._change_with_retries(simulator, "192.168.1.50", "root", "pw")
+    assert simulator.stats["timed_out"] == 2
+
+    # After reset_seconds a trial call goes through; success closes the breaker and clears the retry.
+    time.sleep(0.25)
+    simulator.profile.timeout_rate = 0.0
+    assert rotator.rotate_secret("test-rot-01") is True
+    assert rotator.breakers.snapshot()["failing"] == 0
+    assert "test-rot-01" not in rotator.retry_queue
+
+def test_scheduler_drains_deferred_retries_then_falls_back(mock_vault, mock_auditor, tmp_path):
+    mock_vault.rotation_schedule.return_value = [
+        ("overdue-01", "linux-admin", (datetime.now() - timedelta(hours=25)).isoformat())
+    ]
+    mock_vault.get_metadata_bulk.side_effect = lambda ids: {
+        secret_id: {"id": secret_id, "type": "linux", "metadata": {"host": "10.0.0.9"}} for secret_id in ids
+    }
+    policy_engine = MagicMock(spec=PolicyEngine)
+    policy_engine.rotation_hours.return_value = 24
+    rotator = Rotator(
+        mock_vault, mock_auditor,
+        retry_policy=RetryPolicy(attempts=1),
+        retry_queue=RetryQueue(str(tmp_path / "vault.db"), backoff=Backoff(0, 0), max_deferrals=1)
+    )
+    rotator.linux_sim.change_password = MagicMock(return_value=False)
+    scheduler = RotationScheduler(mock_vault, rotator, policy_engine, jitter_seconds=0, retry_seconds=600)
+    scheduler.rebuild()
+
+    [failed] = scheduler.run_once()["failed"]
+    assert failed["retry_at"] and "overdue-01" in rotator.retry_queue
+    assert scheduler.next_due() is None  # waiting in the retry queue, not the heap
+    assert scheduler.rebuild() == 0
+
+    # The deferred retry fails too; with its deferrals used up it goes back on the heap.
+    [failed] = scheduler.run_once()["failed"]
+    assert failed["retry_at"] is None and "overdue-01" not in rotator.retry_queue
+    assert scheduler.next_due() == pytest.approx(time.time() + 600, abs=5)
+
+    rotator.linux_sim.change_password.return_value = True
+    assert scheduler.run_once(now=time.time() + 601)["rotated"][0]["id"] == "overdue-01"
+    assert scheduler.next_due() > time.time() + 23 * 3600
+
+def test_retry_deferred_by_one_rotator_is_drained_by_another(mock_vault, mock_auditor, tmp_path):
+    mock_vault.rotation_schedule.return_value = []
+    mock_vault.get_metadata_bulk.side_effect = lambda ids: {
+        secret_id: {"id": secret_id, "type": "linux", "metadata": {"host": "10.0.0.9"}} for secret_id in ids
+    }
+    db_path = str(tmp_path / "vault.db")
+
+    # Without a queue (no scheduler to drain it) nothing is deferred.
+    lone = Rotator(mock_vault, mock_auditor, retry_policy=RetryPolicy(attempts=1))
+    lone.linux_sim.change_password = MagicMock(return_value=False)
+    assert lone.rotate_many(["api-01"])["failed"][0]["retry_at"] is None
+
+    # An API worker defers the failure into the shared table...
+    worker = Rotator(
+        mock_vault, mock_auditor,
+        retry_policy=RetryPolicy(attempts=1),
+        retry_queue=RetryQueue(db_path, backoff=Backoff(0, 0))
+    )
+    worker.linux_sim.change_password = MagicMock(return_value=False)
+    [failed] = worker.rotate_many(["api-01"])["failed"]
+    assert failed["retry_at"]
+
+    # ...and a scheduler in another process picks it up and rotates it.
+    drainer = Rotator(mock_vault, mock_auditor, retry_queue=RetryQueue(db_path))
+    drainer.linux_sim.change_password = MagicMock(return_value=True)
+    assert drainer.retry_queue.snapshot()["next"][0]["deferrals"] == 1
+    scheduler = RotationScheduler(mock_vault, drainer, MagicMock(spec=PolicyEngine), jitter_seconds=0)
+    assert scheduler.run_once()["rotated"][0]["id"] == "api-01"
+    assert len(worker.retry_queue) == 0
+    assert scheduler.run_once() is None
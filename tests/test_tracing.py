@@ -0,0 +1,65 @@
+import asyncio
+import json
+import time
+
+from telemetry.tracing import Tracer, span, traced
+from vault.async_vault import AsyncVault
+from vault.vault_engine import VaultEngine
+
+
+def test_trace_follows_async_vault_into_executor_threads(tmp_path):
+    vault = VaultEngine("test-master-key", db_path=str(tmp_path / "trace.db"))
+    vault.store_secret("traced-01", "T", "linux", "TracePass")
+    async_vault = AsyncVault(vault, db_workers=2)
+    trace_file = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, output_file=str(trace_file))
+
+    async def handler() -> str:
+        started = tracer.start("/credential/x")
+        assert started is not None
+        try:
+            with span("handler"):
+                return await async_vault.get_secret("traced-01")
+        finally:
+            tracer.finish(started, name="GET /credential/{request_id}")
+
+    assert asyncio.run(handler()) == "TracePass"
+    async_vault.close()
+    tracer.close()
+    vault.close()
+
+    record = json.loads(trace_file.read_text().splitlines()[0])
+    assert record["name"] == "GET /credential/{request_id}"
+    spans = {s["name"]: s for s in record["spans"]}
+    assert spans["AsyncVault.get_secret"]["parent"] == spans["handler"]["id"]
+    assert spans["VaultEngine._read_encrypted"]["parent"] == spans["AsyncVault.get_secret"]["id"]
+    assert spans["CryptoEngine.decrypt"]["thread"] != spans["handler"]["thread"]
+
+def test_untraced_calls_record_nothing_and_chrome_output_loads(tmp_path):
+    @traced("work")
+    def work() -> int:
+        time.sleep(0.03)
+        return 1
+
+    assert Tracer(sample_rate=0).start("/skipped") is None
+    assert work() == 1  # no active trace: runs undecorated
+
+    trace_file = tmp_path / "trace.json"
+    tracer = Tracer(
+        sample_rate=1.0, output_file=str(trace_file), fmt="chrome", profile_slowest=1, profile_interval_ms=1
+    )
+    for name in ("fast", "slow"):
+        started = tracer.start(name)
+        assert started is not None
+        if name == "slow":
+            work()
+        tracer.finish(started)
+    tracer.close()
+
+    events = json.loads(trace_file.read_text().rstrip().rstrip(",") + "]")
+    assert {e["name"] for e in events} == {"fast", "slow", "work"}
+    assert all(e["ph"] == "X" for e in events)
+    [slowest] = tracer.slowest()
+    assert slowest["name"] == "slow"
+    assert slowest["profile"]["samples"] > 0
+    assert any("work" in stack for stack in slowest["profile"]["stacks"])
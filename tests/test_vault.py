@@ -1,18 +1,30 @@
+import asyncio
 import os
+import sqlite3
+import threading
+from unittest.mock import ANY
 
 import pytest
 
-from vault.crypto import CryptoEngine
-from vault.vault_engine import VaultEngine
+from vault.async_vault import AsyncVault
+from vault.crypto import BLOB_ENVELOPE, CryptoEngine, unpack_blob
+from vault.vault_engine import SCHEMA_VERSION, VaultEngine, _migrate_v1
 
 TEST_DB = "test_vault.db"
 MASTER_KEY = "test_master_key_123"
 
+def remove_db(db_path: str) -> None:
+    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
 @pytest.fixture
 def vault():
-    if os.path.exists(TEST_DB):
-        os.remove(TEST_DB)
-    return VaultEngine(MASTER_KEY, db_path=TEST_DB)
+    remove_db(TEST_DB)
+    engine = VaultEngine(MASTER_KEY, db_path=TEST_DB)
+    yield engine
+    engine.close()
+    remove_db(TEST_DB)
 
 def test_crypto_engine():
     crypto = CryptoEngine(MASTER_KEY)
@@ -39,3 +51,239 @@ def test_vault_rotation(vault):
     
     secret = vault.get_secret("test-02")
     assert secret == "NewPass"
+
+def test_envelope_encryption_uses_wrapped_data_key(vault):
+    vault.store_secret("env-01", "Envelope", "linux", "EnvelopePass")
+
+    with vault._get_conn() as conn:
+        blob, ciphertext, key_version = conn.execute(
+            'SELECT secret_blob, ciphertext, key_version FROM secrets WHERE id = ?', ("env-01",)
+        ).fetchone()
+
+    kind, wrapped_key, iv, body, tag = unpack_blob(blob)
+    assert kind == BLOB_ENVELOPE and len(wrapped_key) == 40 and len(iv) == 12 and len(tag) == 16
+    assert len(blob) == 2 + 40 + 12 + len("EnvelopePass") + 16
+    assert ciphertext is None
+    assert key_version == 1
+    assert vault.get_secret("env-01") == "EnvelopePass"
+
+def test_legacy_rows_readable_and_migrated(vault):
+    legacy = VaultEngine(MASTER_KEY, db_path=TEST_DB, envelope_encryption=False)
+    with legacy._get_conn() as conn:
+        conn.execute('DELETE FROM vault_keys')
+        conn.commit()
+    legacy.store_secret("legacy-01", "Legacy", "linux", "LegacyPass")
+    legacy.close()
+
+    vault._init_db()
+    assert vault.get_secret("legacy-01") == "LegacyPass"
+
+    assert vault.migrate_to_envelope() == 1
+    assert vault.migrate_to_envelope() == 0
+    assert vault.get_secret("legacy-01") == "LegacyPass"
+
+@pytest.mark.usefixtures("vault")
+def test_wrong_master_key_rejected():
+    with pytest.raises(ValueError):
+        VaultEngine("not-the-master-key", db_path=TEST_DB)
+
+def test_pool_uses_wal_and_reuses_connections(vault):
+    with vault._get_conn() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        first = conn
+    with vault._get_conn() as conn:
+        assert conn is first
+
+def test_reader_not_blocked_by_open_writer(vault):
+    vault.store_secret("wal-01", "WAL", "linux", "BeforeWrite")
+    writer_ready = threading.Event()
+    release_writer = threading.Event()
+
+    def hold_write_lock():
+        with vault._get_conn() as conn:
+            conn.execute('UPDATE secrets SET name = ? WHERE id = ?', ("Locked", "wal-01"))
+            writer_ready.set()
+            release_writer.wait(5)
+            conn.commit()
+
+    writer = threading.Thread(target=hold_write_lock)
+    writer.start()
+    writer_ready.wait(5)
+    try:
+        assert vault.get_secret("wal-01") == "BeforeWrite"
+    finally:
+        release_writer.set()
+        writer.join()
+
+def test_bulk_store_and_get(vault):
+    items = ({"id": f"bulk-{i}", "name": f"Bulk {i}", "type": "linux", "value": f"Pass{i}"} for i in range(7))
+    results = vault.store_secrets_bulk([*items, {"id": "bad", "name": "Missing value", "type": "linux"}], chunk_size=3)
+
+    assert [r["status"] for r in results] == ["created"] * 7 + ["error"]
+    values = vault.get_secrets_bulk(["bulk-0", "bulk-6", "bad"], chunk_size=2)
+    assert values == {"bulk-0": "Pass0", "bulk-6": "Pass6", "bad": None}
+
+def test_rotation_schedule_uses_role_column(vault):
+    vault.store_secret("sched-02", "Second", "linux", "Pass", {"role": "windows-admin"})
+    vault.store_secret("sched-01", "First", "linux", "Pass")
+
+    schedule = vault.rotation_schedule()
+    assert [(row[0], row[1]) for row in schedule] == [("sched-02", "windows-admin"), ("sched-01", None)]
+
+def test_list_secrets_keyset_pages_and_filters(vault):
+    vault.store_secrets_bulk([
+        {"id": f"s{i:02d}", "name": f"Secret {i}", "type": "linux" if i % 2 else "windows", "value": "pw",
+         "metadata": {"role": f"role-{i % 3}", "host": f"host-{i % 4}"}}
+        for i in range(10)
+    ])
+
+    ids, after = [], None
+    while True:
+        page = vault.list_secrets(after=after, limit=3)
+        if not page:
+            break
+        ids += [s["id"] for s in page]
+        after = page[-1]["id"]
+    assert ids == [f"s{i:02d}" for i in range(10)]
+
+    assert [s["id"] for s in vault.list_secrets(secret_type="linux", role="role-1")] == ["s01", "s07"]
+    assert [s["id"] for s in vault.list_secrets(host="host-2", limit=1, after="s02")] == ["s06"]
+    assert vault.list_secrets(limit=1)[0] == {
+        "id": "s00", "name": "Secret 0", "type": "windows", "last_rotated": ANY, "role": "role-0", "host": "host-0"
+    }
+    assert vault.list_secrets(rotated_before="2000-01-01") == []
+
+    with vault._get_conn() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM secrets WHERE role = ? AND id > ? ORDER BY id LIMIT 3", ("r", "s")
+        ).fetchall()
+    assert "idx_secrets_role" in plan[0][-1]
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_async_vault_roundtrip(vault, executor):
+    async_vault = AsyncVault(vault, crypto_executor=executor, crypto_workers=1, db_workers=2)
+
+    async def roundtrip():
+        await async_vault.store_secret("async-01", "Async", "linux", "AsyncPass!", {"role": "db-readonly"})
+        values = await asyncio.gather(*(async_vault.get_secret("async-01") for _ in range(4)))
+        meta = await async_vault.get_metadata("async-01")
+        return values, meta, await async_vault.get_secret("missing")
+
+    try:
+        values, meta, missing = asyncio.run(roundtrip())
+    finally:
+        async_vault.close()
+    assert values == ["AsyncPass!"] * 4
+    assert meta["metadata"]["role"] == "db-readonly"
+    assert missing is None
+    assert vault.get_secret("async-01") == "AsyncPass!"  # readable through the sync path too
+
+NEW_MASTER_KEY = "rotated_master_key_456"
+
+def test_rekey_resumes_and_keeps_vault_readable(tmp_path):
+    db_path = str(tmp_path / "rekey.db")
+    legacy = VaultEngine(MASTER_KEY, db_path=db_path, envelope_encryption=False)
+    legacy.store_secret("legacy-00", "Legacy", "linux", "LegacyPass")
+    legacy.close()
+    vault = VaultEngine(MASTER_KEY, db_path=db_path)
+    for i in range(1, 7):
+        vault.store_secret(f"env-{i:02d}", "Envelope", "linux", f"Pass{i}")
+
+    def interrupt(_stats):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        vault.rekey(MASTER_KEY, NEW_MASTER_KEY, chunk_size=3, workers=0, progress=interrupt)
+
+    # Mid-rekey: old-key processes read both key versions; a wrong new key can't resume.
+    reader = VaultEngine(MASTER_KEY, db_path=db_path)
+    assert reader.crypto.active_key_version == 2
+    assert reader.get_secrets_bulk([f"env-{i:02d}" for i in range(1, 7)])["env-06"] == "Pass6"
+    assert reader.get_secret("legacy-00") == "LegacyPass"
+    with pytest.raises(ValueError):
+        vault.rekey(MASTER_KEY, "some-other-key", workers=0)
+    # A write under the old version behind the checkpoint is caught by the final sweep.
+    vault.crypto.active_key_version = 1
+    vault.store_secret("env-01", "Envelope", "linux", "Rotated1")
+
+    seen = []
+    result = vault.rekey(MASTER_KEY, NEW_MASTER_KEY, chunk_size=3, workers=0, progress=seen.append)
+    assert result["resumed"] and result["key_version"] == 2
+    assert result["rows_done"] == 8  # 3 before the interruption, 4 after, plus the swept rewrite
+    assert seen[-1]["rows_remaining"] == 0
+    reader.close()
+    vault.close()
+
+    with pytest.raises(ValueError):
+        VaultEngine(MASTER_KEY, db_path=db_path)
+    rekeyed = VaultEngine(NEW_MASTER_KEY, db_path=db_path)
+    values = rekeyed.get_secrets_bulk(["legacy-00", "env-01", "env-06"])
+    assert values == {"legacy-00": "LegacyPass", "env-01": "Rotated1", "env-06": "Pass6"}
+    with rekeyed._get_conn() as conn:
+        assert conn.execute("SELECT DISTINCT key_version FROM secrets").fetchall() == [(2,)]
+        assert conn.execute("SELECT version, wrapped_kek FROM vault_keys").fetchall() == [(2, None)]
+    rekeyed.close()
+
+def test_new_master_key_reads_every_row_of_an_interrupted_rekey(tmp_path):
+    db_path = str(tmp_path / "rekey.db")
+    vault = VaultEngine(MASTER_KEY, db_path=db_path)
+    vault.store_secrets_bulk([{"id": f"s{i:02d}", "name": "S", "type": "linux", "value": f"v{i}"} for i in range(10)])
+
+    def interrupt(_stats):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        vault.rekey(MASTER_KEY, NEW_MASTER_KEY, chunk_size=3, workers=0, progress=interrupt)
+    with vault._get_conn() as conn:
+        assert conn.execute("SELECT key_version, COUNT(*) FROM secrets GROUP BY 1").fetchall() == [(1, 7), (2, 3)]
+
+    # Started with the new key mid-rekey, a process opens rows under both versions.
+    reader = VaultEngine(NEW_MASTER_KEY, db_path=db_path)
+    ids = [f"s{i:02d}" for i in range(10)]
+    assert reader.get_secrets_bulk(ids) == {f"s{i:02d}": f"v{i}" for i in range(10)}
+    reader.store_secret("s10", "S", "linux", "v10")
+    assert vault.get_secret("s10") == "v10"
+    reader.close()
+    vault.close()
+
+def test_rekey_in_worker_processes(vault):
+    vault.store_secrets_bulk([{"id": f"w{i}", "name": "W", "type": "linux", "value": f"v{i}"} for i in range(20)])
+    result = vault.rekey(MASTER_KEY, NEW_MASTER_KEY, chunk_size=8, workers=2)
+    assert result["rows_done"] == 20 and not result["resumed"]
+    assert vault.get_secret("w19") == "v19"
+    with pytest.raises(ValueError):
+        vault.rekey(MASTER_KEY, "third_master_key")  # the old key no longer opens the vault
+
+def test_schema_migration_keeps_base64_rows_readable(tmp_path):
+    db_path = str(tmp_path / "v1.db")
+    conn = sqlite3.connect(db_path)
+    _migrate_v1(conn.cursor())  # a vault from before schema versioning
+    legacy = CryptoEngine(MASTER_KEY).encrypt("LegacyPass")
+    conn.execute(
+        'INSERT INTO secrets (id, name, type, ciphertext, iv, salt, tag) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        ("legacy-01", "Legacy", "linux", legacy["ciphertext"], legacy["iv"], legacy["salt"], legacy["tag"])
+    )
+    conn.commit()
+    conn.close()
+
+    vault = VaultEngine(MASTER_KEY, db_path=db_path)
+    vault._write_secret("text-01", "Text", "linux", vault.crypto.encrypt("TextPass"))  # base64 envelope row
+    vault.store_secret("blob-01", "Blob", "linux", "BlobPass")
+    with vault._get_conn() as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert vault.get_secrets_bulk(["legacy-01", "text-01", "blob-01"]) == {
+        "legacy-01": "LegacyPass", "text-01": "TextPass", "blob-01": "BlobPass"
+    }
+
+    assert vault.compact_storage(batch_size=1) == 2
+    with vault._get_conn() as conn:
+        rows = conn.execute('SELECT id, ciphertext, key_version FROM secrets ORDER BY id').fetchall()
+    assert rows == [("blob-01", None, 1), ("legacy-01", None, None), ("text-01", None, 1)]
+    assert vault.get_secret("legacy-01") == "LegacyPass"
+    assert vault.get_secret("text-01") == "TextPass"
+    assert vault.migrate_to_envelope() == 1
+    vault.close()
+
+    reopened = VaultEngine(MASTER_KEY, db_path=db_path)  # already current: nothing to migrate
+    assert reopened.get_secret("legacy-01") == "LegacyPass"
+    reopened.close()
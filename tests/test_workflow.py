@@ -0,0 +1,127 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from workflow.access_requests import AccessWorkflow
+from workflow.reaper import LeaseReaper
+from workflow.stores import InMemoryRequestStore, SQLiteRequestStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store_factory(request, tmp_path):
+    db_path = str(tmp_path / "requests.db")
+    stores = []
+
+    def make():
+        store = InMemoryRequestStore() if request.param == "memory" else SQLiteRequestStore(db_path)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+def test_request_lifecycle(store_factory):
+    workflow = AccessWorkflow(store_factory())
+    req_id = workflow.create_request("alice", "db-01", "maintenance")
+    assert not workflow.is_access_valid(req_id, "alice")
+
+    req = workflow.approve_request(req_id, "admin", ttl_minutes=15)
+    assert req["status"] == "APPROVED"
+    assert req["approver"] == "admin"
+    assert workflow.is_access_valid(req_id, "alice")
+    assert not workflow.is_access_valid(req_id, "mallory")
+    assert workflow.approve_request("missing", "admin", 15) is None
+    assert [r["id"] for r in workflow.list_requests(user="alice", status="APPROVED")] == [req_id]
+
+def test_second_approval_does_not_extend_lease(store_factory):
+    workflow = AccessWorkflow(store_factory())
+    req_id = workflow.create_request("alice", "db-01", "maintenance")
+    first = workflow.approve_request(req_id, "admin", ttl_minutes=1)
+    second = workflow.approve_request(req_id, "other-admin", ttl_minutes=600)
+    assert second["approver"] == "admin"
+    assert second["expires_at"] == first["expires_at"]
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    worker_a = AccessWorkflow(SQLiteRequestStore(db_path))
+    worker_b = AccessWorkflow(SQLiteRequestStore(db_path))
+    req_id = worker_a.create_request("alice", "db-01", "incident")
+
+    # Concurrent approvals from two "workers": exactly one transition wins.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(
+            lambda i: (worker_a if i % 2 else worker_b).store.transition(req_id, "PENDING", {
+                "status": "APPROVED", "approver": f"admin-{i}"
+            }),
+            range(8)
+        ))
+    assert sum(r is not None for r in results) == 1
+    assert worker_b.get_request(req_id)["status"] == "APPROVED"
+
+    worker_a.store.close()
+    worker_b.store.close()
+    restarted = AccessWorkflow(SQLiteRequestStore(db_path))
+    assert restarted.get_request(req_id)["user"] == "alice"
+    restarted.store.close()
+
+def test_reaper_expires_leases_and_stale_requests(store_factory):
+    auditor = MagicMock()
+    workflow = AccessWorkflow(store_factory(), pending_ttl_minutes=60)
+    reaper = LeaseReaper(workflow, auditor, retention_seconds=3600)
+    stale = workflow.create_request("alice", "db-01", "forgotten")
+    lease = workflow.create_request("bob", "db-02", "incident")
+    workflow.approve_request(lease, "admin", ttl_minutes=15)
+    now = time.time()
+
+    assert reaper.run_once(now)["expired"] == []
+    expired = reaper.run_once(now + 16 * 60)["expired"]
+    assert [r["id"] for r in expired] == [lease]
+    assert workflow.get_request(lease)["status"] == "EXPIRED"
+    assert not workflow.is_access_valid(lease, "bob")
+
+    # A pending request can't be approved once it has lapsed, even before the reaper runs.
+    with patch("workflow.access_requests.time.time", return_value=now + 61 * 60):
+        assert workflow.approve_request(stale, "admin", 15)["status"] == "PENDING"
+    assert [r["id"] for r in reaper.run_once(now + 61 * 60)["expired"]] == [stale]
+    events = [e for call in auditor.log_events.call_args_list for e in call.args[0]]
+    assert [(e["action"], e["details"]["previous_status"]) for e in events] == [
+        ("REQUEST_EXPIRED", "APPROVED"), ("REQUEST_EXPIRED", "PENDING")
+    ]
+    assert workflow.store.next_expiry() is None
+
+    # Expired requests are purged once past the retention window.
+    assert reaper.run_once(now + 3 * 3600)["purged"] == 2
+    assert workflow.get_request(lease) is None
+    assert workflow.list_requests() == []
+
+def test_reaper_backs_off_while_the_store_fails():
+    store = MagicMock(spec=InMemoryRequestStore)
+    store.purge.side_effect = RuntimeError("database is locked")
+    store.next_expiry.side_effect = RuntimeError("database is locked")
+    workflow = MagicMock(spec=AccessWorkflow)
+    workflow.store = store
+    workflow.expire_due.return_value = []
+    reaper = LeaseReaper(workflow, MagicMock(), interval_seconds=0.05)
+
+    reaper.start()
+    time.sleep(0.2)
+    assert reaper._thread is not None and reaper._thread.is_alive()
+    reaper.stop(timeout=1)
+    assert 1 <= store.purge.call_count <= 6  # one attempt per interval, not a hot loop
+
+def test_expiry_is_reaped_once_across_workers(tmp_path):
+    db_path = str(tmp_path / "shared.db")
+    workers = [AccessWorkflow(SQLiteRequestStore(db_path)) for _ in range(4)]
+    ids = [workers[0].create_request(f"user-{i}", "db-01", "batch") for i in range(20)]
+    for req_id in ids:
+        workers[1].approve_request(req_id, "admin", ttl_minutes=1)
+
+    later = time.time() + 120
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda w: w.expire_due(later), workers))
+    assert sorted(r["id"] for batch in results for r in batch) == sorted(ids)
+    for worker in workers:
+        worker.store.close()
@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, FrozenSet, Optional
+
+from telemetry.tracing import traced
+
+from .crypto import CryptoEngine
+from .vault_engine import VaultEngine
+
+CRYPTO_EXECUTORS = ("thread", "process")
+
+# Per-process engine for crypto worker processes, set up by _init_worker().
+_worker_crypto: Optional[CryptoEngine] = None
+
+
+def _init_worker(master_key: str, keks: Dict[int, bytes], active_key_version: Optional[int]) -> None:
+    global _worker_crypto
+    _worker_crypto = CryptoEngine(master_key)
+    _worker_crypto.keks = dict(keks)
+    _worker_crypto.active_key_version = active_key_version
+
+
+def _worker_encrypt(plaintext: str) -> Dict[str, Any]:
+    assert _worker_crypto is not None
+    return _worker_crypto.encrypt_blob(plaintext)
+
+
+def _worker_decrypt(encrypted: Dict[str, Any]) -> str:
+    assert _worker_crypto is not None
+    return _worker_crypto.decrypt(encrypted)
+
+
+class CryptoExecutor:
+    """Runs CryptoEngine work off the event loop.
+
+    "thread" uses a thread pool: OpenSSL releases the GIL for PBKDF2 and
+    AES-GCM, so this scales across cores for large payloads and legacy rows
+    without copying keys anywhere. "process" uses worker processes (spawned,
+    not forked, so they never inherit the server's threads), each holding its
+    own copy of the master key and KEKs; it also parallelises the Python-level
+    work around each call. Workers are restarted if the loaded KEK versions
+    change.
+    """
+
+    def __init__(self, crypto: CryptoEngine, kind: str = "thread", workers: Optional[int] = None):
+        if kind not in CRYPTO_EXECUTORS:
+            raise ValueError(f"crypto executor must be one of {', '.join(CRYPTO_EXECUTORS)}")
+        self.crypto = crypto
+        self.kind = kind
+        self.workers = workers
+        self._key_versions: FrozenSet[int] = frozenset()
+        self._executor = self._start()
+
+    def _start(self) -> Executor:
+        if self.kind == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crypto")
+        self._key_versions = frozenset(self.crypto.keks)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.crypto.master_key.decode(), dict(self.crypto.keks), self.crypto.active_key_version)
+        )
+
+    def _current(self) -> Executor:
+        if self.kind == "process" and frozenset(self.crypto.keks) != self._key_versions:
+            old, self._executor = self._executor, self._start()
+            old.shutdown(wait=False)
+        return self._executor
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.kind == "thread":
+            # Carry the caller's context (e.g. its trace) into the worker thread.
+            return await asyncio.get_running_loop().run_in_executor(
+                self._current(), contextvars.copy_context().run, fn, *args
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._current(), fn, *args)
+
+    async def encrypt(self, plaintext: str) -> Dict[str, Any]:
+        if self.kind == "thread":
+            return await self._run(self.crypto.encrypt_blob, plaintext)
+        return await self._run(_worker_encrypt, plaintext)
+
+    async def decrypt(self, encrypted: Dict[str, Any]) -> str:
+        if self.kind == "thread":
+            return await self._run(self.crypto.decrypt, encrypted)
+        return await self._run(_worker_decrypt, encrypted)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class AsyncVault:
+    """Awaitable front end to a VaultEngine for async endpoints.
+
+    Blocking SQLite calls run on a dedicated thread pool sized like the
+    connection pool, and encryption runs on a CryptoExecutor, so neither
+    occupies the event loop or Starlette's shared threadpool. Plaintext cache
+    lookups stay inline since they are dictionary operations.
+    """
+
+    def __init__(
+        self,
+        vault: VaultEngine,
+        crypto_executor: str = "thread",
+        crypto_workers: Optional[int] = None,
+        db_workers: int = 8
+    ):
+        self.vault = vault
+        self.crypto = CryptoExecutor(vault.crypto, crypto_executor, crypto_workers)
+        self.db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="vault-db")
+
+    async def run_db(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking database call on the DB thread pool."""
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, call)
+
+    @traced()
+    async def get_secret(self, secret_id: str, cache_seconds: Optional[float] = None) -> Optional[str]:
+        """Async VaultEngine.get_secret, with the same plaintext cache semantics."""
+        cache = self.vault.plaintext_cache if cache_seconds and cache_seconds > 0 else None
+        if cache is not None:
+            generation = cache.generation()
+            stamp = await self.run_db(self.vault._read_stamp, secret_id)
+            cached = cache.get_text(secret_id, stamp)
+            if cached is not None:
+                return cached
+
+        encrypted = await self.run_db(self.vault._read_encrypted, secret_id)
+        if encrypted is None:
+            return None
+
+        value = await self.crypto.decrypt(encrypted)
+        if cache is not None:
+            cache.put_text(secret_id, value, stamp, generation, ttl_seconds=cache_seconds)
+        return value
+
+    @traced()
+    async def store_secret(
+        self,
+        secret_id: str,
+        name: str,
+        secret_type: str,
+        value: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        encrypted = await self.crypto.encrypt(value)
+        await self.run_db(self.vault._write_secret, secret_id, name, secret_type, encrypted, metadata)
+
+    @traced()
+    async def get_metadata(self, secret_id: str) -> Optional[Dict[str, Any]]:
+        return await self.run_db(self.vault.get_metadata, secret_id)
+
+    def close(self) -> None:
+        self.crypto.shutdown()
+        self.db_executor.shutdown(wait=True)
@@ -0,0 +1,180 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries also expire after ``ttl_seconds``.
+
+    Holds at most ``max_size`` entries, evicting the least recently used; a
+    ``max_size`` of 0 disables caching. With ``ttl_seconds`` None entries live
+    until evicted or invalidated. With ``sweep_seconds`` set, expired entries
+    are also swept out on get/put at most once per ``sweep_seconds``, so they
+    don't linger in an idle corner of the cache. Hit, miss and eviction
+    counts are kept for stats(). Subclasses can override _discard() to act on
+    every value that leaves the cache.
+    """
+
+    def __init__(
+        self, max_size: int = 1024, ttl_seconds: Optional[float] = None, sweep_seconds: Optional[float] = None
+    ):
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.sweep_seconds = sweep_seconds
+        self._next_sweep = 0.0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        # Bumped by every invalidation; see put_if_current().
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _discard(self, value: Any) -> None:
+        """Called under the lock for each value evicted, expired, invalidated or cleared."""
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop every expired entry. Returns how many were dropped."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [key for key, (_, expires) in self._entries.items() if expires and now >= expires]
+            for key in expired:
+                self._discard(self._entries.pop(key)[0])
+            if self.sweep_seconds is not None:
+                self._next_sweep = now + self.sweep_seconds
+            return len(expired)
+
+    def _maybe_sweep(self, now: float) -> None:
+        if self.sweep_seconds is not None and now >= self._next_sweep:
+            self.sweep(now)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            self._maybe_sweep(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires and time.monotonic() >= expires:
+                del self._entries[key]
+                self._discard(value)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """Cache ``value``; ``ttl_seconds`` can shorten (never extend) the cache-wide TTL."""
+        if not self.max_size:
+            self._discard(value)
+            return
+        ttls = [t for t in (self.ttl_seconds, ttl_seconds) if t is not None]
+        now = time.monotonic()
+        expires = now + min(ttls) if ttls else 0.0
+        with self._lock:
+            self._maybe_sweep(now)
+            previous = self._entries.pop(key, None)
+            if previous is not None and previous[0] is not value:
+                self._discard(previous[0])
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self.max_size:
+                self._discard(self._entries.popitem(last=False)[1][0])
+                self.evictions += 1
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put_if_current(
+        self, key: Hashable, value: Any, generation: int, ttl_seconds: Optional[float] = None
+    ) -> bool:
+        """Cache ``value`` only if nothing was invalidated since generation() returned ``generation``.
+
+        Lets a reader that loaded ``value`` from the database avoid caching it
+        after a concurrent writer has already invalidated the key.
+        """
+        with self._lock:
+            if self._generation != generation:
+                self._discard(value)
+                return False
+            self.put(key, value, ttl_seconds)
+            return True
+
+    def invalidate(self, key: Hashable) -> None:
+        self.invalidate_many([key])
+
+    def invalidate_many(self, keys: Iterable[Hashable]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._discard(entry[0])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            for value, _ in self._entries.values():
+                self._discard(value)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class PlaintextCache(TTLCache):
+    """Decrypted secret values held in bytearrays that are zeroed when they leave the cache.
+
+    Each value is stored with a version ``stamp`` (the row's last_rotated), and
+    a hit only counts when the caller's current stamp matches, so a value
+    rewritten by another process is never served. Only the cache's own copy
+    can be wiped: the str handed to a caller is an ordinary immutable Python
+    object. Keep ``max_size`` and ``ttl_seconds`` small; the cache exists to
+    absorb bursts of fetches within a lease. Expired values are swept and
+    zeroed every ``sweep_seconds`` (default: ``ttl_seconds``).
+    """
+
+    def __init__(
+        self, max_size: int = 1024, ttl_seconds: Optional[float] = None, sweep_seconds: Optional[float] = None
+    ):
+        super().__init__(max_size, ttl_seconds, sweep_seconds if sweep_seconds is not None else ttl_seconds)
+
+    def _discard(self, value: Any) -> None:
+        buffer = value[1]
+        buffer[:] = bytes(len(buffer))
+
+    def get_text(self, key: Hashable, stamp: Optional[str]) -> Optional[str]:
+        # Decode under the lock so a concurrent eviction can't zero the buffer mid-read.
+        with self._lock:
+            value = self.get(key)
+            if value is None:
+                return None
+            if stamp is None or value[0] != stamp:
+                # Rewritten (or deleted) elsewhere since it was cached.
+                self.hits -= 1
+                self.misses += 1
+                self._discard(self._entries.pop(key)[0])
+                return None
+            return value[1].decode("utf-8")
+
+    def put_text(
+        self, key: Hashable, text: str, stamp: Optional[str], generation: int, ttl_seconds: Optional[float] = None
+    ) -> bool:
+        return self.put_if_current(key, (stamp, bytearray(text.encode("utf-8"))), generation, ttl_seconds)
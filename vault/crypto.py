@@ -1,63 +1,214 @@
 import base64
+import hashlib
+import hmac
 import os
+import struct
+from typing import Dict, Optional, Tuple
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.keywrap import aes_key_unwrap, aes_key_wrap
+
+from telemetry.metrics import stage
+from telemetry.tracing import traced
+
+KDF_ITERATIONS = 100000
+KEK_CHECK_LABEL = b"pam-lab-kek-check"
+
+# Binary layout of the secrets.secret_blob column:
+#   format version (1 byte) | kind (1 byte) | salt (legacy, 16 bytes) or wrapped data key (envelope,
+#   40 bytes) | GCM nonce (12 bytes) | ciphertext | GCM tag (16 bytes)
+BLOB_FORMAT_VERSION = 1
+BLOB_LEGACY = 0
+BLOB_ENVELOPE = 1
+BLOB_HEADER = struct.Struct("BB")
+BLOB_KEY_MATERIAL_SIZES = {BLOB_LEGACY: 16, BLOB_ENVELOPE: 40}
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+_kdf_stage = stage("kdf")
+_aes_stage = stage("aes")
+
+
+def pack_blob(kind: int, key_material: bytes, iv: bytes, ciphertext: bytes, tag: bytes) -> bytes:
+    return b"".join((BLOB_HEADER.pack(BLOB_FORMAT_VERSION, kind), key_material, iv, ciphertext, tag))
+
+
+def unpack_blob(blob: bytes) -> Tuple[int, bytes, bytes, bytes, bytes]:
+    """Split a secret blob into (kind, salt or wrapped key, iv, ciphertext, tag)."""
+    version, kind = BLOB_HEADER.unpack_from(blob)
+    if version != BLOB_FORMAT_VERSION or kind not in BLOB_KEY_MATERIAL_SIZES:
+        raise ValueError(f"Unsupported secret blob (format {version}, kind {kind})")
+    key_end = BLOB_HEADER.size + BLOB_KEY_MATERIAL_SIZES[kind]
+    iv_end = key_end + NONCE_SIZE
+    if len(blob) < iv_end + TAG_SIZE:
+        raise ValueError("Truncated secret blob")
+    return kind, blob[BLOB_HEADER.size:key_end], blob[key_end:iv_end], blob[iv_end:-TAG_SIZE], blob[-TAG_SIZE:]
 
 
 class CryptoEngine:
     def __init__(self, master_key: str):
         self.master_key = master_key.encode()
         self.backend = default_backend()
+        # Key-encryption keys by version. Populated by load_kek(); while empty,
+        # encrypt() falls back to the legacy per-secret PBKDF2 format.
+        self.keks: Dict[int, bytes] = {}
+        self.active_key_version: Optional[int] = None
 
+    @traced()
     def _derive_key(self, salt: bytes) -> bytes:
         """Derive a 32-byte key from the master key using PBKDF2."""
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
             length=32,
             salt=salt,
-            iterations=100000,
+            iterations=KDF_ITERATIONS,
             backend=self.backend
         )
-        return kdf.derive(self.master_key)
+        with _kdf_stage.time():
+            return kdf.derive(self.master_key)
+
+    @staticmethod
+    def kek_check_value(kek: bytes) -> str:
+        """Return a verifier for a KEK so a wrong master key is detected at startup."""
+        digest = hmac.new(kek, KEK_CHECK_LABEL, hashlib.sha256).digest()
+        return base64.b64encode(digest).decode('utf-8')
 
+    def load_kek(self, version: int, salt: bytes, check_value: Optional[str] = None) -> bytes:
+        """Derive the key-encryption key for a key version (one PBKDF2 per process)."""
+        kek = self._derive_key(salt)
+        if check_value is not None and not hmac.compare_digest(self.kek_check_value(kek), check_value):
+            raise ValueError("Master key does not match the vault key-encryption key")
+        self.keks[version] = kek
+        self.active_key_version = version
+        return kek
+
+    @property
+    def envelope_enabled(self) -> bool:
+        return self.active_key_version is not None
+
+    def _aes_gcm_encrypt(self, key: bytes, plaintext: bytes) -> Tuple[bytes, bytes, bytes]:
+        iv = os.urandom(12)  # GCM recommended IV length
+        with _aes_stage.time():
+            encryptor = Cipher(
+                algorithms.AES(key),
+                modes.GCM(iv),
+                backend=self.backend
+            ).encryptor()
+            ciphertext = encryptor.update(plaintext) + encryptor.finalize()
+        return iv, ciphertext, encryptor.tag
+
+    def _aes_gcm_decrypt(self, key: bytes, iv: bytes, ciphertext: bytes, tag: bytes) -> bytes:
+        with _aes_stage.time():
+            decryptor = Cipher(
+                algorithms.AES(key),
+                modes.GCM(iv, tag),
+                backend=self.backend
+            ).decryptor()
+            return decryptor.update(ciphertext) + decryptor.finalize()
+
+    @traced()
     def encrypt(self, plaintext: str) -> dict:
-        """Encrypt plaintext using AES-256-GCM."""
+        """Encrypt plaintext using AES-256-GCM.
+
+        With a KEK loaded, a random per-secret data key encrypts the value and is
+        stored wrapped by the KEK; otherwise the key is derived from a fresh salt.
+        Returns base64 fields, the storage format before secret blobs.
+        """
+        if self.active_key_version is not None:
+            return self.encrypt_envelope(plaintext, self.active_key_version)
+
         salt = os.urandom(16)
         key = self._derive_key(salt)
-        iv = os.urandom(12)  # GCM recommended IV length
+        iv, ciphertext, tag = self._aes_gcm_encrypt(key, plaintext.encode())
 
-        encryptor = Cipher(
-            algorithms.AES(key),
-            modes.GCM(iv),
-            backend=self.backend
-        ).encryptor()
+        return {
+            "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
+            "iv": base64.b64encode(iv).decode('utf-8'),
+            "salt": base64.b64encode(salt).decode('utf-8'),
+            "tag": base64.b64encode(tag).decode('utf-8')
+        }
 
-        ciphertext = encryptor.update(plaintext.encode()) + encryptor.finalize()
+    def encrypt_envelope(self, plaintext: str, key_version: int) -> dict:
+        """Encrypt plaintext under a fresh data key wrapped by the given KEK version."""
+        data_key = os.urandom(32)
+        iv, ciphertext, tag = self._aes_gcm_encrypt(data_key, plaintext.encode())
+        wrapped_key = aes_key_wrap(self.keks[key_version], data_key, backend=self.backend)
 
         return {
             "ciphertext": base64.b64encode(ciphertext).decode('utf-8'),
             "iv": base64.b64encode(iv).decode('utf-8'),
-            "salt": base64.b64encode(salt).decode('utf-8'),
-            "tag": base64.b64encode(encryptor.tag).decode('utf-8')
+            "salt": "",
+            "tag": base64.b64encode(tag).decode('utf-8'),
+            "wrapped_key": base64.b64encode(wrapped_key).decode('utf-8'),
+            "key_version": key_version
         }
 
+    @traced()
+    def encrypt_blob(self, plaintext: str) -> dict:
+        """Encrypt plaintext like encrypt(), packed into a single binary blob (see pack_blob)."""
+        if self.active_key_version is not None:
+            data_key = os.urandom(32)
+            iv, ciphertext, tag = self._aes_gcm_encrypt(data_key, plaintext.encode())
+            wrapped_key = aes_key_wrap(self.keks[self.active_key_version], data_key, backend=self.backend)
+            blob = pack_blob(BLOB_ENVELOPE, wrapped_key, iv, ciphertext, tag)
+            return {"blob": blob, "key_version": self.active_key_version}
+
+        salt = os.urandom(16)
+        iv, ciphertext, tag = self._aes_gcm_encrypt(self._derive_key(salt), plaintext.encode())
+        return {"blob": pack_blob(BLOB_LEGACY, salt, iv, ciphertext, tag), "key_version": None}
+
+    @staticmethod
+    def _parts(encrypted_data: dict) -> Tuple[int, bytes, bytes, bytes, bytes]:
+        """Return (kind, salt or wrapped key, iv, ciphertext, tag) from either storage format."""
+        if encrypted_data.get('blob') is not None:
+            return unpack_blob(encrypted_data['blob'])
+        wrapped_key = encrypted_data.get('wrapped_key')
+        return (
+            BLOB_ENVELOPE if wrapped_key else BLOB_LEGACY,
+            base64.b64decode(wrapped_key or encrypted_data['salt']),
+            base64.b64decode(encrypted_data['iv']),
+            base64.b64decode(encrypted_data['ciphertext']),
+            base64.b64decode(encrypted_data['tag'])
+        )
+
+    @traced()
     def decrypt(self, encrypted_data: dict) -> str:
-        """Decrypt ciphertext using AES-256-GCM."""
-        salt = base64.b64decode(encrypted_data['salt'])
-        iv = base64.b64decode(encrypted_data['iv'])
-        ciphertext = base64.b64decode(encrypted_data['ciphertext'])
-        tag = base64.b64decode(encrypted_data['tag'])
+        """Decrypt ciphertext using AES-256-GCM (envelope or legacy, blob or base64 columns)."""
+        kind, key_material, iv, ciphertext, tag = self._parts(encrypted_data)
+        if kind == BLOB_ENVELOPE:
+            key = aes_key_unwrap(self._kek(encrypted_data.get('key_version')), key_material, backend=self.backend)
+        else:
+            key = self._derive_key(key_material)
 
-        key = self._derive_key(salt)
+        return self._aes_gcm_decrypt(key, iv, ciphertext, tag).decode('utf-8')
 
-        decryptor = Cipher(
-            algorithms.AES(key),
-            modes.GCM(iv, tag),
-            backend=self.backend
-        ).decryptor()
+    def _kek(self, version: Optional[int]) -> bytes:
+        if version not in self.keks:
+            raise ValueError(f"No key-encryption key loaded for version {version}")
+        return self.keks[version]
+
+    def reencrypt(self, encrypted_data: dict, key_version: int) -> dict:
+        """Move an encrypted value under another KEK version, as a blob.
+
+        Envelope values only have their data key re-wrapped; legacy values are
+        decrypted (one PBKDF2) and encrypted afresh as envelope values.
+        """
+        kind, key_material, iv, ciphertext, tag = self._parts(encrypted_data)
+        if kind != BLOB_ENVELOPE:
+            plaintext = self._aes_gcm_decrypt(self._derive_key(key_material), iv, ciphertext, tag)
+            data_key = os.urandom(32)
+            iv, ciphertext, tag = self._aes_gcm_encrypt(data_key, plaintext)
+        else:
+            data_key = aes_key_unwrap(self._kek(encrypted_data.get('key_version')), key_material, backend=self.backend)
+        wrapped_key = aes_key_wrap(self._kek(key_version), data_key, backend=self.backend)
+        return {"blob": pack_blob(BLOB_ENVELOPE, wrapped_key, iv, ciphertext, tag), "key_version": key_version}
+
+    def wrap_kek(self, parent_version: int, kek: bytes) -> str:
+        """Wrap another KEK under a loaded one, linking key versions into a chain."""
+        return base64.b64encode(aes_key_wrap(self._kek(parent_version), kek, backend=self.backend)).decode('utf-8')
 
-        plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-        return plaintext.decode('utf-8')
+    def unwrap_kek(self, parent_version: int, wrapped_kek: str) -> bytes:
+        return aes_key_unwrap(self._kek(parent_version), base64.b64decode(wrapped_kek), backend=self.backend)
@@ -0,0 +1,99 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class ConnectionPool:
+    """A thread-safe pool of SQLite connections opened in WAL mode.
+
+    Connections are reused across requests, so each one keeps its compiled
+    statement cache (``cached_statements``) warm. WAL lets readers proceed while
+    a writer (e.g. a rotation) holds the write lock.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 8,
+        busy_timeout_ms: int = 5000,
+        synchronous: str = "NORMAL",
+        cache_size_kb: int = 8192,
+        statement_cache_size: int = 128,
+        timeout: float = 30.0
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        if synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_MODES)}")
+
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous.upper()
+        self.cache_size_kb = cache_size_kb
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all: List[sqlite3.Connection] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection; blocks while all ``size`` connections are in use."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for a connection to {self.db_path}")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                with self._lock:
+                    live = any(c is conn for c in self._all)
+                if live:
+                    self._idle.put(conn)
+                else:
+                    conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Close idle connections; borrowed ones are closed when returned.
+
+        The pool stays usable and reconnects lazily, which lets callers reset
+        the database file underneath it.
+        """
+        with self._lock:
+            self._all = []
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
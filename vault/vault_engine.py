@@ -1,97 +1,406 @@
+import base64
+import functools
+import hmac
 import json
+import multiprocessing
+import os
 import sqlite3
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from .crypto import CryptoEngine
+from telemetry.metrics import stage
+from telemetry.tracing import traced
+
+from .cache import PlaintextCache, TTLCache
+from .crypto import CryptoEngine, pack_blob
+from .pool import ConnectionPool
+
+# secret_blob holds values written since schema version 2; the base64 columns hold older rows.
+ENCRYPTED_COLUMNS = "secret_blob, ciphertext, iv, salt, tag, wrapped_key, key_version"
+SET_ENCRYPTED = "secret_blob = ?, ciphertext = ?, iv = ?, salt = ?, tag = ?, wrapped_key = ?, key_version = ?"
+INSERT_SECRET_SQL = f'''
+    INSERT OR REPLACE INTO secrets
+    (id, name, type, {ENCRYPTED_COLUMNS}, metadata, role, host, created_at, last_rotated)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+UPDATE_SECRET_VALUE_SQL = f'UPDATE secrets SET {SET_ENCRYPTED}, last_rotated = ? WHERE id = ?'
+# Conditional on the stored value (fresh IVs make every encryption unique), so neither a rekey
+# nor a compaction overwrites a concurrent rotation.
+REWRITE_SECRET_SQL = f'UPDATE secrets SET {SET_ENCRYPTED} WHERE id = ? AND secret_blob IS ? AND iv IS ?'
+# Rows not yet encrypted under the rekey target version (legacy rows have no key version).
+NEEDS_REKEY_SQL = "key_version IS NOT ?"
+KEY_COLUMNS = "version, salt, check_value, parent_version, wrapped_kek"
+BULK_REQUIRED_FIELDS = ("id", "name", "type", "value")
+
+_db_read_stage = stage("db_read")
+_db_write_stage = stage("db_write")
+
+# Per-process engine for rekey worker processes, set up by _init_rekey_worker().
+_rekey_crypto: Optional[CryptoEngine] = None
+
+
+def _init_rekey_worker(old_master: str, keks: Dict[int, bytes]) -> None:
+    global _rekey_crypto
+    _rekey_crypto = CryptoEngine(old_master)
+    _rekey_crypto.keks = dict(keks)
+
+
+def _rekey_row(crypto: CryptoEngine, key_version: int, row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """Re-encrypt an (id, ENCRYPTED_COLUMNS...) row into REWRITE_SECRET_SQL parameters."""
+    encrypted = crypto.reencrypt(VaultEngine._row_to_encrypted(row[1:]), key_version)
+    return (*VaultEngine._encrypted_to_row(encrypted), row[0], row[1], row[3])
+
+
+def _rekey_row_in_worker(key_version: int, row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    assert _rekey_crypto is not None
+    return _rekey_row(_rekey_crypto, key_version, row)
+
+
+def _migrate_v1(c: sqlite3.Cursor) -> None:
+    """The text-column schema; upgrades databases from before schema versioning in place."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS secrets (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            ciphertext TEXT NOT NULL,
+            iv TEXT NOT NULL,
+            salt TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            metadata TEXT,
+            created_at TEXT,
+            last_rotated TEXT,
+            wrapped_key TEXT,
+            key_version INTEGER,
+            role TEXT,
+            host TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS vault_keys (
+            version INTEGER PRIMARY KEY,
+            salt TEXT NOT NULL,
+            check_value TEXT NOT NULL,
+            created_at TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS vault_rekey (
+            key_version INTEGER PRIMARY KEY,
+            last_id TEXT NOT NULL DEFAULT '',
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            started_at TEXT,
+            updated_at TEXT,
+            completed_at TEXT
+        )
+    ''')
+    # During a rekey the new key version's KEK is stored wrapped under the old one, and the
+    # old versions' KEKs wrapped under the new one (parent_version names the wrapping key),
+    # so processes started with either master key can read (and write) every envelope row.
+    key_columns = {row[1] for row in c.execute('PRAGMA table_info(vault_keys)')}
+    if 'parent_version' not in key_columns:
+        c.execute('ALTER TABLE vault_keys ADD COLUMN parent_version INTEGER')
+    if 'wrapped_kek' not in key_columns:
+        c.execute('ALTER TABLE vault_keys ADD COLUMN wrapped_kek TEXT')
+    # Databases created before envelope encryption lack the key columns.
+    columns = {row[1] for row in c.execute('PRAGMA table_info(secrets)')}
+    if 'wrapped_key' not in columns:
+        c.execute('ALTER TABLE secrets ADD COLUMN wrapped_key TEXT')
+    if 'key_version' not in columns:
+        c.execute('ALTER TABLE secrets ADD COLUMN key_version INTEGER')
+    if 'role' not in columns:
+        # Role is copied out of the metadata JSON so the rotation schedule is an index scan.
+        c.execute('ALTER TABLE secrets ADD COLUMN role TEXT')
+        c.execute("UPDATE secrets SET role = json_extract(metadata, '$.role')")
+    if 'host' not in columns:
+        c.execute('ALTER TABLE secrets ADD COLUMN host TEXT')
+        c.execute("UPDATE secrets SET host = json_extract(metadata, '$.host')")
+    _create_secret_indexes(c)
+
+
+def _migrate_v2(c: sqlite3.Cursor) -> None:
+    """Add the secret_blob column and make the base64 columns nullable (a table rebuild).
+
+    Existing rows are copied as they are and stay readable; they move to blobs
+    when rewritten, re-keyed or compacted by VaultEngine.compact_storage().
+    """
+    c.execute('''
+        CREATE TABLE secrets_v2 (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL,
+            secret_blob BLOB,
+            ciphertext TEXT,
+            iv TEXT,
+            salt TEXT,
+            tag TEXT,
+            wrapped_key TEXT,
+            key_version INTEGER,
+            metadata TEXT,
+            role TEXT,
+            host TEXT,
+            created_at TEXT,
+            last_rotated TEXT
+        )
+    ''')
+    copied = "id, name, type, ciphertext, iv, salt, tag, wrapped_key, key_version, metadata, role, host, " \
+        "created_at, last_rotated"
+    c.execute(f'INSERT INTO secrets_v2 ({copied}) SELECT {copied} FROM secrets')
+    c.execute('DROP TABLE secrets')
+    c.execute('ALTER TABLE secrets_v2 RENAME TO secrets')
+    _create_secret_indexes(c)
+
+
+def _create_secret_indexes(c: sqlite3.Cursor) -> None:
+    c.execute('CREATE INDEX IF NOT EXISTS idx_secrets_rotation ON secrets (last_rotated, role, id)')
+    # (filter, id) indexes make a filtered list_secrets page a single index range scan.
+    c.execute('CREATE INDEX IF NOT EXISTS idx_secrets_type ON secrets (type, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_secrets_role ON secrets (role, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_secrets_host ON secrets (host, id)')
+
+
+# Schema migrations in order; PRAGMA user_version records how many have been applied.
+MIGRATIONS: List[Callable[[sqlite3.Cursor], None]] = [_migrate_v1, _migrate_v2]
+SCHEMA_VERSION = len(MIGRATIONS)
 
 
 class VaultEngine:
-    def __init__(self, master_password: str, db_path: str):
+    def __init__(
+        self,
+        master_password: str,
+        db_path: str,
+        envelope_encryption: bool = True,
+        pool: Optional[ConnectionPool] = None,
+        metadata_cache: Optional[TTLCache] = None,
+        plaintext_cache: Optional[PlaintextCache] = None
+    ):
         self.crypto = CryptoEngine(master_password)
         self.db_path = db_path
+        self.envelope_encryption = envelope_encryption
+        self.pool = pool or ConnectionPool(db_path)
+        # Caches get_metadata results. Writes through this engine invalidate
+        # entries; writes from other processes show up once the TTL lapses.
+        self.metadata_cache = metadata_cache
+        # Opt-in cache of decrypted values for get_secret(..., cache_seconds=...). Invalidated
+        # before any write through this engine returns; a hit is checked against the row's
+        # last_rotated, so other processes' writes are seen too.
+        self.plaintext_cache = plaintext_cache
         self._init_db()
 
     @contextmanager
     def _get_conn(self):
-        conn = sqlite3.connect(self.db_path)
-        try:
+        with self.pool.connection() as conn:
             yield conn
-        finally:
-            conn.close()
+
+    def close(self) -> None:
+        """Close pooled database connections."""
+        self.pool.close()
 
     def _init_db(self) -> None:
-        """Initialize the SQLite database."""
+        """Initialize the SQLite database, applying pending schema migrations."""
+        with self._get_conn() as conn:
+            # Concurrent workers start up together: the first one to take the lock migrates.
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version > SCHEMA_VERSION:
+                conn.rollback()
+                raise RuntimeError(f"Vault schema version {version} is newer than this release ({SCHEMA_VERSION})")
+            for target, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+                migrate(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {target}')
+            conn.commit()
+
+        self._load_keys()
+
+    def _load_keys(self) -> None:
+        """Derive the key-encryption keys once at startup, creating the first one on first use.
+
+        Every key version this master key can open is loaded, directly or through
+        a parent version's wrapped_kek, so envelope rows stay readable while a
+        rekey is in progress; the newest one is used for new writes when envelope
+        encryption is enabled. Called again when a row names a version that isn't
+        loaded yet (another process started a rekey); loaded keys are never dropped.
+        """
         with self._get_conn() as conn:
             c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS secrets (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    ciphertext TEXT NOT NULL,
-                    iv TEXT NOT NULL,
-                    salt TEXT NOT NULL,
-                    tag TEXT NOT NULL,
-                    metadata TEXT,
-                    created_at TEXT,
-                    last_rotated TEXT
+            c.execute(f'SELECT {KEY_COLUMNS} FROM vault_keys ORDER BY version')
+            rows = c.fetchall()
+            if not rows and self.envelope_encryption:
+                salt = os.urandom(16)
+                check_value = CryptoEngine.kek_check_value(self.crypto._derive_key(salt))
+                # OR IGNORE: another worker may have created the key concurrently.
+                c.execute(
+                    'INSERT OR IGNORE INTO vault_keys (version, salt, check_value, created_at) VALUES (?, ?, ?, ?)',
+                    (1, base64.b64encode(salt).decode('utf-8'), check_value, datetime.now().isoformat())
                 )
-            ''')
-            conn.commit()
+                conn.commit()
+                c.execute(f'SELECT {KEY_COLUMNS} FROM vault_keys ORDER BY version')
+                rows = c.fetchall()
+
+        # Repeat until no more versions open: a version wrapped under another loads after it.
+        derived = set()
+        while True:
+            loaded = len(self.crypto.keks)
+            for version, salt, check_value, parent_version, wrapped_kek in rows:
+                if version in self.crypto.keks:
+                    continue
+                if wrapped_kek and parent_version in self.crypto.keks:
+                    kek = self.crypto.unwrap_kek(parent_version, wrapped_kek)
+                elif version not in derived:
+                    derived.add(version)
+                    kek = self.crypto._derive_key(base64.b64decode(salt))
+                else:
+                    continue
+                if hmac.compare_digest(CryptoEngine.kek_check_value(kek), check_value):
+                    self.crypto.keks[version] = kek
+            if len(self.crypto.keks) == loaded:
+                break
+
+        if rows and not self.crypto.keks:
+            raise ValueError("Master key does not match the vault key-encryption key")
+        if self.envelope_encryption and self.crypto.keks:
+            self.crypto.active_key_version = max(self.crypto.keks)
+        else:
+            self.crypto.active_key_version = None
 
+    def _ensure_key_loaded(self, encrypted: Dict[str, Any]) -> None:
+        # Only versions newer than any loaded one can have appeared since startup.
+        version = encrypted.get('key_version')
+        if version is not None and version > max(self.crypto.keks, default=0):
+            self._load_keys()
+
+    @staticmethod
+    def _row_to_encrypted(row: Tuple[Any, ...]) -> Dict[str, Any]:
+        """Map the encrypted columns (see ENCRYPTED_COLUMNS) to CryptoEngine's dict format."""
+        if row[0] is not None:
+            return {'blob': row[0], 'key_version': row[6]}
+        return {
+            'ciphertext': row[1],
+            'iv': row[2],
+            'salt': row[3],
+            'tag': row[4],
+            'wrapped_key': row[5],
+            'key_version': row[6]
+        }
+
+    @staticmethod
+    def _encrypted_to_row(encrypted: Dict[str, Any]) -> Tuple[Any, ...]:
+        if 'blob' in encrypted:
+            return (encrypted['blob'], None, None, None, None, None, encrypted['key_version'])
+        return (
+            None, encrypted['ciphertext'], encrypted['iv'], encrypted['salt'], encrypted['tag'],
+            encrypted.get('wrapped_key'), encrypted.get('key_version')
+        )
+
+    @traced()
     def store_secret(
-        self, 
-        secret_id: str, 
-        name: str, 
-        secret_type: str, 
-        value: str, 
+        self,
+        secret_id: str,
+        name: str,
+        secret_type: str,
+        value: str,
         metadata: Optional[Dict[str, Any]] = None
     ) -> None:
         """Encrypt and store a secret."""
-        encrypted = self.crypto.encrypt(value)
-        
+        self._write_secret(secret_id, name, secret_type, self.crypto.encrypt_blob(value), metadata)
+
+    @traced()
+    def _write_secret(
+        self,
+        secret_id: str,
+        name: str,
+        secret_type: str,
+        encrypted: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Store an already-encrypted secret (the database half of store_secret)."""
         meta_json = json.dumps(metadata or {})
+        role = (metadata or {}).get('role')
+        host = (metadata or {}).get('host')
         now = datetime.now().isoformat()
 
-        with self._get_conn() as conn:
+        with _db_write_stage.time(), self._get_conn() as conn:
             c = conn.cursor()
-            c.execute('''
-                INSERT OR REPLACE INTO secrets 
-                (id, name, type, ciphertext, iv, salt, tag, metadata, created_at, last_rotated)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            c.execute(INSERT_SECRET_SQL, (
                 secret_id, name, secret_type,
-                encrypted['ciphertext'], encrypted['iv'], encrypted['salt'], encrypted['tag'],
-                meta_json, now, now
+                *self._encrypted_to_row(encrypted),
+                meta_json, role, host, now, now
             ))
             conn.commit()
+        self._invalidate_cached([secret_id])
+
+    @traced()
+    def get_secret(self, secret_id: str, cache_seconds: Optional[float] = None) -> Optional[str]:
+        """Retrieve and decrypt a secret.
 
-    def get_secret(self, secret_id: str) -> Optional[str]:
-        """Retrieve and decrypt a secret."""
+        With a plaintext cache and ``cache_seconds`` > 0 (e.g. the time left on
+        the caller's lease), the decrypted value may be served from, and kept in,
+        the cache for at most that long. A hit costs a lookup of the row's
+        last_rotated instead of reading and decrypting the value.
+        """
+        cache = self.plaintext_cache if cache_seconds and cache_seconds > 0 else None
+        if cache is not None:
+            generation = cache.generation()
+            stamp = self._read_stamp(secret_id)
+            cached = cache.get_text(secret_id, stamp)
+            if cached is not None:
+                return cached
+
+        encrypted = self._read_encrypted(secret_id)
+        if encrypted is None:
+            return None
+
+        value = self.crypto.decrypt(encrypted)
+        if cache is not None:
+            cache.put_text(secret_id, value, stamp, generation, ttl_seconds=cache_seconds)
+        return value
+
+    def _read_stamp(self, secret_id: str) -> Optional[str]:
+        """A secret's last_rotated, which every value write changes (the plaintext cache's version check)."""
         with self._get_conn() as conn:
+            row = conn.execute('SELECT last_rotated FROM secrets WHERE id = ?', (secret_id,)).fetchone()
+        return row[0] if row else None
+
+    @traced()
+    def _read_encrypted(self, secret_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a secret's encrypted form (the database half of get_secret)."""
+        with _db_read_stage.time(), self._get_conn() as conn:
             c = conn.cursor()
-            c.execute('SELECT ciphertext, iv, salt, tag FROM secrets WHERE id = ?', (secret_id,))
+            c.execute(f'SELECT {ENCRYPTED_COLUMNS} FROM secrets WHERE id = ?', (secret_id,))
             row = c.fetchone()
-
         if not row:
             return None
+        encrypted = self._row_to_encrypted(row)
+        self._ensure_key_loaded(encrypted)
+        return encrypted
 
-        encrypted_data = {
-            'ciphertext': row[0],
-            'iv': row[1],
-            'salt': row[2],
-            'tag': row[3]
-        }
-        return self.crypto.decrypt(encrypted_data)
+    def _invalidate_cached(self, secret_ids: Iterable[str]) -> None:
+        ids = [*secret_ids]
+        for cache in (self.metadata_cache, self.plaintext_cache):
+            if cache is not None:
+                cache.invalidate_many(ids)
 
+    @traced()
     def get_metadata(self, secret_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve metadata for a secret."""
-        with self._get_conn() as conn:
+        """Retrieve metadata for a secret.
+
+        With a metadata cache, repeat lookups skip the database; the returned
+        dict is shared with the cache and must not be modified.
+        """
+        if self.metadata_cache is not None:
+            cached = self.metadata_cache.get(secret_id)
+            if cached is not None:
+                return cached
+            generation = self.metadata_cache.generation()
+
+        with _db_read_stage.time(), self._get_conn() as conn:
             c = conn.cursor()
             c.execute(
-                'SELECT id, name, type, metadata, created_at, last_rotated FROM secrets WHERE id = ?', 
+                'SELECT id, name, type, metadata, created_at, last_rotated FROM secrets WHERE id = ?',
                 (secret_id,)
             )
             row = c.fetchone()
@@ -99,7 +408,7 @@ class VaultEngine:
         if not row:
             return None
 
-        return {
+        meta = {
             "id": row[0],
             "name": row[1],
             "type": row[2],
@@ -107,32 +416,475 @@ class VaultEngine:
             "created_at": row[4],
             "last_rotated": row[5]
         }
+        if self.metadata_cache is not None:
+            self.metadata_cache.put_if_current(secret_id, meta, generation)
+        return meta
+
+    def get_metadata_bulk(self, secret_ids: Iterable[str], chunk_size: int = 500) -> Dict[str, Dict[str, Any]]:
+        """Retrieve metadata for many secrets. Unknown ids are omitted."""
+        found: Dict[str, Dict[str, Any]] = {}
+        iterator = iter(secret_ids)
+        while True:
+            chunk = [*islice(iterator, chunk_size)]
+            if not chunk:
+                return found
+
+            placeholders = ", ".join("?" for _ in chunk)
+            with _db_read_stage.time(), self._get_conn() as conn:
+                rows = conn.execute(
+                    'SELECT id, name, type, metadata, created_at, last_rotated '
+                    f'FROM secrets WHERE id IN ({placeholders})',
+                    chunk
+                ).fetchall()
+
+            for row in rows:
+                found[row[0]] = {
+                    "id": row[0],
+                    "name": row[1],
+                    "type": row[2],
+                    "metadata": json.loads(row[3]),
+                    "created_at": row[4],
+                    "last_rotated": row[5]
+                }
+
+    def rotation_schedule(self, rotated_before: Optional[str] = None) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """Return (id, role, last_rotated) for every secret, oldest rotation first.
+
+        With ``rotated_before`` (an ISO timestamp), only secrets never rotated or
+        last rotated before then. Served entirely from the idx_secrets_rotation
+        covering index.
+        """
+        sql = 'SELECT id, role, last_rotated FROM secrets'
+        params: List[Any] = []
+        if rotated_before is not None:
+            sql += ' WHERE last_rotated IS NULL OR last_rotated < ?'
+            params.append(rotated_before)
+        with _db_read_stage.time(), self._get_conn() as conn:
+            return conn.execute(f'{sql} ORDER BY last_rotated', params).fetchall()
+
+    @traced()
+    def list_secrets(
+        self,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        secret_type: Optional[str] = None,
+        role: Optional[str] = None,
+        host: Optional[str] = None,
+        rotated_after: Optional[str] = None,
+        rotated_before: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """List secrets (metadata only) in id order.
+
+        Pass the last id of a page as ``after`` to get the next one. Type, role
+        and host filters use (column, id) indexes, so a page costs O(limit);
+        the ``last_rotated`` range (ISO timestamps, inclusive / exclusive) is
+        checked on the rows that index scan visits.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        equality = {"type": secret_type, "role": role, "host": host}
+        for column, value in equality.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if rotated_after is not None:
+            clauses.append("last_rotated >= ?")
+            params.append(rotated_after)
+        if rotated_before is not None:
+            clauses.append("last_rotated < ?")
+            params.append(rotated_before)
+        if after is not None:
+            clauses.append("id > ?")
+            params.append(after)
+
+        sql = 'SELECT id, name, type, last_rotated, role, host FROM secrets'
+        if clauses:
+            sql += f" WHERE {' AND '.join(clauses)}"
+        sql += ' ORDER BY id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with _db_read_stage.time(), self._get_conn() as conn:
+            rows = conn.execute(sql, params).fetchall()
 
-    def list_secrets(self) -> List[Dict[str, Any]]:
-        """List all secrets (metadata only)."""
-        with self._get_conn() as conn:
-            c = conn.cursor()
-            c.execute('SELECT id, name, type, last_rotated FROM secrets')
-            rows = c.fetchall()
-        
         return [
-            {"id": r[0], "name": r[1], "type": r[2], "last_rotated": r[3]}
+            {"id": r[0], "name": r[1], "type": r[2], "last_rotated": r[3], "role": r[4], "host": r[5]}
             for r in rows
         ]
 
+    def iter_secrets(self, batch_size: int = 1000, **filters: Any) -> Iterator[Dict[str, Any]]:
+        """Yield every matching secret's metadata in id order, ``batch_size`` rows per query.
+
+        Takes list_secrets filters. Each batch is a short keyset query, so a
+        slow consumer never holds a pooled connection or a read transaction.
+        """
+        after = None
+        while True:
+            page = self.list_secrets(after=after, limit=batch_size, **filters)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = page[-1]["id"]
+
+    @traced()
     def update_secret_value(self, secret_id: str, new_value: str) -> None:
         """Update the value of an existing secret (rotation)."""
-        encrypted = self.crypto.encrypt(new_value)
+        encrypted = self.crypto.encrypt_blob(new_value)
         now = datetime.now().isoformat()
-        
-        with self._get_conn() as conn:
+
+        with _db_write_stage.time(), self._get_conn() as conn:
             c = conn.cursor()
-            c.execute('''
-                UPDATE secrets 
-                SET ciphertext = ?, iv = ?, salt = ?, tag = ?, last_rotated = ?
-                WHERE id = ?
-            ''', (
-                encrypted['ciphertext'], encrypted['iv'], encrypted['salt'], encrypted['tag'],
+            c.execute(UPDATE_SECRET_VALUE_SQL, (
+                *self._encrypted_to_row(encrypted),
                 now, secret_id
             ))
             conn.commit()
+        self._invalidate_cached([secret_id])
+
+    @traced()
+    def update_secret_values_bulk(self, values: Dict[str, str]) -> None:
+        """Update the values of many existing secrets in a single transaction (batch rotation)."""
+        now = datetime.now().isoformat()
+        rows = [
+            (*self._encrypted_to_row(self.crypto.encrypt_blob(value)), now, secret_id)
+            for secret_id, value in values.items()
+        ]
+        with _db_write_stage.time(), self._get_conn() as conn:
+            conn.executemany(UPDATE_SECRET_VALUE_SQL, rows)
+            conn.commit()
+        self._invalidate_cached(values)
+
+    def _encrypt_bulk_item(self, item: Dict[str, Any], now: str) -> Tuple[Any, ...]:
+        missing = [field for field in BULK_REQUIRED_FIELDS if not item.get(field)]
+        if missing:
+            raise ValueError(f"Missing required field(s): {', '.join(missing)}")
+        encrypted = self.crypto.encrypt_blob(str(item["value"]))
+        metadata = item.get("metadata") or {}
+        return (
+            str(item["id"]), str(item["name"]), str(item["type"]),
+            *self._encrypted_to_row(encrypted),
+            json.dumps(metadata), metadata.get("role"), metadata.get("host"), now, now
+        )
+
+    @traced()
+    def store_secrets_bulk(
+        self,
+        secrets: Iterable[Dict[str, Any]],
+        chunk_size: int = 500,
+        max_workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Encrypt and store many secrets, one transaction per chunk.
+
+        ``secrets`` is consumed lazily, so it may be a streaming iterator. Items
+        are dicts with id, name, type, value and optional metadata. Returns one
+        result per item, in order; a failing item is reported with its error and
+        does not abort the rest of the batch.
+        """
+        results: List[Dict[str, Any]] = []
+        iterator = iter(secrets)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                chunk = [*islice(iterator, chunk_size)]
+                if not chunk:
+                    return results
+
+                now = datetime.now().isoformat()
+                futures = [executor.submit(self._encrypt_bulk_item, item, now) for item in chunk]
+                chunk_results: List[Dict[str, Any]] = []
+                rows: List[Tuple[Any, ...]] = []
+                for item, future in zip(chunk, futures):
+                    try:
+                        rows.append(future.result())
+                        chunk_results.append({"id": item.get("id"), "status": "created"})
+                    except Exception as e:
+                        chunk_results.append({"id": item.get("id"), "status": "error", "error": str(e)})
+
+                self._write_bulk_rows(rows, chunk_results)
+                self._invalidate_cached(row[0] for row in rows)
+                results.extend(chunk_results)
+
+    def _write_bulk_rows(self, rows: List[Tuple[Any, ...]], chunk_results: List[Dict[str, Any]]) -> None:
+        """Insert a chunk with executemany; on failure fall back to per-row inserts to isolate bad rows."""
+        if not rows:
+            return
+        with _db_write_stage.time(), self._get_conn() as conn:
+            try:
+                conn.executemany(INSERT_SECRET_SQL, rows)
+                conn.commit()
+                return
+            except sqlite3.Error:
+                conn.rollback()
+
+            failed: Dict[str, str] = {}
+            for row in rows:
+                try:
+                    conn.execute(INSERT_SECRET_SQL, row)
+                except sqlite3.Error as e:
+                    failed[row[0]] = str(e)
+            conn.commit()
+
+        for result in chunk_results:
+            if result["status"] == "created" and result["id"] in failed:
+                result.update(status="error", error=failed[result["id"]])
+
+    @traced()
+    def get_secrets_bulk(
+        self,
+        secret_ids: Iterable[str],
+        chunk_size: int = 500,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Optional[str]]:
+        """Retrieve and decrypt many secrets. Unknown ids map to None."""
+        values: Dict[str, Optional[str]] = {}
+        iterator = iter(secret_ids)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                chunk = [*islice(iterator, chunk_size)]
+                if not chunk:
+                    return values
+
+                placeholders = ", ".join("?" for _ in chunk)
+                with _db_read_stage.time(), self._get_conn() as conn:
+                    rows = conn.execute(
+                        f'SELECT id, {ENCRYPTED_COLUMNS} FROM secrets WHERE id IN ({placeholders})', chunk
+                    ).fetchall()
+
+                values.update(dict.fromkeys(chunk))
+                for row in rows:
+                    self._ensure_key_loaded(self._row_to_encrypted(row[1:]))
+                decrypted = executor.map(lambda row: self.crypto.decrypt(self._row_to_encrypted(row[1:])), rows)
+                for row, value in zip(rows, decrypted):
+                    values[row[0]] = value
+
+    def migrate_to_envelope(self, batch_size: int = 100) -> int:
+        """Re-encrypt legacy per-salt rows under the KEK. Returns the number of rows migrated.
+
+        Rows are processed in batches and committed per batch, so an interrupted
+        migration can simply be re-run; last_rotated is left untouched.
+        """
+        if not self.crypto.envelope_enabled:
+            raise RuntimeError("Envelope encryption is disabled for this vault")
+
+        migrated = 0
+        while True:
+            with self._get_conn() as conn:
+                c = conn.cursor()
+                c.execute(
+                    f'SELECT id, {ENCRYPTED_COLUMNS} FROM secrets WHERE key_version IS NULL LIMIT ?',
+                    (batch_size,)
+                )
+                rows = c.fetchall()
+                if not rows:
+                    return migrated
+
+                updates = []
+                for row in rows:
+                    value = self.crypto.decrypt(self._row_to_encrypted(row[1:]))
+                    encrypted = self.crypto.encrypt_blob(value)
+                    updates.append((*self._encrypted_to_row(encrypted), row[0]))
+
+                c.executemany(f'UPDATE secrets SET {SET_ENCRYPTED} WHERE id = ?', updates)
+                conn.commit()
+                migrated += len(updates)
+
+    def compact_storage(self, batch_size: int = 1000) -> int:
+        """Repack rows still stored in base64 columns into secret blobs. Returns the number converted.
+
+        The key material, nonce and ciphertext are reused as they are, so no key
+        is needed and nothing is decrypted. Committed per batch; safe to re-run.
+        """
+        converted = 0
+        while True:
+            with self._get_conn() as conn:
+                rows = conn.execute(
+                    f'SELECT id, {ENCRYPTED_COLUMNS} FROM secrets WHERE secret_blob IS NULL LIMIT ?', (batch_size,)
+                ).fetchall()
+                if not rows:
+                    return converted
+
+                updates = []
+                for row in rows:
+                    encrypted = self._row_to_encrypted(row[1:])
+                    packed = {"blob": pack_blob(*CryptoEngine._parts(encrypted)), "key_version": row[7]}
+                    updates.append((*self._encrypted_to_row(packed), row[0], None, row[3]))
+                converted += conn.executemany(REWRITE_SECRET_SQL, updates).rowcount
+                conn.commit()
+
+    def rekey(
+        self,
+        old_master: str,
+        new_master: str,
+        chunk_size: int = 500,
+        workers: Optional[int] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """Move every secret from ``old_master`` to a new key version derived from ``new_master``.
+
+        Rows are streamed in id order, re-encrypted on ``workers`` spawned
+        processes (0 re-encrypts in this process) and committed per chunk
+        together with a checkpoint in vault_rekey, so an interrupted run resumes
+        from the last committed chunk when called again with the same keys.
+        Envelope rows only have their data key re-wrapped; legacy rows are
+        decrypted and re-encrypted. Each row records its key version, and until
+        the run completes the new KEK is wrapped under the old ones and the old
+        KEKs under the new one, so processes using either master key can read
+        every envelope row throughout, even while a run is interrupted. Legacy
+        rows open only with ``old_master`` until they are rekeyed. On completion
+        the wrapped keys and the old key versions are removed: restart every
+        process with ``new_master``. ``progress`` is called after each chunk with the counts,
+        throughput and ETA. Returns the same figures for the whole run.
+        """
+        if old_master == new_master:
+            raise ValueError("The new master key must differ from the old one")
+        old_crypto = CryptoEngine(old_master)
+        key_version, new_kek, checkpoint = self._begin_rekey(old_crypto, CryptoEngine(new_master))
+        old_crypto.keks[key_version] = new_kek
+        self._load_keys()
+
+        after, done = checkpoint['last_id'], checkpoint['rows_done']
+        with self._get_conn() as conn:
+            remaining = conn.execute(
+                f'SELECT COUNT(*) FROM secrets WHERE id > ? AND {NEEDS_REKEY_SQL}', (after, key_version)
+            ).fetchone()[0]
+
+        executor: Optional[Executor] = None
+        if workers != 0:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_rekey_worker,
+                initargs=(old_master, dict(old_crypto.keks))
+            )
+        started = time.perf_counter()
+        rekeyed = 0
+        try:
+            while True:
+                with self._get_conn() as conn:
+                    rows = conn.execute(
+                        f'SELECT id, {ENCRYPTED_COLUMNS} FROM secrets WHERE id > ? AND {NEEDS_REKEY_SQL} '
+                        'ORDER BY id LIMIT ?', (after, key_version, chunk_size)
+                    ).fetchall()
+                if not rows:
+                    if self._finish_rekey(key_version):
+                        break
+                    # Rows written under an older key behind the cursor: sweep again from the start.
+                    after = ''
+                    continue
+
+                if executor is None:
+                    updates = [_rekey_row(old_crypto, key_version, row) for row in rows]
+                else:
+                    job = functools.partial(_rekey_row_in_worker, key_version)
+                    updates = [*executor.map(job, rows, chunksize=max(1, len(rows) // 16))]
+
+                after = rows[-1][0]
+                with self._get_conn() as conn:
+                    changed = conn.executemany(REWRITE_SECRET_SQL, updates).rowcount
+                    conn.execute(
+                        'UPDATE vault_rekey SET last_id = ?, rows_done = rows_done + ?, updated_at = ? '
+                        'WHERE key_version = ?', (after, changed, datetime.now().isoformat(), key_version)
+                    )
+                    conn.commit()
+                rekeyed += changed
+                done += changed
+                remaining = max(0, remaining - len(rows))
+                if progress is not None:
+                    progress(self._rekey_stats(key_version, done, rekeyed, remaining, started))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        stats = self._rekey_stats(key_version, done, rekeyed, 0, started)
+        stats["resumed"] = checkpoint['resumed']
+        return stats
+
+    @staticmethod
+    def _rekey_stats(key_version: int, done: int, rekeyed: int, remaining: int, started: float) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        rate = rekeyed / elapsed if elapsed > 0 else 0.0
+        return {
+            "key_version": key_version,
+            "rows_done": done,
+            "rows_remaining": remaining,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(rate, 1),
+            "eta_seconds": round(remaining / rate, 1) if rate else None
+        }
+
+    def _begin_rekey(self, old_crypto: CryptoEngine, new_crypto: CryptoEngine) -> Tuple[int, bytes, Dict[str, Any]]:
+        """Verify both master keys and return the target key version, its KEK and the checkpoint.
+
+        Resumes an unfinished rekey, or creates the next key version (wrapped
+        under the current one) and its checkpoint row. Either way the older
+        versions are stored wrapped under the new KEK. Loads every existing
+        version into ``old_crypto``.
+        """
+        with self._get_conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            keys = conn.execute(f'SELECT {KEY_COLUMNS} FROM vault_keys ORDER BY version').fetchall()
+            pending = conn.execute(
+                'SELECT key_version, last_id, rows_done FROM vault_rekey WHERE completed_at IS NULL'
+            ).fetchone()
+            target = pending[0] if pending else None
+
+            for version, salt, check_value, _, _ in keys:
+                if version == target:
+                    continue
+                kek = old_crypto._derive_key(base64.b64decode(salt))
+                if not hmac.compare_digest(CryptoEngine.kek_check_value(kek), check_value):
+                    raise ValueError(f"Old master key does not match key version {version}")
+                old_crypto.keks[version] = kek
+
+            if pending:
+                salt, check_value = next((k[1], k[2]) for k in keys if k[0] == target)
+                new_kek = new_crypto._derive_key(base64.b64decode(salt))
+                if not hmac.compare_digest(CryptoEngine.kek_check_value(new_kek), check_value):
+                    conn.rollback()
+                    raise ValueError(f"A rekey to key version {target} is in progress with a different new master key")
+                checkpoint = {"last_id": pending[1], "rows_done": pending[2], "resumed": True}
+            else:
+                parent = keys[-1][0] if keys else None
+                target = (parent or 0) + 1
+                salt_bytes = os.urandom(16)
+                new_kek = new_crypto._derive_key(salt_bytes)
+                now = datetime.now().isoformat()
+                conn.execute(
+                    f'INSERT INTO vault_keys ({KEY_COLUMNS}, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (
+                        target, base64.b64encode(salt_bytes).decode('utf-8'), CryptoEngine.kek_check_value(new_kek),
+                        parent, old_crypto.wrap_kek(parent, new_kek) if parent else None, now
+                    )
+                )
+                conn.execute(
+                    'INSERT INTO vault_rekey (key_version, started_at, updated_at) VALUES (?, ?, ?)', (target, now, now)
+                )
+                checkpoint = {"last_id": '', "rows_done": 0, "resumed": False}
+
+            # Let processes started with the new master key open rows still under the old versions.
+            new_crypto.keks[target] = new_kek
+            conn.executemany(
+                'UPDATE vault_keys SET parent_version = ?, wrapped_kek = ? WHERE version = ?',
+                [(target, new_crypto.wrap_kek(target, old_crypto.keks[k[0]]), k[0]) for k in keys if k[0] != target]
+            )
+            conn.commit()
+        return target, new_kek, checkpoint
+
+    def _finish_rekey(self, key_version: int) -> bool:
+        """Complete the rekey unless rows still need it. Drops the key chain and old versions."""
+        with self._get_conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            left = conn.execute(
+                f'SELECT COUNT(*) FROM secrets WHERE {NEEDS_REKEY_SQL}', (key_version,)
+            ).fetchone()[0]
+            if left:
+                conn.rollback()
+                return False
+            conn.execute(
+                'UPDATE vault_rekey SET completed_at = ?, updated_at = ? WHERE key_version = ?',
+                (datetime.now().isoformat(), datetime.now().isoformat(), key_version)
+            )
+            conn.execute('UPDATE vault_keys SET wrapped_kek = NULL WHERE version = ?', (key_version,))
+            conn.execute('DELETE FROM vault_keys WHERE version < ?', (key_version,))
+            conn.commit()
+        return True
@@ -1,60 +1,82 @@
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime
+from typing import List, Optional
+
+from telemetry.tracing import traced
+
+from .stores import InMemoryRequestStore, RequestStore
 
 
 class AccessWorkflow:
-    def __init__(self):
-        # In-memory store for requests (use DB in prod)
-        self.requests = {} 
+    def __init__(self, store: Optional[RequestStore] = None, pending_ttl_minutes: float = 24 * 60):
+        # In-memory by default; use SQLiteRequestStore to share requests between workers
+        self.store = store or InMemoryRequestStore()
+        # Requests left unapproved this long lapse to EXPIRED.
+        self.pending_ttl_minutes = pending_ttl_minutes
 
+    @traced()
     def create_request(self, user: str, secret_id: str, reason: str) -> str:
         req_id = str(uuid.uuid4())[:8]
-        self.requests[req_id] = {
+        now = time.time()
+        self.store.add({
             "id": req_id,
             "user": user,
             "secret_id": secret_id,
             "reason": reason,
             "status": "PENDING",
-            "created_at": datetime.now().isoformat(),
-            "expires_at": None
-        }
+            "created_at": datetime.fromtimestamp(now).isoformat(),
+            "expires_at": None,
+            "expires_at_ts": now + self.pending_ttl_minutes * 60
+        })
         return req_id
 
-    def approve_request(self, req_id: str, approver: str, ttl_minutes: int) -> Optional[dict]:
-        if req_id not in self.requests:
-            return None
-        
-        req = self.requests[req_id]
-        if req['status'] != 'PENDING':
-            return req
-
-        req['status'] = 'APPROVED'
-        req['approver'] = approver
-        req['approved_at'] = datetime.now().isoformat()
-        req['expires_at'] = (datetime.now() + timedelta(minutes=ttl_minutes)).isoformat()
-        
-        return req
+    @traced()
+    def approve_request(self, req_id: str, approver: str, ttl_minutes: float) -> Optional[dict]:
+        now = time.time()
+        expires_at_ts = now + ttl_minutes * 60
+        approved = self.store.transition(req_id, "PENDING", {
+            "status": "APPROVED",
+            "approver": approver,
+            "approved_at": datetime.fromtimestamp(now).isoformat(),
+            "expires_at": datetime.fromtimestamp(expires_at_ts).isoformat(),
+            "expires_at_ts": expires_at_ts
+        }, live_at=now)
+        # Unknown requests return None; decided or lapsed ones are returned unchanged.
+        return approved or self.store.get(req_id)
 
+    @traced()
     def get_request(self, req_id: str):
-        return self.requests.get(req_id)
+        return self.store.get(req_id)
+
+    def list_requests(self, user: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
+        return self.store.list_requests(user, status)
+
+    def count_live(self, status: str) -> int:
+        """Count unlapsed requests in a status: "PENDING" for open requests, "APPROVED" for active leases."""
+        return self.store.count_live(status, time.time())
 
+    @traced()
     def is_access_valid(self, req_id: str, user: str) -> bool:
-        req = self.requests.get(req_id)
+        req = self.store.get(req_id)
         if not req:
             return False
-        
+
         if req['user'] != user:
             return False
-            
+
         if req['status'] != 'APPROVED':
             return False
 
-        if not req['expires_at']:
+        if req['expires_at_ts'] is None:
             return False
 
-        expires = datetime.fromisoformat(req['expires_at'])
-        if datetime.now() > expires:
+        # Epoch comparison; the reaper may not have retired the lease yet.
+        if time.time() > req['expires_at_ts']:
             return False
 
         return True
+
+    def expire_due(self, now: Optional[float] = None) -> List[dict]:
+        """Retire pending requests and leases whose deadline has passed. Returns them."""
+        return self.store.expire_due(time.time() if now is None else now)
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from audit.audit_log import AuditLogger
+
+from .access_requests import AccessWorkflow
+
+logger = logging.getLogger(__name__)
+
+class LeaseReaper:
+    """Expires lapsed access requests and purges old expired ones.
+
+    Sleeps until the store's earliest deadline (or at most ``interval_seconds``,
+    which bounds how late leases created by other workers are noticed), moves
+    lapsed pending requests and leases to EXPIRED with a REQUEST_EXPIRED audit
+    event, and deletes requests that expired more than ``retention_seconds`` ago.
+    Credential checks compare deadlines themselves, so access never outlives
+    a lease while the reaper sleeps. Several workers may each run a reaper:
+    the store expires every request exactly once.
+    """
+
+    def __init__(
+        self,
+        workflow: AccessWorkflow,
+        auditor: AuditLogger,
+        interval_seconds: float = 60,
+        retention_seconds: float = 86400
+    ):
+        self.workflow = workflow
+        self.auditor = auditor
+        self.interval_seconds = interval_seconds
+        self.retention_seconds = retention_seconds
+
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Expire lapsed requests and purge old ones. Returns the expired requests and the purge count."""
+        now = time.time() if now is None else now
+        expired = self.workflow.expire_due(now)
+        if expired:
+            events: List[Dict[str, Any]] = [{
+                "action": "REQUEST_EXPIRED",
+                "user": "system",
+                "secret_id": req["secret_id"],
+                "details": {
+                    "req_id": req["id"],
+                    "requester": req["user"],
+                    "previous_status": "APPROVED" if req.get("approved_at") else "PENDING"
+                }
+            } for req in expired]
+            self.auditor.log_events(events)
+            logger.info(f"⌛ Expired {len(expired)} access requests.")
+        purged = self.workflow.store.purge(now - self.retention_seconds)
+        return {"expired": expired, "purged": purged}
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            timeout = self.interval_seconds
+            try:
+                self.run_once()
+                next_expiry = self.workflow.store.next_expiry()
+                if next_expiry is not None:
+                    timeout = min(timeout, next_expiry - time.time())
+            except Exception as e:
+                # Wait a full interval: the overdue deadline would otherwise retry immediately.
+                logger.error(f"❌ Lease reaping failed, retrying in {self.interval_seconds}s: {e}")
+                timeout = self.interval_seconds
+            self._wakeup.wait(max(0.0, timeout))
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="lease-reaper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
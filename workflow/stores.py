@@ -0,0 +1,289 @@
+import heapq
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from vault.pool import ConnectionPool
+
+REQUEST_COLUMNS = (
+    "id", "user", "secret_id", "reason", "status", "created_at", "approver", "approved_at", "expires_at",
+    "expires_at_ts"
+)
+# Statuses whose requests still hold (or may yet get) access; each has an expires_at_ts deadline.
+LIVE_STATUSES = ("PENDING", "APPROVED")
+
+
+class RequestStore(ABC):
+    """Storage backend for access requests.
+
+    ``transition`` is the only way a stored request changes: it applies the
+    changes only if the request is still in the expected status, so two
+    workers approving the same request can't both win.
+
+    ``expires_at_ts`` is the epoch time at which a live request (a pending
+    request or an approved lease) lapses; ``expire_due`` retires lapsed
+    requests to EXPIRED and ``purge`` later drops them.
+    """
+
+    @abstractmethod
+    def add(self, req: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, req_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def transition(
+        self, req_id: str, from_status: str, changes: Dict[str, Any], live_at: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Apply ``changes`` if the request is in ``from_status`` (and, with ``live_at``, hasn't lapsed by then).
+
+        Returns the updated request, or None.
+        """
+
+    @abstractmethod
+    def expire_due(self, now: float) -> List[Dict[str, Any]]:
+        """Move live requests whose deadline has passed to EXPIRED and return them."""
+
+    @abstractmethod
+    def next_expiry(self) -> Optional[float]:
+        """Earliest deadline among live requests."""
+
+    @abstractmethod
+    def purge(self, before: float) -> int:
+        """Delete EXPIRED requests whose deadline is older than ``before``. Returns how many went."""
+
+    @abstractmethod
+    def list_requests(self, user: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def count_live(self, status: str, now: float) -> int:
+        """Count requests in ``status`` whose deadline is still ahead of ``now``."""
+
+    def close(self) -> None:  # noqa: B027 (optional; not every store holds resources)
+        """Release the store's resources."""
+
+
+class InMemoryRequestStore(RequestStore):
+    """Process-local store; requests are lost on restart and not shared between workers.
+
+    Deadlines sit in a min-heap, so expire_due pops only lapsed requests.
+    Superseded heap entries (e.g. a pending deadline replaced on approval)
+    are skipped when popped. Expired requests are queued in expiry order
+    until purged, keeping memory proportional to live and recently expired
+    requests.
+    """
+
+    def __init__(self) -> None:
+        self._requests: Dict[str, Dict[str, Any]] = {}
+        self._deadlines: List[Tuple[float, str]] = []
+        self._expired: Deque[Tuple[float, str]] = deque()
+        self._lock = threading.Lock()
+
+    def _track(self, req: Dict[str, Any]) -> None:
+        if req["status"] in LIVE_STATUSES and req.get("expires_at_ts") is not None:
+            heapq.heappush(self._deadlines, (req["expires_at_ts"], req["id"]))
+
+    def add(self, req: Dict[str, Any]) -> None:
+        with self._lock:
+            self._requests[req["id"]] = dict(req)
+            self._track(req)
+
+    def get(self, req_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            req = self._requests.get(req_id)
+            return dict(req) if req else None
+
+    def transition(
+        self, req_id: str, from_status: str, changes: Dict[str, Any], live_at: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            req = self._requests.get(req_id)
+            if not req or req["status"] != from_status:
+                return None
+            if live_at is not None and req.get("expires_at_ts") is not None and req["expires_at_ts"] <= live_at:
+                return None
+            req.update(changes)
+            if "expires_at_ts" in changes:
+                self._track(req)
+            return dict(req)
+
+    def expire_due(self, now: float) -> List[Dict[str, Any]]:
+        expired: List[Dict[str, Any]] = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, req_id = heapq.heappop(self._deadlines)
+                req = self._requests.get(req_id)
+                if not req or req["status"] not in LIVE_STATUSES or req.get("expires_at_ts") != deadline:
+                    continue  # superseded entry
+                req["status"] = "EXPIRED"
+                self._expired.append((deadline, req_id))
+                expired.append(dict(req))
+        return expired
+
+    def next_expiry(self) -> Optional[float]:
+        with self._lock:
+            return self._deadlines[0][0] if self._deadlines else None
+
+    def purge(self, before: float) -> int:
+        purged = 0
+        with self._lock:
+            while self._expired and self._expired[0][0] < before:
+                _, req_id = self._expired.popleft()
+                if self._requests.get(req_id, {}).get("status") == "EXPIRED":
+                    del self._requests[req_id]
+                    purged += 1
+        return purged
+
+    def count_live(self, status: str, now: float) -> int:
+        with self._lock:
+            return sum(
+                1 for req in self._requests.values()
+                if req["status"] == status and req.get("expires_at_ts") is not None and req["expires_at_ts"] > now
+            )
+
+    def list_requests(self, user: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(req) for req in self._requests.values()
+                if (user is None or req["user"] == user) and (status is None or req["status"] == status)
+            ]
+
+
+class SQLiteRequestStore(RequestStore):
+    """Requests in an SQLite table shared by every worker process on the host.
+
+    Uses a WAL ConnectionPool (the vault's, when sharing its file). Lookups
+    by id go through the primary key; listing by user and status, and finding
+    lapsed requests by (status, expires_at_ts), go through secondary indexes.
+    """
+
+    def __init__(self, db_path: str, pool: Optional[ConnectionPool] = None):
+        self.db_path = db_path
+        self.pool = pool or ConnectionPool(db_path)
+        self._init_db()
+
+    def _init_db(self) -> None:
+        with self.pool.connection() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS access_requests (
+                    id TEXT PRIMARY KEY,
+                    user TEXT NOT NULL,
+                    secret_id TEXT NOT NULL,
+                    reason TEXT,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    approver TEXT,
+                    approved_at TEXT,
+                    expires_at TEXT,
+                    expires_at_ts REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_access_requests_user_status ON access_requests (user, status);
+                CREATE INDEX IF NOT EXISTS idx_access_requests_expiry ON access_requests (status, expires_at_ts);
+            ''')
+            conn.commit()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    @staticmethod
+    def _row_to_request(row: tuple) -> Dict[str, Any]:
+        return dict(zip(REQUEST_COLUMNS, row))
+
+    def add(self, req: Dict[str, Any]) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(
+                f'INSERT INTO access_requests ({", ".join(REQUEST_COLUMNS)}) '
+                f'VALUES ({", ".join("?" for _ in REQUEST_COLUMNS)})',
+                tuple(req.get(column) for column in REQUEST_COLUMNS)
+            )
+            conn.commit()
+
+    def get(self, req_id: str) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                f'SELECT {", ".join(REQUEST_COLUMNS)} FROM access_requests WHERE id = ?', (req_id,)
+            ).fetchone()
+        return self._row_to_request(row) if row else None
+
+    def transition(
+        self, req_id: str, from_status: str, changes: Dict[str, Any], live_at: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        unknown = set(changes) - set(REQUEST_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown request fields: {', '.join(sorted(unknown))}")
+        assignments = ", ".join(f"{column} = ?" for column in changes)
+        condition = "id = ? AND status = ?"
+        params: List[Any] = [*changes.values(), req_id, from_status]
+        if live_at is not None:
+            condition += " AND (expires_at_ts IS NULL OR expires_at_ts > ?)"
+            params.append(live_at)
+        with self.pool.connection() as conn:
+            cursor = conn.execute(f'UPDATE access_requests SET {assignments} WHERE {condition}', params)
+            conn.commit()
+        return self.get(req_id) if cursor.rowcount else None
+
+    def expire_due(self, now: float) -> List[Dict[str, Any]]:
+        expired: List[Dict[str, Any]] = []
+        with self.pool.connection() as conn:
+            # Take the write lock up front: upgrading a read transaction can fail with SQLITE_BUSY under WAL.
+            conn.execute("BEGIN IMMEDIATE")
+            for status in LIVE_STATUSES:
+                rows = conn.execute(
+                    f'SELECT {", ".join(REQUEST_COLUMNS)} FROM access_requests '
+                    'WHERE status = ? AND expires_at_ts <= ?', (status, now)
+                ).fetchall()
+                for row in rows:
+                    # Conditional, so when several workers reap at once each request is expired (and audited) once.
+                    cursor = conn.execute(
+                        "UPDATE access_requests SET status = 'EXPIRED' WHERE id = ? AND status = ?", (row[0], status)
+                    )
+                    if cursor.rowcount:
+                        expired.append({**self._row_to_request(row), "status": "EXPIRED"})
+            conn.commit()
+        return expired
+
+    def next_expiry(self) -> Optional[float]:
+        with self.pool.connection() as conn:
+            deadlines = [
+                conn.execute(
+                    'SELECT MIN(expires_at_ts) FROM access_requests WHERE status = ?', (status,)
+                ).fetchone()[0]
+                for status in LIVE_STATUSES
+            ]
+        known = [d for d in deadlines if d is not None]
+        return min(known) if known else None
+
+    def purge(self, before: float) -> int:
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM access_requests WHERE status = 'EXPIRED' AND expires_at_ts < ?", (before,)
+            )
+            conn.commit()
+        return cursor.rowcount
+
+    def count_live(self, status: str, now: float) -> int:
+        # A range over idx_access_requests_expiry (status, expires_at_ts).
+        with self.pool.connection() as conn:
+            return conn.execute(
+                'SELECT COUNT(*) FROM access_requests WHERE status = ? AND expires_at_ts > ?', (status, now)
+            ).fetchone()[0]
+
+    def list_requests(self, user: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if user is not None:
+            clauses.append("user = ?")
+            params.append(user)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f'SELECT {", ".join(REQUEST_COLUMNS)} FROM access_requests {where} ORDER BY created_at', params
+            ).fetchall()
+        return [self._row_to_request(row) for row in rows]